@@ -0,0 +1,83 @@
+# 对比每次请求新建连接和 ChatClient 复用连接池的吞吐量
+# 先启动没有延迟的 mock 服务:
+#   MOCK_VERBOSE=0 MOCK_TTFT=0 MOCK_ITL=0 uvicorn openai_server:app --port 8000
+# 运行:
+#   python bench_client.py --requests 500 --concurrency 20 --max-tokens 16
+import argparse
+import asyncio
+import time
+
+import openai_client
+from chat_client import ChatClient
+
+
+def payload(stream: bool, max_tokens: int) -> dict:
+    return {
+        "model": "internlm/internlm2_5-7b-chat",
+        "messages": [{"role": "user", "content": "猫和老鼠的作者是谁?"}],
+        "max_tokens": max_tokens,
+        "stream": stream,
+    }
+
+
+def report(name: str, requests: int, elapsed: float) -> None:
+    print(f"{name:<32} {requests:6d} requests  {elapsed:6.2f}s  {requests / elapsed:8.1f} req/s")
+
+
+def bench_sync(args: argparse.Namespace, stream: bool) -> None:
+    data = payload(stream, args.max_tokens)
+    mode = "stream" if stream else "non-stream"
+
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        for _ in openai_client.httpx_sync_chat(data):
+            pass
+    report(f"sync {mode} new client", args.requests, time.perf_counter() - start)
+
+    with ChatClient(args.url, headers=openai_client.headers) as client:
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            for _ in client.chat(data):
+                pass
+        report(f"sync {mode} pooled", args.requests, time.perf_counter() - start)
+
+
+async def bench_async(args: argparse.Namespace, stream: bool) -> None:
+    data = payload(stream, args.max_tokens)
+    mode = "stream" if stream else "non-stream"
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run(chat) -> None:
+        async with semaphore:
+            async for _ in chat(data):
+                pass
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(run(openai_client.httpx_async_chat) for _ in range(args.requests))
+    )
+    report(f"async {mode} new client", args.requests, time.perf_counter() - start)
+
+    async with ChatClient(
+        args.url,
+        headers=openai_client.headers,
+        max_connections=args.concurrency,
+        max_keepalive_connections=args.concurrency,
+    ) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(run(client.achat) for _ in range(args.requests)))
+        report(f"async {mode} pooled", args.requests, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=openai_client.URL)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--max-tokens", type=int, default=16)
+    args = parser.parse_args()
+    openai_client.URL = args.url
+
+    for stream in (False, True):
+        bench_sync(args, stream)
+        asyncio.run(bench_async(args, stream))
@@ -0,0 +1,95 @@
+# 在 1000 个并发流上对比逐个事件写入和合并写入的 ASGI send 次数与耗时
+# 使用假的 ASGI send: 与 uvicorn 一样按 chunked 编码分帧, 每次 send 写入一次本地 socket,
+# 另一端由后台线程读取并丢弃
+# 运行:
+#   python bench_coalesce.py --streams 1000 --tokens 100 --itl 0.005
+import argparse
+import asyncio
+import socket
+import threading
+import time
+
+from fastapi.responses import StreamingResponse
+
+from encoder import ChunkEncoder
+from sse import coalesce_events
+
+
+class FakeSend:
+    def __init__(self):
+        self.calls = 0
+        self.bytes = 0
+        self.sock, reader = socket.socketpair()
+        threading.Thread(target=self.drain, args=(reader,), daemon=True).start()
+
+    @staticmethod
+    def drain(reader: socket.socket) -> None:
+        while reader.recv(1 << 20):
+            pass
+
+    async def __call__(self, message: dict) -> None:
+        if message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            self.calls += 1
+            self.bytes += len(body)
+            if body:
+                self.sock.sendall(b"%x\r\n%s\r\n" % (len(body), body))
+
+
+async def receive() -> dict:
+    # 客户端不会断开
+    await asyncio.Event().wait()
+
+
+async def events(tokens: int, itl: float):
+    encoder = ChunkEncoder(id=1)
+    for i in range(tokens):
+        await asyncio.sleep(itl)
+        yield encoder.encode_event(
+            content=str(i % 10),
+            role="assistant",
+            created=time.time(),
+            prompt_tokens=10,
+            completion_tokens=i + 1,
+        )
+    yield encoder.encode_event(finish_reason="stop", created=time.time())
+    yield "data: [DONE]\n\n"
+
+
+async def run(name: str, args: argparse.Namespace, **policy) -> None:
+    send = FakeSend()
+    scope = {"type": "http", "asgi": {"spec_version": "2.3"}}
+
+    async def one():
+        stream = coalesce_events(events(args.tokens, args.itl), **policy)
+        await StreamingResponse(stream)(scope, receive, send)
+
+    start = time.perf_counter()
+    cpu = time.process_time()
+    await asyncio.gather(*(one() for _ in range(args.streams)))
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    print(
+        f"{name:<28} sends {send.calls:8d}  bytes {send.bytes:11d}"
+        f"  wall {elapsed:6.2f}s  cpu {cpu:6.2f}s"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    await run("per event", args, max_delay=0)
+    for max_bytes, max_delay in [(4096, 0.01), (4096, 0.05), (65536, 0.1)]:
+        await run(
+            f"bytes={max_bytes} delay={max_delay * 1000:.0f}ms",
+            args,
+            max_bytes=max_bytes,
+            max_delay=max_delay,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=1000)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--itl", type=float, default=0.005)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,112 @@
+# 对比 pydantic 模型序列化和预渲染模板的 chunk 编码速度, 并检查两者输出逐字节相同
+# 运行:
+#   python bench_encoder.py --chunks 100000
+import argparse
+import random
+import time
+
+from encoder import ChunkEncoder
+from openai_server import (
+    ChatCompletionChunk,
+    ChatCompletionChunkChoice,
+    ChoiceDelta,
+    CompletionUsage,
+)
+
+
+def pydantic_chunk(
+    session_id, content, finish_reason, role, references, created, prompt, completion
+) -> str:
+    # role 和 usage 不能显式传入 None, 没有值时使用默认值
+    delta = {"content": content, "references": references}
+    if role is not None:
+        delta["role"] = role
+    usage = {}
+    if prompt is not None:
+        usage["usage"] = CompletionUsage(
+            prompt_tokens=prompt,
+            completion_tokens=completion,
+            total_tokens=prompt + completion,
+        )
+    chunk = ChatCompletionChunk(
+        id=session_id,
+        choices=[
+            ChatCompletionChunkChoice(
+                index=0,
+                finish_reason=finish_reason,
+                delta=ChoiceDelta(**delta),
+            )
+        ],
+        created=created,
+        **usage,
+    )
+    return chunk.model_dump_json()
+
+
+def samples(n: int) -> list[tuple]:
+    texts = ["[", "42", " ", "你好", 'quote"', "back\\slash", "line\n", "\x01", "🙂"]
+    result = []
+    for i in range(n):
+        last = i % 50 == 49
+        result.append(
+            (
+                random.choice([random.getrandbits(64), "chatcmpl-abc"]),
+                None if last else random.choice(texts),
+                "stop" if last else None,
+                None if last else "assistant",
+                ["book1", "书2"] if last else None,
+                random.choice([time.time(), 1792299733]),
+                None if i % 7 == 0 else 12,
+                i + 1,
+            )
+        )
+    return result
+
+
+def check(cases: list[tuple]) -> None:
+    for case in cases:
+        expected = pydantic_chunk(*case)
+        actual = ChunkEncoder(id=case[0]).encode(
+            content=case[1],
+            finish_reason=case[2],
+            role=case[3],
+            references=case[4],
+            created=case[5],
+            prompt_tokens=case[6],
+            completion_tokens=case[7],
+        )
+        assert actual == expected, f"\n{actual}\n{expected}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=100000)
+    args = parser.parse_args()
+
+    check(samples(2000))
+    print("output is byte-compatible")
+
+    session_id = random.getrandbits(64)
+    created = time.time()
+    contents = [str(i % 10) for i in range(args.chunks)]
+
+    start = time.perf_counter()
+    for i, content in enumerate(contents):
+        pydantic_chunk(session_id, content, None, "assistant", None, created, 12, i + 1)
+    pydantic_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    encoder = ChunkEncoder(id=session_id)
+    for i, content in enumerate(contents):
+        encoder.encode(
+            content=content,
+            role="assistant",
+            created=created,
+            prompt_tokens=12,
+            completion_tokens=i + 1,
+        )
+    encoder_time = time.perf_counter() - start
+
+    print(f"pydantic: {args.chunks / pydantic_time:12,.0f} chunks/s")
+    print(f"encoder:  {args.chunks / encoder_time:12,.0f} chunks/s")
+    print(f"speedup:  {pydantic_time / encoder_time:.1f}x")
@@ -0,0 +1,170 @@
+# 对比 openai_server 非流式响应的默认路径 (按 response_model 再次校验后序列化) 和 TrustedJSONResponse
+# 1. 只测量序列化: 校验 + 序列化 + 创建 Response 的耗时和内存峰值
+# 2. 端到端: 在进程内直接调用 ASGI 应用, 两种路径交替运行多轮, 取中位数
+# 运行:
+#   python bench_response.py --number 5000 --sizes 1024 65536 --requests 500 --rounds 6
+import os
+
+# 去掉 mock 服务的等待时间, 只测量框架和序列化的开销
+os.environ.setdefault("MOCK_TTFT", "0")
+os.environ.setdefault("MOCK_ITL", "0")
+os.environ.setdefault("MOCK_VERBOSE", "0")
+
+import argparse
+import asyncio
+import inspect
+import json
+import statistics
+import time
+import tracemalloc
+
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+import openai_server
+from encoder import TrustedJSONResponse, orjson
+from openai_server import (
+    ChatCompletion,
+    ChatCompletionChoice,
+    ChatCompletionMessage,
+    CompletionUsage,
+)
+
+
+def make_completion(content_size: int) -> ChatCompletion:
+    return ChatCompletion(
+        id=1,
+        choices=[
+            ChatCompletionChoice(
+                index=0,
+                finish_reason="stop",
+                message=ChatCompletionMessage(
+                    content="猫和老鼠" * (content_size // 12),
+                    references=[f"book{i}" for i in range(10)],
+                    role="assistant",
+                ),
+            )
+        ],
+        created=time.time(),
+        usage=CompletionUsage(prompt_tokens=10, completion_tokens=100, total_tokens=110),
+    )
+
+
+async def measure(name: str, fn, number: int) -> bytes:
+    response = await fn()
+    start = time.perf_counter()
+    for _ in range(number):
+        await fn()
+    elapsed = time.perf_counter() - start
+
+    # 一次序列化过程中的内存峰值
+    tracemalloc.start()
+    await fn()
+    tracemalloc.reset_peak()
+    current, _ = tracemalloc.get_traced_memory()
+    await fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:<32} {elapsed / number * 1e6:8.1f} us/op  {number / elapsed:9.0f} op/s"
+        f"  peak {(peak - current) / 1024:8.1f}KB"
+    )
+    return response.body
+
+
+async def bench_serialize(args: argparse.Namespace) -> None:
+    field = create_model_field("Response_chat", ChatCompletion, mode="serialization")
+    # 新版本 FastAPI 在没有指定 response_class 时由 pydantic-core 直接输出 JSON
+    has_dump_json = "dump_json" in inspect.signature(serialize_response).parameters
+
+    for size in args.sizes:
+        completion = make_completion(size)
+        print(f"\n{size // 1024}KB content")
+
+        async def legacy():
+            # 校验 -> dict -> json.dumps, 旧版本 FastAPI 或者指定了 response_class 时的路径
+            content = await serialize_response(field=field, response_content=completion)
+            return JSONResponse(content)
+
+        async def dump_json():
+            # 校验 -> pydantic-core 输出 JSON
+            content = await serialize_response(
+                field=field, response_content=completion, dump_json=True
+            )
+            return Response(content, media_type="application/json")
+
+        async def trusted():
+            return TrustedJSONResponse(completion)
+
+        bodies = [await measure("response_model (legacy)", legacy, args.number)]
+        if has_dump_json:
+            bodies.append(await measure("response_model (dump_json)", dump_json, args.number))
+        bodies.append(await measure("TrustedJSONResponse", trusted, args.number))
+        # 所有路径输出的 JSON 内容相同
+        assert all(json.loads(body) == json.loads(bodies[0]) for body in bodies)
+
+
+async def bench_app(args: argparse.Namespace) -> None:
+    body = json.dumps(
+        {
+            "model": "internlm/internlm2_5-7b-chat",
+            "messages": [{"role": "user", "content": "猫和老鼠的作者是谁?"}],
+        }
+    ).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/v1/chat/completions",
+        "raw_path": b"/v1/chat/completions",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "server": ("localhost", 8000),
+        "client": ("localhost", 12345),
+    }
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message: dict) -> None:
+        pass
+
+    results = {False: [], True: []}
+    for i in range(args.rounds):
+        # 每轮交换运行顺序, 避免顺序带来的偏差
+        for fast_json in (False, True) if i % 2 == 0 else (True, False):
+            openai_server.fast_json = fast_json
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                await openai_server.app(dict(scope), receive, send)
+            results[fast_json].append((time.perf_counter() - start) / args.requests)
+
+    print(f"\nopenai_server end to end, median of {args.rounds} rounds")
+    for fast_json, rounds in results.items():
+        elapsed = statistics.median(rounds)
+        print(
+            f"fast_json={int(fast_json)}  {1 / elapsed:8.1f} req/s  {elapsed * 1e6:7.1f}us/req"
+        )
+
+
+async def main(args: argparse.Namespace) -> None:
+    print(f"orjson: {'installed' if orjson else 'not installed'}")
+    await bench_serialize(args)
+    await bench_app(args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=5000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 65536])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=6)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,84 @@
+# 对比客户端原来的字符串拼接解析和 SSEDecoder 的增量解析
+# 原来的写法每收到一块就 decode 后拼接到 buffer, 再对整个 buffer 查找 "\n\n",
+# 单个很大的事件被拆成很多小块时, 每块都要重新扫描整个 buffer, 耗时是平方级的
+# 运行:
+#   python bench_sse.py --events 20000 --chunk 64 --large 1000000 --tiny 16
+import argparse
+import random
+import time
+
+from encoder import ChunkEncoder
+from sse import SSEDecoder, parse_event
+
+
+def naive(chunks: list[bytes]) -> int:
+    """原客户端的写法"""
+    count = 0
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk.decode("utf-8")
+        while "\n\n" in buffer:
+            message, buffer = buffer.split("\n\n", 1)
+            if message.startswith("data: ") and not message.endswith("[DONE]"):
+                count += 1
+    return count
+
+
+def decoder(chunks: list[bytes]) -> int:
+    count = 0
+    decoder = SSEDecoder()
+    for chunk in chunks:
+        for block in decoder.feed(chunk):
+            event = parse_event(block)
+            if event is not None and event.data != "[DONE]":
+                count += 1
+    return count
+
+
+def split(body: bytes, size: int) -> list[bytes]:
+    return [body[i : i + size] for i in range(0, len(body), size)]
+
+
+def bench(name: str, chunks: list[bytes]) -> None:
+    for fn in (naive, decoder):
+        start = time.perf_counter()
+        count = fn(chunks)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<24} {fn.__name__:<8} events {count:6d}  {elapsed * 1000:9.1f}ms")
+
+
+def main(args: argparse.Namespace) -> None:
+    encoder = ChunkEncoder(id=1)
+    body = b"".join(
+        encoder.encode_event(content="hello, world", created=0).encode()
+        for _ in range(args.events)
+    ) + b"data: [DONE]\n\n"
+    bench(f"{args.events} small events", split(body, args.chunk))
+
+    content = "x" * args.large
+    body = encoder.encode_event(content=content, created=0).encode()
+    bench(f"{args.large // 1000}KB event", split(body, args.tiny))
+
+    # 在随机位置切分中文内容, 原写法遇到被拆开的多字节字符会抛出 UnicodeDecodeError
+    rng = random.Random(0)
+    body = encoder.encode_event(content="流式输出" * 16, created=0).encode()
+    errors = 0
+    for _ in range(1000):
+        cut = rng.randrange(1, len(body))
+        chunks = [body[:cut], body[cut:]]
+        try:
+            naive(chunks)
+        except UnicodeDecodeError:
+            errors += 1
+        assert decoder(chunks) == 1
+    print(f"random splits of a CJK event: naive UnicodeDecodeError {errors}/1000, decoder 0/1000")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--chunk", type=int, default=64)
+    parser.add_argument("--large", type=int, default=1000000)
+    parser.add_argument("--tiny", type=int, default=16)
+    args = parser.parse_args()
+    main(args)
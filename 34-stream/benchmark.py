@@ -0,0 +1,252 @@
+# 并发压测流式和非流式接口, 统计首 token 延迟 (TTFT), token 间延迟 (ITL), 端到端延迟和吞吐量
+# 结果输出为 json, 可以和之前的结果对比, 判断改动是否有回退
+#
+# 先启动服务:
+#   uvicorn server:app --port 8000
+#   uvicorn openai_server:app --port 8000
+#   或者 35-chatbot: 在 35-chatbot 目录下 python run.py, 监听 8001 端口, 上游是 8000 端口的 openai_server
+# 运行:
+#   python benchmark.py --target openai --requests 200 --concurrency 20 --stream --output base.json
+#   python benchmark.py --target openai --requests 200 --concurrency 20 --stream --compare base.json
+#   python benchmark.py --target chatbot --username a@example.com --password 123456 --stream
+import argparse
+import asyncio
+import json
+import math
+import time
+from dataclasses import dataclass, field
+
+import httpx
+
+from chat_client import ChatClient
+from openai_client import headers
+
+
+# 各个服务的默认地址, 以及事件块是否为 SSE 格式
+targets = {
+    "server": ("http://localhost:8000/chat", False),
+    "openai": ("http://localhost:8000/v1/chat/completions", True),
+    "chatbot": ("http://localhost:8001/v1/chat/completions", True),
+}
+
+
+@dataclass(slots=True)
+class Sample:
+    """一个请求的测量结果, 时间单位为秒"""
+
+    start: float
+    # 收到第一个 token 的时间, 非流式请求为收到响应的时间
+    first_token: float | None = None
+    end: float | None = None
+    tokens: int = 0
+    # 相邻两个 token 的间隔, 服务端合并写入时同一次读取中的多个 token 间隔接近 0
+    itl: list[float] = field(default_factory=list)
+    error: str | None = None
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """线性插值的百分位数, q 取值 0~100"""
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * q / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(values: list[float]) -> dict:
+    """统计分布, 单位转换为毫秒"""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) * 1000,
+        "p50": percentile(values, 50) * 1000,
+        "p95": percentile(values, 95) * 1000,
+        "p99": percentile(values, 99) * 1000,
+        "max": max(values) * 1000,
+    }
+
+
+def count_tokens(output: dict, sse: bool) -> int:
+    """一个输出块中的 token 数, 一个非空的 content 块算作一个 token"""
+    if not sse:
+        return 1 if output.get("response") else 0
+    count = 0
+    for choice in output.get("choices") or []:
+        # 流式为 delta, 非流式为 message
+        message = choice.get("delta") or choice.get("message") or {}
+        if message.get("content"):
+            count += 1
+    return count
+
+
+def completion_tokens(output: dict) -> int | None:
+    """非流式响应优先使用服务端返回的 usage"""
+    usage = output.get("usage") or {}
+    return usage.get("completion_tokens")
+
+
+async def measure(client: ChatClient, data: dict) -> Sample:
+    sample = Sample(start=time.perf_counter())
+    last = None
+    try:
+        async for output in client.achat(data):
+            now = time.perf_counter()
+            tokens = count_tokens(output, client.sse)
+            if not data["stream"]:
+                sample.first_token = now
+                sample.tokens = completion_tokens(output) or tokens
+                continue
+            if not tokens:
+                continue
+            if sample.first_token is None:
+                sample.first_token = now
+            else:
+                sample.itl.append(now - last)
+            last = now
+            sample.tokens += tokens
+    except (httpx.HTTPError, json.JSONDecodeError) as e:
+        # httpx 的错误信息有多行, 只保留第一行
+        message = str(e).split("\n", 1)[0]
+        sample.error = f"{type(e).__name__}: {message}"
+    sample.end = time.perf_counter()
+    return sample
+
+
+async def login(base_url: str, username: str, password: str) -> str:
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            f"{base_url}/login", data={"username": username, "password": password}
+        )
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+
+async def run(args: argparse.Namespace) -> dict:
+    url, sse = targets[args.target]
+    url = args.url or url
+    request_headers = dict(headers)
+    if args.target == "chatbot":
+        base_url = url.rsplit("/v1/", 1)[0]
+        token = await login(base_url, args.username, args.password)
+        request_headers["Authorization"] = f"Bearer {token}"
+
+    data = {
+        "model": args.model,
+        "messages": [{"role": "user", "content": args.prompt}],
+        "max_tokens": args.max_tokens,
+        "stream": args.stream,
+    }
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(client: ChatClient) -> Sample:
+        async with semaphore:
+            return await measure(client, data)
+
+    async with ChatClient(
+        url,
+        headers=request_headers,
+        sse=sse,
+        max_connections=args.concurrency,
+        max_keepalive_connections=args.concurrency,
+        timeout=args.timeout,
+    ) as client:
+        # 预热, 建立连接, 不计入结果
+        await asyncio.gather(*(one(client) for _ in range(args.warmup)))
+
+        start = time.perf_counter()
+        samples = await asyncio.gather(*(one(client) for _ in range(args.requests)))
+        duration = time.perf_counter() - start
+
+    ok = [s for s in samples if s.error is None]
+    errors = [s.error for s in samples if s.error is not None]
+    tokens = sum(s.tokens for s in ok)
+    return {
+        "config": {
+            k: v for k, v in vars(args).items() if k not in ("output", "compare", "password")
+        }
+        | {"url": url},
+        "requests": len(samples),
+        "success": len(ok),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "duration": duration,
+        "throughput": {
+            "requests_per_second": len(ok) / duration,
+            "tokens_per_second": tokens / duration,
+        },
+        "ttft": summarize([s.first_token - s.start for s in ok if s.first_token]),
+        "itl": summarize([gap for s in ok for gap in s.itl]),
+        "latency": summarize([s.end - s.start for s in ok]),
+    }
+
+
+def print_report(report: dict) -> None:
+    print(
+        f"requests {report['requests']}  success {report['success']}"
+        f"  errors {report['errors']}  duration {report['duration']:.2f}s"
+    )
+    throughput = report["throughput"]
+    print(
+        f"throughput {throughput['requests_per_second']:.1f} req/s"
+        f"  {throughput['tokens_per_second']:.1f} tokens/s"
+    )
+    for name in ("ttft", "itl", "latency"):
+        stats = report[name]
+        if not stats["count"]:
+            continue
+        print(
+            f"{name:<8} mean {stats['mean']:8.1f}ms  p50 {stats['p50']:8.1f}ms"
+            f"  p95 {stats['p95']:8.1f}ms  p99 {stats['p99']:8.1f}ms"
+        )
+    for error in report["error_samples"]:
+        print(f"error: {error}")
+
+
+def compare(report: dict, baseline: dict) -> None:
+    """打印与基准结果相比的变化, 延迟越低越好, 吞吐量越高越好"""
+    rows = [
+        ("requests/s", ("throughput", "requests_per_second")),
+        ("tokens/s", ("throughput", "tokens_per_second")),
+    ] + [
+        (f"{name} {stat}", (name, stat))
+        for name in ("ttft", "itl", "latency")
+        for stat in ("p50", "p95", "p99")
+    ]
+    print("\ncompare with baseline")
+    for label, (group, key) in rows:
+        new = report[group].get(key)
+        old = baseline.get(group, {}).get(key)
+        if new is None or not old:
+            continue
+        print(f"{label:<16} {old:10.1f} -> {new:10.1f}  {(new - old) / old * 100:+6.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", choices=targets, default="openai")
+    parser.add_argument("--url", default=None, help="覆盖 target 的默认地址")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=0)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--model", default="internlm/internlm2_5-7b-chat")
+    parser.add_argument("--prompt", default="讲一个猫和老鼠的故事")
+    parser.add_argument("--timeout", type=float, default=60)
+    # chatbot 需要登录
+    parser.add_argument("--username", default="a@example.com")
+    parser.add_argument("--password", default="123456")
+    parser.add_argument("--output", default=None, help="保存 json 结果")
+    parser.add_argument("--compare", default=None, help="对比之前保存的 json 结果")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
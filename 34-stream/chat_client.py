@@ -0,0 +1,313 @@
+# 复用连接的客户端
+# openai_client.py 和 client.py 中的函数每次调用都会新建 Session/Client, 每个请求都要重新建立 TCP 连接
+# ChatClient 持有一个长期存在的连接池, 多次请求复用同一组 keep-alive 连接
+#
+# 使用:
+#   client = ChatClient("http://localhost:8000/v1/chat/completions")
+#   for output in client.chat(data): ...
+#   async for output in client.achat(data): ...
+#   async for result in client.abatch(payloads, concurrency=32): ...
+#   client.close() / await client.aclose()
+import os
+import json
+import random
+import asyncio
+import httpx
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterable, Iterator
+from sse import iter_blocks, aiter_blocks, parse_event
+
+
+"""
+连接池配置
+
+linux:
+    export CLIENT_MAX_CONNECTIONS=100
+    export CLIENT_HTTP2=1
+"""
+# 连接池最多同时打开的连接数
+max_connections = int(os.getenv("CLIENT_MAX_CONNECTIONS", "100"))
+# 连接池中最多保留的空闲连接数
+max_keepalive_connections = int(os.getenv("CLIENT_MAX_KEEPALIVE", "20"))
+# 空闲连接保留的时间, 单位秒
+keepalive_expiry = float(os.getenv("CLIENT_KEEPALIVE_EXPIRY", "30"))
+timeout = float(os.getenv("CLIENT_TIMEOUT", "60"))
+# 需要安装 h2: pip install httpx[http2]
+# http2 只对 https 生效, http:// 的地址仍然使用 http/1.1
+http2 = os.getenv("CLIENT_HTTP2", "0") == "1"
+
+# 批量请求的并发数, 需要不大于连接池的 max_connections
+batch_concurrency = int(os.getenv("CLIENT_BATCH_CONCURRENCY", "16"))
+# 失败后最多重试的次数
+retries = int(os.getenv("CLIENT_RETRIES", "3"))
+# 重试等待时间的基数和上限, 单位秒, 每次重试等待 uniform(0, min(max_backoff, backoff * 2 ** n))
+backoff = float(os.getenv("CLIENT_BACKOFF", "0.5"))
+max_backoff = float(os.getenv("CLIENT_MAX_BACKOFF", "10"))
+# 可以重试的状态码, 其他 4xx 错误重试也不会成功
+retry_status = {408, 409, 429, 500, 502, 503, 504}
+
+
+# openai 流式响应的结束标记
+DONE = object()
+
+
+@dataclass(slots=True)
+class BatchResult:
+    """批量请求中一个请求的结果
+
+    - index: 在输入中的序号
+    - output: 非流式为响应, 流式为所有输出块组成的列表
+    - error: 重试后仍然失败时的错误, 成功时为 None
+    - attempts: 请求的次数
+    """
+
+    index: int
+    payload: dict
+    output: Any = None
+    error: BaseException | None = None
+    attempts: int = 0
+
+
+def retryable(e: BaseException) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code in retry_status
+    # 连接失败, 超时, 连接被断开
+    return isinstance(e, httpx.TransportError)
+
+
+def retry_delay(e: BaseException, attempt: int, backoff: float, max_backoff: float) -> float:
+    """full jitter 指数退避, 避免大量请求同时重试; 服务端返回 Retry-After 时至少等待这么久"""
+    delay = random.uniform(0, min(max_backoff, backoff * 2**attempt))
+    if isinstance(e, httpx.HTTPStatusError):
+        retry_after = e.response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            delay = max(delay, min(max_backoff, float(retry_after)))
+    return delay
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ChatClient:
+    """复用连接池的流式对话客户端, 同时提供同步和异步生成器接口
+
+    - 同步和异步请求分别使用一个 httpx.Client 和 httpx.AsyncClient, 第一次使用时创建
+    - AsyncClient 绑定创建它的事件循环, 在同一个事件循环中复用, 用完后调用 aclose
+    - sse=True 时按 openai 的 SSE 格式解析 (data: ... 和 [DONE]), 否则每个事件块是一个 json
+    """
+
+    def __init__(
+        self,
+        url: str,
+        headers: dict | None = None,
+        sse: bool = True,
+        max_connections: int = max_connections,
+        max_keepalive_connections: int = max_keepalive_connections,
+        keepalive_expiry: float = keepalive_expiry,
+        timeout: float = timeout,
+        http2: bool = http2,
+    ):
+        self.url = url
+        self.headers = headers or {}
+        self.sse = sse
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        if http2 and not http2_available():
+            print("h2 is not installed, fall back to http/1.1")
+            http2 = False
+        self.http2 = http2
+        self._client: httpx.Client | None = None
+        self._aclient: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = httpx.Client(
+                headers=self.headers,
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+            )
+        return self._client
+
+    @property
+    def aclient(self) -> httpx.AsyncClient:
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(
+                headers=self.headers,
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+            )
+        return self._aclient
+
+    def _parse(self, block: str) -> dict | None | object:
+        """解析一个事件块, 返回 None 表示跳过, DONE 表示流结束"""
+        if not self.sse:
+            return json.loads(block) if block else None
+        event = parse_event(block)
+        if event is None:
+            return None
+        if event.data == "[DONE]":
+            return DONE
+        return json.loads(event.data)
+
+    def chat(self, data: dict) -> Iterator[dict]:
+        if not data.get("stream", False):
+            response = self.client.post(self.url, json=data)
+            response.raise_for_status()
+            yield response.json()
+            return
+
+        with self.client.stream("POST", self.url, json=data) as response:
+            response.raise_for_status()
+            for block in iter_blocks(response.iter_bytes()):
+                output = self._parse(block)
+                if output is DONE:
+                    break
+                if output is not None:
+                    yield output
+
+    async def achat(self, data: dict) -> AsyncIterator[dict]:
+        if not data.get("stream", False):
+            response = await self.aclient.post(self.url, json=data)
+            response.raise_for_status()
+            yield response.json()
+            return
+
+        async with self.aclient.stream("POST", self.url, json=data) as response:
+            response.raise_for_status()
+            async for block in aiter_blocks(response.aiter_bytes()):
+                output = self._parse(block)
+                if output is DONE:
+                    break
+                if output is not None:
+                    yield output
+
+    async def _collect(self, data: dict) -> Any:
+        outputs = [output async for output in self.achat(data)]
+        if not data.get("stream", False):
+            return outputs[0]
+        return outputs
+
+    async def _run(
+        self,
+        index: int,
+        data: dict,
+        semaphore: asyncio.Semaphore,
+        retries: int,
+        backoff: float,
+        max_backoff: float,
+    ) -> BatchResult:
+        result = BatchResult(index, data)
+        while True:
+            # 等待重试时不占用并发数
+            async with semaphore:
+                result.attempts += 1
+                try:
+                    result.output = await self._collect(data)
+                    return result
+                except (httpx.HTTPError, json.JSONDecodeError) as e:
+                    result.error = e
+                except Exception as e:
+                    # 格式错误的 chunk, 无效的 url 等, 重试也不会成功
+                    result.error = e
+                    return result
+            if result.attempts > retries or not retryable(result.error):
+                return result
+            await asyncio.sleep(
+                retry_delay(result.error, result.attempts - 1, backoff, max_backoff)
+            )
+            result.error = None
+
+    async def abatch(
+        self,
+        payloads: Iterable[dict],
+        concurrency: int = batch_concurrency,
+        ordered: bool = False,
+        retries: int = retries,
+        backoff: float = backoff,
+        max_backoff: float = max_backoff,
+        window: int | None = None,
+    ) -> AsyncIterator[BatchResult]:
+        """并发执行一批请求, 最多同时进行 concurrency 个请求
+
+        - payloads 按需读取, 可以是很大的生成器, 同一时间只创建 window 个任务
+        - ordered=False 时按完成的顺序返回结果, ordered=True 时按输入的顺序返回结果
+        - 有序时前面的慢请求会挡住后面已经完成的结果, window 默认为 concurrency * 4,
+          让后面的请求可以继续执行, 同时限制缓存的结果数量
+        - 失败的请求按 full jitter 指数退避重试, 最终失败的请求在 BatchResult.error 中返回, 不会抛出异常
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        if window is None:
+            window = concurrency * 4 if ordered else concurrency
+        window = max(window, concurrency)
+        payloads = enumerate(payloads)
+        # 按提交顺序保存的任务
+        tasks: deque[asyncio.Task] = deque()
+
+        def submit() -> bool:
+            item = next(payloads, None)
+            if item is None:
+                return False
+            index, data = item
+            tasks.append(
+                asyncio.create_task(
+                    self._run(index, data, semaphore, retries, backoff, max_backoff)
+                )
+            )
+            return True
+
+        try:
+            while len(tasks) < window and submit():
+                pass
+            while tasks:
+                if ordered:
+                    task = tasks[0]
+                    await asyncio.wait([task])
+                    tasks.popleft()
+                else:
+                    done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    task = done.pop()
+                    tasks.remove(task)
+                submit()
+                yield task.result()
+        finally:
+            # 调用方提前停止迭代时取消剩余的请求
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self) -> None:
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+
+    def __enter__(self) -> "ChatClient":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "ChatClient":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.aclose()
+        self.close()
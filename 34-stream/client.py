@@ -3,6 +3,7 @@ import requests
 import aiohttp
 import httpx
 import json
+from sse import iter_blocks, aiter_blocks
 
 
 URL = "http://localhost:8000/chat"
@@ -43,13 +44,10 @@ def requests_chat(data: dict):
         if not stream:
             yield response.json()
         else:
-            chunk: bytes
-            for chunk in response.iter_lines(
-                chunk_size=8192, decode_unicode=False, delimiter=b"\n\n"
-            ):
-                if chunk:
-                    decoded: str = chunk.decode("utf-8")
-                    yield json.loads(decoded)
+            # 按空行切分字节流, 多字节字符被拆开时也能正确解码
+            for block in iter_blocks(response.iter_content(chunk_size=None)):
+                if block:
+                    yield json.loads(block)
 
 
 # https://www.perplexity.ai/search/wo-shi-yong-aiohttpshi-xian-mo-6J27VL0aQsGNCykznLPlMw
@@ -66,15 +64,10 @@ async def aiohttp_async_chat(data: dict):
                 data: str = await response.text("utf-8")
                 yield json.loads(data)
             else:
-                chunk: bytes
-                buffer = ""
-                async for chunk in response.content.iter_any():
-                    if chunk:
-                        buffer += chunk.decode("utf-8")
-                        # openai api returns \n\n as a delimiter for messages
-                        while "\n\n" in buffer:
-                            message, buffer = buffer.split("\n\n", 1)
-                            yield json.loads(message)
+                # openai api returns \n\n as a delimiter for messages
+                async for block in aiter_blocks(response.content.iter_any()):
+                    if block:
+                        yield json.loads(block)
 
 
 # help: https://www.perplexity.ai/search/wo-shi-yong-requests-shi-xian-q_g712n3SBObB5xH_2fnMQ
@@ -95,10 +88,9 @@ def httpx_sync_chat(data: dict):
             ) as response:
                 response.raise_for_status()
 
-                chunk: str
-                for chunk in response.iter_lines():
-                    if chunk:
-                        yield json.loads(chunk)
+                for block in iter_blocks(response.iter_bytes()):
+                    if block:
+                        yield json.loads(block)
 
 
 async def httpx_async_chat(data: dict):
@@ -118,10 +110,9 @@ async def httpx_async_chat(data: dict):
             ) as response:
                 response.raise_for_status()
 
-                chunk: str
-                async for chunk in response.aiter_lines():
-                    if chunk:
-                        yield json.loads(chunk)
+                async for block in aiter_blocks(response.aiter_bytes()):
+                    if block:
+                        yield json.loads(block)
 
 
 async def async_chat(data: dict, func: callable):
@@ -167,3 +158,15 @@ if __name__ == "__main__":
     asyncio.run(async_chat(data, httpx_async_chat))
     asyncio.run(async_chat(data_stream, httpx_async_chat))
 
+
+    print("\n")
+
+    # 复用连接池, server.py 的事件块是 json, 不是 SSE 格式
+    from chat_client import ChatClient
+
+    with ChatClient(URL, headers=headers, sse=False) as client:
+        for output in client.chat(data):
+            print(output)
+
+        for output in client.chat(data_stream):
+            print(output)
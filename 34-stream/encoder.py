@@ -0,0 +1,115 @@
+# 预先渲染流式响应 chunk 中不变的部分, 每个 token 只拼接变化的字段
+# 输出与 ChatCompletionChunk(...).model_dump_json() 逐字节相同
+import os
+import json
+from json.encoder import encode_basestring
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# 可选依赖, 没有安装时使用 json.dumps
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 非流式响应是否跳过 response_model 的校验, 直接序列化
+# linux:
+#     export MOCK_FAST_JSON=1
+fast_json = os.getenv("MOCK_FAST_JSON", "0") == "1"
+
+
+def dumps(value) -> str:
+    """与 pydantic 的 JSON 输出格式相同: 不转义非 ASCII 字符, 没有空格"""
+    if value is None:
+        return "null"
+    if isinstance(value, str):
+        return encode_basestring(value)
+    if isinstance(value, float):
+        return repr(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class ChunkEncoder:
+    """一次流式响应的 chunk 编码器
+
+    id, model 等字段在整个流中不变, 在创建时渲染一次;
+    encode 只序列化 content, index, finish_reason, references, created 和 usage。
+    """
+
+    def __init__(
+        self,
+        id: str | int | None,
+        model: str | None = None,
+        service_tier: str | None = None,
+        system_fingerprint: str | None = None,
+    ):
+        self.head = f'{{"id":{dumps(id)},"choices":[{{"index":'
+        self.tail = (
+            f',"model":{dumps(model)}'
+            f',"object":"chat.completion.chunk"'
+            f',"service_tier":{dumps(service_tier)}'
+            f',"system_fingerprint":{dumps(system_fingerprint)}'
+            f',"usage":'
+        )
+
+    def encode(
+        self,
+        content: str | None = None,
+        index: int = 0,
+        finish_reason: str | None = None,
+        role: str | None = None,
+        references: list[str] | None = None,
+        created: int | float | None = None,
+        prompt_tokens: int | None = None,
+        completion_tokens: int | None = None,
+    ) -> str:
+        """返回 chunk 的 JSON, prompt_tokens 为 None 时 usage 为 null"""
+        if prompt_tokens is None:
+            usage = "null}"
+        else:
+            usage = (
+                f'{{"prompt_tokens":{prompt_tokens}'
+                f',"completion_tokens":{completion_tokens}'
+                f',"total_tokens":{prompt_tokens + completion_tokens}}}}}'
+            )
+        return (
+            f"{self.head}{index}"
+            f',"finish_reason":{dumps(finish_reason)}'
+            f',"logprobs":null'
+            f',"delta":{{"content":{dumps(content)}'
+            f',"references":{dumps(references)}'
+            f',"role":{dumps(role)}'
+            f',"refusal":false,"function_call":null,"tool_calls":null}}}}]'
+            f',"created":{dumps(created)}'
+            f"{self.tail}{usage}"
+        )
+
+    def encode_event(self, *args, **kwargs) -> str:
+        """SSE 格式的 chunk"""
+        return f"data: {self.encode(*args, **kwargs)}\n\n"
+
+
+def encode_response(response: str | None) -> str:
+    """server.py 中 Response(response=...).model_dump_json() 的快速版本"""
+    return f'{{"response":{dumps(response)}}}'
+
+
+class TrustedJSONResponse(JSONResponse):
+    """openai_server 的非流式响应, 直接序列化构造时已经校验过的 ChatCompletion
+
+    跳过 FastAPI 按 response_model 的再次校验, 模型由 pydantic-core 直接输出 JSON bytes;
+    dict 等普通数据安装了 orjson 时使用 orjson, 否则使用 json.dumps
+    """
+
+    def render(self, content) -> bytes:
+        if isinstance(content, BaseModel):
+            # 与 FastAPI 默认的 by_alias=True 相同
+            return content.__pydantic_serializer__.to_json(content, by_alias=True)
+        if orjson is not None:
+            try:
+                return orjson.dumps(content)
+            except TypeError:
+                # 超过 64 位的整数等 orjson 不支持的值
+                pass
+        return super().render(content)
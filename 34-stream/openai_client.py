@@ -5,6 +5,7 @@ import requests
 import aiohttp
 import httpx
 import json
+from sse import iter_events, aiter_events
 
 
 URL = "http://localhost:8000/v1/chat/completions"
@@ -47,14 +48,11 @@ def requests_chat(data: dict):
         if not stream:
             yield response.json()
         else:
-            chunk: bytes
-            for chunk in response.iter_lines(
-                chunk_size=8192, decode_unicode=False, delimiter=b"\n\n"
-            ):
-                message: str = chunk.decode("utf-8")
-                if message.startswith("data: ") and not message.endswith("[DONE]"):
-                    message = message[6:]
-                    yield json.loads(message)
+            # 增量解析 SSE 字节流, 多字节字符被拆开时也能正确解码
+            for event in iter_events(response.iter_content(chunk_size=None)):
+                if event.data == "[DONE]":
+                    break
+                yield json.loads(event.data)
 
 
 # https://www.perplexity.ai/search/wo-shi-yong-aiohttpshi-xian-mo-6J27VL0aQsGNCykznLPlMw
@@ -71,16 +69,11 @@ async def aiohttp_async_chat(data: dict):
                 data: str = await response.text("utf-8")
                 yield json.loads(data)
             else:
-                chunk: bytes
-                buffer = ""
-                async for chunk in response.content.iter_any():
-                    buffer += chunk.decode("utf-8")
-                    # openai api returns \n\n as a delimiter for messages
-                    while "\n\n" in buffer:
-                        message, buffer = buffer.split("\n\n", 1)
-                        if message.startswith("data: ") and not message.endswith("[DONE]"):
-                            message = message[6:]
-                            yield json.loads(message)
+                # openai api returns \n\n as a delimiter for messages
+                async for event in aiter_events(response.content.iter_any()):
+                    if event.data == "[DONE]":
+                        break
+                    yield json.loads(event.data)
 
 
 # help: https://www.perplexity.ai/search/wo-shi-yong-requests-shi-xian-q_g712n3SBObB5xH_2fnMQ
@@ -101,10 +94,10 @@ def httpx_sync_chat(data: dict):
             ) as response:
                 response.raise_for_status()
 
-                chunk: str
-                for chunk in response.iter_lines():
-                    if chunk and chunk.startswith("data: ") and not chunk.endswith("[DONE]"):
-                        yield json.loads(chunk[6:])
+                for event in iter_events(response.iter_bytes()):
+                    if event.data == "[DONE]":
+                        break
+                    yield json.loads(event.data)
 
 
 async def httpx_async_chat(data: dict):
@@ -124,10 +117,10 @@ async def httpx_async_chat(data: dict):
             ) as response:
                 response.raise_for_status()
 
-                chunk: str
-                async for chunk in response.aiter_lines():
-                    if chunk.startswith("data: ") and not chunk.endswith("[DONE]"):
-                        yield json.loads(chunk[6:])
+                async for event in aiter_events(response.aiter_bytes()):
+                    if event.data == "[DONE]":
+                        break
+                    yield json.loads(event.data)
 
 
 async def async_chat(data: dict, func: callable):
@@ -184,3 +177,36 @@ if __name__ == "__main__":
 
     asyncio.run(async_chat(data, httpx_async_chat))
     asyncio.run(async_chat(data_stream, httpx_async_chat))
+
+    print("\n")
+
+    # 复用连接池, 多次请求不会重新建立连接
+    from chat_client import ChatClient
+
+    with ChatClient(URL, headers=headers) as client:
+        for output in client.chat(data):
+            print(output)
+
+        for output in client.chat(data_stream):
+            print(output)
+
+    async def pooled_chat():
+        async with ChatClient(URL, headers=headers) as client:
+            async for output in client.achat(data):
+                print(output)
+            async for output in client.achat(data_stream):
+                print(output)
+
+    asyncio.run(pooled_chat())
+
+    # 批量并发请求, 失败时自动重试, 结果按输入顺序返回
+    async def batch_chat():
+        payloads = (
+            {**data, "messages": [{"role": "user", "content": question}]}
+            for question in ["猫和老鼠的作者是谁?", "讲一个猫和老鼠的故事"]
+        )
+        async with ChatClient(URL, headers=headers) as client:
+            async for result in client.abatch(payloads, concurrency=8, ordered=True):
+                print(result.index, result.attempts, result.error or result.output)
+
+    asyncio.run(batch_chat())
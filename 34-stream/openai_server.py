@@ -5,6 +5,9 @@ from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 import numpy as np
 import random
+from simulation import latency, faults, verbose, StreamAborted
+from sse import coalesce_events
+from encoder import ChunkEncoder, TrustedJSONResponse, fast_json
 
 
 app = FastAPI()
@@ -279,10 +282,12 @@ class ChatCompletionChunk(BaseModel):
 # http://127.0.0.1:8000/docs
 @app.post("/v1/chat/completions", response_model=ChatCompletion)
 async def chat(request: ChatRequest):
-    print("request: ", request)
+    if verbose:
+        print("request: ", request)
 
     messages = request.messages
-    print("messages: ", messages)
+    if verbose:
+        print("messages: ", messages)
 
     if not messages or len(messages) == 0:
         raise HTTPException(status_code=400, detail="No messages provided")
@@ -296,8 +301,14 @@ async def chat(request: ChatRequest):
         raise HTTPException(status_code=400, detail="content is empty")
     content_len = len(content)
 
+    # 按概率注入错误
+    status_code = faults.request_error()
+    if status_code is not None:
+        raise HTTPException(status_code=status_code, detail="Injected error")
+
     number = str(np.random.randint(0, 100, 10))
-    print(f"number: {number}")
+    if verbose:
+        print(f"number: {number}")
     references = [f"book{i+1}" for i in np.random.randint(1, 5, 3)]
 
     session_id = random.getrandbits(64)
@@ -305,59 +316,48 @@ async def chat(request: ChatRequest):
     # 流式响应
     if request.stream:
 
+        # 按概率在某个 token 之后断开
+        abort_at = faults.stream_error_at(len(number))
+
+        # 不变的字段在整个流中只渲染一次
+        encoder = ChunkEncoder(id=session_id)
+
         async def generate():
             for i, n in enumerate(number):
-                time.sleep(0.2)
-                chat_completion_chunk = ChatCompletionChunk(
-                    id=session_id,
-                    choices=[
-                        ChatCompletionChunkChoice(
-                            index=0,
-                            finish_reason=None,
-                            delta=ChoiceDelta(
-                                content=n,
-                                role="assistant",
-                            ),
-                        )
-                    ],
+                # 异步等待, 不阻塞其他请求
+                if i == 0:
+                    await latency.wait_first_token()
+                else:
+                    await latency.wait_next_token()
+                if i == abort_at:
+                    raise StreamAborted(f"injected stream error after {i} tokens")
+                # 与 ChatCompletionChunk(...).model_dump_json() 的输出相同
+                # openai api returns \n\n as a delimiter for messages
+                yield encoder.encode_event(
+                    content=n,
+                    role="assistant",
                     created=time.time(),
-                    usage=CompletionUsage(
-                        prompt_tokens=content_len,
-                        completion_tokens=i + 1,
-                        total_tokens=content_len + i + 1,
-                    ),
+                    prompt_tokens=content_len,
+                    completion_tokens=i + 1,
                 )
-                print(chat_completion_chunk)
-                # openai api returns \n\n as a delimiter for messages
-                yield f"data: {chat_completion_chunk.model_dump_json()}\n\n"
-
-            chat_completion_chunk = ChatCompletionChunk(
-                id=session_id,
-                choices=[
-                    ChatCompletionChunkChoice(
-                        index=0,
-                        finish_reason="stop",
-                        delta=ChoiceDelta(
-                            references=references,
-                        ),
-                    )
-                ],
+
+            yield encoder.encode_event(
+                finish_reason="stop",
+                references=references,
                 created=time.time(),
-                usage=CompletionUsage(
-                    prompt_tokens=content_len,
-                    completion_tokens=len(number),
-                    total_tokens=content_len + len(number),
-                ),
+                prompt_tokens=content_len,
+                completion_tokens=len(number),
             )
-            print(chat_completion_chunk)
-            # openai api returns \n\n as a delimiter for messages
-            yield f"data: {chat_completion_chunk.model_dump_json()}\n\n"
 
             yield "data: [DONE]\n\n"
 
-        return StreamingResponse(generate())
+        # 按 SSE_MAX_BYTES / SSE_MAX_DELAY 合并多个事件后写入
+        return StreamingResponse(coalesce_events(generate()))
 
-    # 非流式响应
+    # 非流式响应, 等待完整生成的时间
+    await latency.wait_first_token()
+    for _ in range(len(number) - 1):
+        await latency.wait_next_token()
     chat_completion = ChatCompletion(
         id=session_id,
         choices=[
@@ -378,7 +378,11 @@ async def chat(request: ChatRequest):
             total_tokens=content_len + len(number),
         ),
     )
-    print(chat_completion)
+    if verbose:
+        print(chat_completion)
+    # 模型是服务端自己创建的, 跳过 response_model 的再次校验
+    if fast_json:
+        return TrustedJSONResponse(chat_completion)
     return chat_completion
 
 
@@ -1,9 +1,11 @@
 # https://github.com/vllm-project/vllm/blob/main/vllm/entrypoints/api_server.py
-import time
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 import numpy as np
+from simulation import latency, faults, verbose, StreamAborted
+from sse import coalesce_events
+from encoder import encode_response
 
 
 app = FastAPI()
@@ -72,7 +74,8 @@ class Response(BaseModel):
 # http://127.0.0.1:8000/docs
 @app.post("/chat", response_model=Response)
 async def chat(request: ChatRequest):
-    print(request)
+    if verbose:
+        print(request)
 
     if not request.messages or len(request.messages) == 0:
         raise HTTPException(status_code=400, detail="No messages provided")
@@ -85,21 +88,40 @@ async def chat(request: ChatRequest):
     if not content:
         raise HTTPException(status_code=400, detail="content is empty")
 
+    # 按概率注入错误
+    status_code = faults.request_error()
+    if status_code is not None:
+        raise HTTPException(status_code=status_code, detail="Injected error")
+
     if request.stream:
+        numbers = np.random.randint(0, 100, 10)
+        # 按概率在某个 token 之后断开
+        abort_at = faults.stream_error_at(len(numbers))
 
         async def generate():
-            for i in np.random.randint(0, 100, 10):
-                time.sleep(0.2)
-                response = Response(response=str(i))
-                print(response)
+            for j, i in enumerate(numbers):
+                # 异步等待, 不阻塞其他请求
+                if j == 0:
+                    await latency.wait_first_token()
+                else:
+                    await latency.wait_next_token()
+                if j == abort_at:
+                    raise StreamAborted(f"injected stream error after {j} tokens")
+                # 与 Response(response=str(i)).model_dump_json() 的输出相同
                 # openai api returns \n\n as a delimiter for messages
-                yield response.model_dump_json() + "\n\n"
-
-        return StreamingResponse(generate())
-
-    number = str(np.random.randint(0, 100, 10))
-    response = Response(response=number)
-    print(response)
+                yield encode_response(str(i)) + "\n\n"
+
+        # 按 SSE_MAX_BYTES / SSE_MAX_DELAY 合并多个事件后写入
+        return StreamingResponse(coalesce_events(generate()))
+
+    numbers = np.random.randint(0, 100, 10)
+    # 非流式响应, 等待完整生成的时间
+    await latency.wait_first_token()
+    for _ in range(len(numbers) - 1):
+        await latency.wait_next_token()
+    response = Response(response=str(numbers))
+    if verbose:
+        print(response)
     return response
 
 
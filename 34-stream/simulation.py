@@ -0,0 +1,128 @@
+# 模拟服务器的延迟和错误, 用于压力测试网关
+# 通过环境变量配置, 例如:
+#   export MOCK_TTFT=0.5                # 首个 token 的延迟, 单位秒
+#   export MOCK_ITL=0.05                # token 之间的平均延迟, 单位秒
+#   export MOCK_ITL_DIST=lognormal      # 延迟分布: constant | uniform | normal | exponential | lognormal
+#   export MOCK_ITL_STD=0.02            # 延迟的标准差, uniform 时为半宽
+#   export MOCK_TOKENS_PER_SECOND=50    # 设置后覆盖 MOCK_ITL, 平均延迟为 1 / tokens_per_second
+#   export MOCK_ERROR_RATE=0.01         # 请求直接返回错误的概率
+#   export MOCK_ERROR_STATUS=503        # 返回错误时的状态码
+#   export MOCK_STREAM_ERROR_RATE=0.01  # 流式响应中途断开的概率
+#   export MOCK_VERBOSE=0               # 是否打印请求, 压测时关闭
+import asyncio
+import math
+import os
+import random
+
+
+def env_float(name: str, default: float | None) -> float | None:
+    value = os.getenv(name)
+    return default if value is None or value == "" else float(value)
+
+
+class LatencyModel:
+    """首个 token 的延迟 (TTFT) 和 token 之间的延迟 (ITL)"""
+
+    distributions = ("constant", "uniform", "normal", "exponential", "lognormal")
+
+    def __init__(
+        self,
+        ttft: float = 0.2,
+        itl: float = 0.2,
+        itl_std: float = 0.0,
+        distribution: str = "constant",
+        ttft_std: float = 0.0,
+    ):
+        if distribution not in self.distributions:
+            raise ValueError(f"unknown latency distribution: {distribution}")
+        self.ttft = ttft
+        self.ttft_std = ttft_std
+        self.itl = itl
+        self.itl_std = itl_std
+        self.distribution = distribution
+
+    @classmethod
+    def from_env(cls) -> "LatencyModel":
+        itl = env_float("MOCK_ITL", 0.2)
+        tokens_per_second = env_float("MOCK_TOKENS_PER_SECOND", None)
+        if tokens_per_second:
+            itl = 1 / tokens_per_second
+        return cls(
+            ttft=env_float("MOCK_TTFT", 0.2),
+            ttft_std=env_float("MOCK_TTFT_STD", 0.0),
+            itl=itl,
+            itl_std=env_float("MOCK_ITL_STD", 0.0),
+            distribution=os.getenv("MOCK_ITL_DIST", "constant"),
+        )
+
+    def sample(self, mean: float, std: float) -> float:
+        if mean <= 0:
+            return 0.0
+        if self.distribution == "constant" or std <= 0:
+            return mean
+        if self.distribution == "uniform":
+            return max(0.0, random.uniform(mean - std, mean + std))
+        if self.distribution == "normal":
+            return max(0.0, random.gauss(mean, std))
+        if self.distribution == "exponential":
+            return random.expovariate(1 / mean)
+        # lognormal: 给定均值和标准差, 换算成底层正态分布的参数
+        sigma2 = math.log(1 + (std / mean) ** 2)
+        mu = math.log(mean) - sigma2 / 2
+        return random.lognormvariate(mu, math.sqrt(sigma2))
+
+    def first_token_delay(self) -> float:
+        return self.sample(self.ttft, self.ttft_std)
+
+    def inter_token_delay(self) -> float:
+        return self.sample(self.itl, self.itl_std)
+
+    async def wait_first_token(self) -> None:
+        # 使用 asyncio.sleep, 等待期间事件循环可以处理其他请求
+        await asyncio.sleep(self.first_token_delay())
+
+    async def wait_next_token(self) -> None:
+        await asyncio.sleep(self.inter_token_delay())
+
+
+class FaultInjector:
+    """按概率注入错误"""
+
+    def __init__(
+        self,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        stream_error_rate: float = 0.0,
+    ):
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stream_error_rate = stream_error_rate
+
+    @classmethod
+    def from_env(cls) -> "FaultInjector":
+        return cls(
+            error_rate=env_float("MOCK_ERROR_RATE", 0.0),
+            error_status=int(env_float("MOCK_ERROR_STATUS", 500)),
+            stream_error_rate=env_float("MOCK_STREAM_ERROR_RATE", 0.0),
+        )
+
+    def request_error(self) -> int | None:
+        """返回需要返回的错误状态码, 不注入错误时返回 None"""
+        if self.error_rate > 0 and random.random() < self.error_rate:
+            return self.error_status
+        return None
+
+    def stream_error_at(self, tokens: int) -> int | None:
+        """流式响应在第几个 token 后断开, 不断开时返回 None"""
+        if self.stream_error_rate > 0 and random.random() < self.stream_error_rate:
+            return random.randrange(tokens) if tokens > 0 else 0
+        return None
+
+
+class StreamAborted(Exception):
+    """注入的流式响应中途错误, 服务器会直接断开连接"""
+
+
+latency = LatencyModel.from_env()
+faults = FaultInjector.from_env()
+verbose = os.getenv("MOCK_VERBOSE", "1") not in ("0", "false", "False")
@@ -0,0 +1,239 @@
+# SSE 工具
+# - coalesce_events: 服务器端把多个 SSE 事件合并成一次写入, 不改变事件边界
+# - SSEDecoder / iter_events / aiter_events: 客户端增量解析 SSE 字节流
+# 通过环境变量配置:
+#   export SSE_MAX_BYTES=4096       # 缓冲区达到多少字节时写入
+#   export SSE_MAX_DELAY=0.02       # 第一个事件最多等待多少秒后写入, 0 表示不合并
+#   export SSE_FLUSH_ON_FINISH=1    # 最后一个事件 (finish_reason 或 [DONE]) 到达时立即写入
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+
+
+max_bytes: int = int(os.getenv("SSE_MAX_BYTES", 4096))
+max_delay: float = float(os.getenv("SSE_MAX_DELAY", 0))
+flush_on_finish: bool = os.getenv("SSE_FLUSH_ON_FINISH", "1") not in ("0", "false")
+
+
+def is_final_event(event: str) -> bool:
+    """结束事件: [DONE] 或者带有 finish_reason 的 chunk"""
+    return event.startswith("data: [DONE]") or '"finish_reason":"' in event
+
+
+async def coalesce_events(
+    events: AsyncIterable[str],
+    max_bytes: int = max_bytes,
+    max_delay: float = max_delay,
+    flush_on_finish: bool = flush_on_finish,
+    is_final: Callable[[str], bool] = is_final_event,
+) -> AsyncIterator[str]:
+    """合并完整的 SSE 事件, 满足任一条件时写入:
+
+    - 缓冲区达到 max_bytes (按字符数计算)
+    - 缓冲区中第一个事件已经等待了 max_delay 秒
+    - flush_on_finish 时收到结束事件
+    - 上游结束, 缓冲区中剩余的事件总是会写入
+
+    后台任务读取事件放入缓冲区, 每个事件只是一次 append;
+    计时使用 loop.call_at, 每次写入最多一个定时器。缓冲区满时后台任务暂停读取 (背压)。
+    """
+    if max_delay <= 0:
+        # 不合并, 每个事件写入一次
+        async for event in events:
+            yield event
+        return
+
+    loop = asyncio.get_running_loop()
+    buffer: list[str] = []
+    size = 0
+    finished = False
+    timer: asyncio.TimerHandle | None = None
+    # 可以写入时设置
+    ready = asyncio.Event()
+    # 缓冲区被取走后设置
+    drained = asyncio.Event()
+
+    async def produce() -> None:
+        nonlocal size, finished, timer
+        try:
+            async for event in events:
+                buffer.append(event)
+                size += len(event)
+                if size >= max_bytes or (flush_on_finish and is_final(event)):
+                    ready.set()
+                    if size >= max_bytes:
+                        drained.clear()
+                        await drained.wait()
+                elif timer is None:
+                    timer = loop.call_at(loop.time() + max_delay, ready.set)
+        finally:
+            finished = True
+            ready.set()
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            await ready.wait()
+            ready.clear()
+            if timer is not None:
+                timer.cancel()
+                timer = None
+            if buffer:
+                data = "".join(buffer)
+                buffer.clear()
+                size = 0
+                drained.set()
+                yield data
+            if finished and not buffer:
+                break
+        # 上游出错时把异常抛给调用方
+        error = producer.exception()
+        if error is not None:
+            raise error
+    finally:
+        if timer is not None:
+            timer.cancel()
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except BaseException:
+                pass
+
+
+# -------------------- 客户端解析 --------------------#
+@dataclass(slots=True)
+class SSEEvent:
+    data: str
+    event: str = "message"
+    id: str | None = None
+    retry: int | None = None
+
+
+class SSEDecoder:
+    """增量解析 SSE 字节流, 按空行切分事件块
+
+    - 在字节上查找分隔符, 每个字节只扫描一次, 已经扫描过的部分不会重复查找
+    - 分隔符都是 ASCII 字节, 不会出现在多字节 UTF-8 字符中间, 所以完整的事件块总是可以直接解码,
+      被拆到两个 chunk 中的多字节字符会留在缓冲区中, 等到事件块完整后一起解码
+    - 支持 \\n, \\r\\n 和 \\r 三种换行, 统一转换为 \\n, 跨 chunk 的 \\r\\n 也能正确处理
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        # 下次从这里开始查找分隔符
+        self.scan_from = 0
+        # 上一个 chunk 以 \r 结尾, 需要看下一个字节是不是 \n
+        self.pending_cr = False
+        self.started = False
+
+    def feed(self, chunk: bytes) -> list[str]:
+        """输入一段字节, 返回已经完整的事件块"""
+        if self.pending_cr:
+            chunk = b"\r" + chunk
+            self.pending_cr = False
+        if b"\r" in chunk:
+            if chunk.endswith(b"\r"):
+                chunk = chunk[:-1]
+                self.pending_cr = True
+            chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        buffer = self.buffer
+        buffer += chunk
+        scan_from = self.scan_from
+        # 分隔符可能被拆到两个 chunk 中, 下次从最后一个字节开始查找
+        self.scan_from = len(buffer) - 1
+        # 大部分 chunk 中没有分隔符, 直接返回
+        index = buffer.find(b"\n\n", scan_from)
+        if index < 0:
+            return []
+
+        blocks = []
+        start = 0
+        while index >= 0:
+            blocks.append(self._decode(buffer[start:index]))
+            start = index + 2
+            index = buffer.find(b"\n\n", start)
+        del buffer[:start]
+        self.scan_from = max(0, len(buffer) - 1)
+        return blocks
+
+    def flush(self) -> list[str]:
+        """字节流结束, 返回缓冲区中剩余的事件块"""
+        if self.pending_cr:
+            self.pending_cr = False
+            self.buffer += b"\n"
+        blocks = []
+        remaining = bytes(self.buffer).strip(b"\n")
+        if remaining:
+            blocks.extend(self._decode(block) for block in remaining.split(b"\n\n"))
+        self.buffer.clear()
+        self.scan_from = 0
+        return blocks
+
+    def _decode(self, block: bytes | bytearray) -> str:
+        text = block.decode("utf-8")
+        # 去掉流开头的 BOM
+        if not self.started:
+            self.started = True
+            if text.startswith("\ufeff"):
+                text = text[1:]
+        return text
+
+
+def parse_event(block: str) -> SSEEvent | None:
+    """解析一个事件块, 没有 data 字段时返回 None"""
+    data = []
+    event = SSEEvent("")
+    for line in block.split("\n"):
+        # 空行和注释
+        if not line or line[0] == ":":
+            continue
+        field, _, value = line.partition(":")
+        if value[:1] == " ":
+            value = value[1:]
+        if field == "data":
+            data.append(value)
+        elif field == "event":
+            event.event = value
+        elif field == "id":
+            event.id = value
+        elif field == "retry" and value.isdigit():
+            event.retry = int(value)
+    if not data:
+        return None
+    event.data = "\n".join(data)
+    return event
+
+
+def iter_blocks(chunks: Iterable[bytes]) -> Iterator[str]:
+    decoder = SSEDecoder()
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+    yield from decoder.flush()
+
+
+async def aiter_blocks(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        for block in decoder.feed(chunk):
+            yield block
+    for block in decoder.flush():
+        yield block
+
+
+def iter_events(chunks: Iterable[bytes]) -> Iterator[SSEEvent]:
+    for block in iter_blocks(chunks):
+        event = parse_event(block)
+        if event is not None:
+            yield event
+
+
+async def aiter_events(chunks: AsyncIterable[bytes]) -> AsyncIterator[SSEEvent]:
+    async for block in aiter_blocks(chunks):
+        event = parse_event(block)
+        if event is not None:
+            yield event
+
+
+# -------------------- 客户端解析 --------------------#
@@ -0,0 +1,113 @@
+# SSE 解析器的模糊测试, 在随机位置切分字节流, 结果必须与一次性解析相同
+# 运行:
+#   pytest test_sse.py
+import asyncio
+import json
+import random
+
+import pytest
+
+from sse import SSEDecoder, SSEEvent, aiter_events, iter_blocks, iter_events
+
+
+TEXTS = ["hello", "你好世界", "🙂🙃", "naïve café", 'quote " back \\ slash', "[DONE]"]
+
+
+def random_event(rng: random.Random) -> SSEEvent:
+    lines = [
+        rng.choice(TEXTS) + str(rng.randint(0, 999))
+        for _ in range(rng.randint(1, 3))
+    ]
+    return SSEEvent(
+        data="\n".join(lines),
+        event=rng.choice(["message", "delta", "ping"]),
+        id=rng.choice([None, str(rng.randint(1, 100))]),
+    )
+
+
+def render(event: SSEEvent, newline: str, rng: random.Random) -> str:
+    lines = []
+    if rng.random() < 0.2:
+        lines.append(": comment")
+    if event.event != "message":
+        lines.append(f"event: {event.event}")
+    if event.id is not None:
+        lines.append(f"id:{event.id}")
+    lines.extend(f"data: {line}" for line in event.data.split("\n"))
+    return newline.join(lines) + newline + newline
+
+
+def random_splits(data: bytes, rng: random.Random) -> list[bytes]:
+    """在随机位置切分, 包括多字节字符和 \\r\\n 的中间"""
+    k = min(len(data) - 1, rng.randint(0, 40))
+    cuts = sorted(rng.sample(range(1, len(data)), k=k))
+    return [data[i:j] for i, j in zip([0] + cuts, cuts + [len(data)])]
+
+
+@pytest.mark.parametrize("seed", range(200))
+@pytest.mark.parametrize("newline", ["\n", "\r\n", "\r"])
+def test_random_boundaries(seed: int, newline: str):
+    rng = random.Random(seed)
+    events = [random_event(rng) for _ in range(rng.randint(1, 8))]
+    data = "".join(render(event, newline, rng) for event in events).encode("utf-8")
+    if seed % 10 == 0:
+        # 流开头的 BOM
+        data = "\ufeff".encode("utf-8") + data
+
+    assert list(iter_events(random_splits(data, rng))) == events
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n", "\r"])
+def test_every_byte_boundary(newline: str):
+    rng = random.Random(0)
+    events = [random_event(rng) for _ in range(5)]
+    data = "".join(render(event, newline, rng) for event in events).encode("utf-8")
+
+    # 每次只输入一个字节
+    assert list(iter_events(data[i : i + 1] for i in range(len(data)))) == events
+    # 在每一个位置切成两段
+    for i in range(1, len(data)):
+        assert list(iter_events([data[:i], data[i:]])) == events
+
+
+def test_multibyte_split():
+    data = "data: 你好🙂\n\n".encode("utf-8")
+    # "你" 的三个字节被拆到三个 chunk 中
+    start = data.index("你".encode("utf-8"))
+    chunks = [data[: start + 1], data[start + 1 : start + 2], data[start + 2 :]]
+    assert [e.data for e in iter_events(chunks)] == ["你好🙂"]
+
+
+def test_no_trailing_blank_line():
+    # 流结束时最后一个事件没有空行
+    assert [e.data for e in iter_events([b"data: a\n\ndata: b"])] == ["a", "b"]
+
+
+def test_raw_json_blocks():
+    # server.py 返回不带 data: 前缀的 JSON, 按空行切分
+    payloads = [{"response": str(i)} for i in range(3)]
+    data = "".join(json.dumps(p) + "\n\n" for p in payloads).encode()
+    assert [json.loads(b) for b in iter_blocks([data[:5], data[5:]])] == payloads
+
+
+def test_scan_is_incremental():
+    # 一个很大的事件被拆成很多小 chunk, 每次只查找新输入的字节
+    decoder = SSEDecoder()
+    for _ in range(10000):
+        assert decoder.feed(b"x" * 10) == []
+        assert decoder.scan_from >= len(decoder.buffer) - 1
+    assert decoder.feed(b"\n\n") == ["x" * 100000]
+
+
+def test_async_iterator():
+    async def chunks():
+        yield b"data: a\r"
+        yield b"\n\r\ndata: "
+        yield "你".encode()[:2]
+        yield "你".encode()[2:]
+        yield b"\n\n"
+
+    async def collect():
+        return [e.data async for e in aiter_events(chunks())]
+
+    assert asyncio.run(collect()) == ["a", "你"]
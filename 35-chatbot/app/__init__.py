@@ -1,7 +1,6 @@
 from .envs import ENVS  # Noqa
 from .core import engine, Session, Base  # Noqa
-from .models import ConversationDB, ModelDB, UserDB  # Noqa
+from .models import ConversationDB, MessageDB, ModelDB, UserDB  # Noqa
 
 
-# Create all tables
-Base.metadata.create_all(engine)
+# 表在应用启动时创建, 见 main.py 中的 lifespan
@@ -1,4 +1,5 @@
 from .users import users_router
 from .chat import chat_router
+from .metrics import metrics_router
 
-__all__ = ["users_router", "chat_router"]
+__all__ = ["users_router", "chat_router", "metrics_router"]
@@ -1,24 +1,63 @@
 # https://github.com/vllm-project/vllm/blob/main/vllm/entrypoints/api_server.py
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import StreamingResponse
+import base64
+import datetime
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field
 from typing import Annotated
 import openai
-from openai import OpenAI
+from openai import AsyncOpenAI
 from openai.types.chat.chat_completion import ChatCompletion
+from openai.types.completion_usage import CompletionUsage
+from sqlalchemy import literal, select, tuple_
+
+from ...core import (
+    get_llm_client,
+    StreamRelay,
+    coalesce_events,
+    rate_limiter,
+    singleflight,
+    dispatcher,
+    TrustedJSONResponse,
+    fast_response,
+    get_tokenizer,
+    count_message_tokens,
+    StreamTokenCounter,
+    completion_cache,
+    completion_from_stream,
+    replay_stream,
+    ConversationRecord,
+    conversation_writer,
+    ContextWindow,
+    session_scope,
+)
+from ...models import (
+    ModelDB,
+    ConversationDB,
+    MessageDB,
+    CachedUser,
+    get_cached_user,
+    get_or_create_model_id,
+    reserve_conversation,
+    load_context,
+)
 
-from ...core import Session
-from ...models import UserDB, ModelDB, ConversationDB
-from ...envs import ENVS
-
+from ...schemas import ChatMessage
 from ...dependencies import (
     verify_access_token,
     oauth2_scheme,
+    DBSession,
+    RateLimit,
+    acquire_stream_slot,
 )
 
 
 DEFAULT_MODEL = "gpt4o"
 
+logger = logging.getLogger(__name__)
+
 
 router = APIRouter()
 # 可以使用它来声明*路径操作*。
@@ -28,21 +67,6 @@ router = APIRouter()
 # 所有相同的 parameters、responses、dependencies、tags 等等。
 
 
-chatbot_config = ENVS.get("chatbot", {})
-api_key: str = chatbot_config.get("api_key", "I AM AN API_KEY")
-base_url: str = chatbot_config.get("base_url", "http://localhost:8000/v1/")
-
-
-client = OpenAI(
-    api_key=api_key,
-    base_url=base_url,
-)
-
-
-# 创建数据库会话
-session = Session()
-
-
 # 与声明查询参数一样，包含默认值的模型属性是可选的，否则就是必选的。默认值为 None 的模型属性也是可选的。
 class ChatRequest(BaseModel):
     model: str | None = Field(
@@ -50,7 +74,8 @@ class ChatRequest(BaseModel):
         description="The model used for generating the response",
         examples=["gpt4o", "gpt4"],
     )
-    messages: list[dict[str, str | list]] = Field(
+    # 校验一次后得到 ChatMessage 对象, 之后计数, 缓存和保存都直接使用, 不再复制
+    messages: list[ChatMessage] = Field(
         None,
         description="List of dictionaries containing the input text and the corresponding user id",
         examples=[
@@ -107,155 +132,415 @@ class ChatRequest(BaseModel):
             123456,
         ],
     )
+    priority: int | None = Field(
+        None,
+        ge=0,
+        le=2,
+        description="Scheduling priority of the request, 0 is the highest. "
+        "It can only lower the priority the server allows for the user, which is the default",
+    )
+    # 服务端读取历史消息并按上下文长度裁剪, 客户端只需要发送新的消息
+    use_history: bool = Field(
+        False,
+        description="Load the previous messages of the conversation on the server, messages only contain the new turn. "
+        "A new conversation is created when conversation_id is empty, its id is returned in the X-Conversation-Id header",
+    )
 
 
-def save_conversation(
-    user: UserDB,
-    model: ModelDB,
-    messages: list[dict[str, str]],
+async def save_conversation(
+    user_id: int,
+    model_id: int,
+    messages: list[ChatMessage],
+    reply: ChatMessage,
     input_tokens: int,
     output_tokens: int,
     conversation_id=None,
-):
-    conversation = (
-        session.query(ConversationDB).get(conversation_id) if conversation_id else None
-    )
-    if conversation:
-        conversation.messages = messages
-        conversation.model = model
-        conversation.input_tokens = input_tokens
-        conversation.output_tokens = output_tokens
-    else:
-        conversation = ConversationDB(
+    turn_start: int = 0,
+    append: bool = False,
+    model_name: str | None = None,
+) -> None:
+    # 放入队列, 由后台任务批量写入数据库
+    await conversation_writer.enqueue(
+        ConversationRecord(
+            user_id=user_id,
+            model_id=model_id,
             messages=messages,
-            user=user,
-            model=model,
+            reply=reply,
             input_tokens=input_tokens,
             output_tokens=output_tokens,
+            conversation_id=conversation_id,
+            turn_start=turn_start,
+            append=append,
+            model_name=model_name,
         )
-        session.add(conversation)
-    session.commit()
-    return conversation.id
+    )
 
 
 # 将请求体作为 JSON 读取
 # 在函数内部，你可以直接访问模型对象的所有属性
 # http://127.0.0.1:8000/docs
 @router.post("/v1/chat/completions", response_model=ChatCompletion)
-async def chat(request: ChatRequest, token: Annotated[str, Depends(oauth2_scheme)]):
+async def chat(
+    request: ChatRequest,
+    raw_request: Request,
+    token: Annotated[str, Depends(oauth2_scheme)],
+    client: Annotated[AsyncOpenAI, Depends(get_llm_client)],
+    db: DBSession,
+    response: Response,
+    quota: RateLimit,
+):
     user_id = int(verify_access_token(token))
-    print("user_id: ", user_id)
+    logger.debug("user_id: %s", user_id)
 
-    # 验证用户和模型
-    user: UserDB = session.query(UserDB).get(user_id)
-    if not user:
+    # 验证用户和模型, 结果会被缓存
+    user: CachedUser | None = await get_cached_user(db, user_id)
+    if not user or user.deleted_at is not None:
         raise HTTPException(status_code=401, detail="Invalid user")
     model_name = request.model or DEFAULT_MODEL
-    model = session.query(ModelDB).filter(ModelDB.model_name == model_name).first()
-    if not model:
-        model = ModelDB(model_name=model_name)
-        session.add(model)
-        session.commit()
+    model_id = await get_or_create_model_id(db, model_name)
 
-    print("request: ", request)
+    # 请求和消息包含完整的用户输入, 只在 debug 级别输出
+    logger.debug("request: %s", request)
 
     messages = request.messages
-    print("messages: ", messages)
+    logger.debug("messages: %s", messages)
 
     if not messages or len(messages) == 0:
         raise HTTPException(status_code=400, detail="No messages provided")
 
-    role = messages[-1].get("role", "")
+    role = messages[-1].role
     if role not in ["user", "assistant"]:
         raise HTTPException(status_code=400, detail="Invalid role")
 
-    query = messages[-1].get("content", "")
+    query = messages[-1].content
     if not query:
         raise HTTPException(status_code=400, detail="query is empty")
 
-    try:
-        chat_completion: ChatCompletion = client.chat.completions.create(
-            messages=messages,
+    conversation_id = request.conversation_id
+    # 服务端拼接的上下文, 为 None 时使用请求中的全部消息
+    window: ContextWindow | None = None
+    conversation_headers: dict[str, str] = {}
+    if request.use_history:
+        if conversation_id is None:
+            # 新的对话在请求被接受并且上游开始响应后才创建, 见 reserve_new_conversation
+            window = ContextWindow(
+                messages=[],
+                dropped=0,
+                tokens=count_message_tokens(model_name, messages),
+            )
+        else:
+            # 上一轮的回复可能还在后台写入的队列中, 等待写入后再读取
+            await conversation_writer.wait_written(conversation_id)
+            conversation = (
+                await db.execute(
+                    select(
+                        ConversationDB.user_id, ConversationDB.message_count
+                    ).where(ConversationDB.id == conversation_id)
+                )
+            ).first()
+            if conversation is None or conversation.user_id != user_id:
+                raise HTTPException(status_code=404, detail="Conversation not found")
+            window = await load_context(
+                db,
+                conversation_id,
+                conversation.message_count,
+                model_name,
+                messages,
+                request.max_tokens,
+            )
+            conversation_headers["X-Conversation-Id"] = str(conversation_id)
+            # 客户端可以知道历史消息是否被裁剪
+            conversation_headers["X-Context-Dropped"] = str(window.dropped)
+            response.headers.update(conversation_headers)
+
+    async def reserve_new_conversation():
+        # 被限流或者上游失败的请求返回错误时没有 X-Conversation-Id, 不能留下客户端找不到的空对话
+        nonlocal conversation_id
+        if window is None or conversation_id is not None:
+            return
+        async with session_scope() as session:
+            conversation_id = await reserve_conversation(session, user_id, model_id)
+        conversation_headers["X-Conversation-Id"] = str(conversation_id)
+        response.headers.update(conversation_headers)
+
+    def count_input_tokens() -> int:
+        # 服务端拼接上下文时已经按保存的 token 数估算过
+        if window is not None:
+            return window.tokens
+        return count_message_tokens(model_name, messages)
+
+    # 模型, 消息和采样参数都相同的低温度请求直接返回缓存的结果
+    # 消息不经过 model_dump 复制, 计算 key 时逐条序列化
+    cache_params = request.model_dump(
+        include={"max_tokens", "n", "temperature", "top_p", "top_k"}
+    )
+    # 服务端拼接上下文时历史消息也是 key 的一部分
+    cache_params["messages"] = (
+        messages if window is None else [*window.messages, *messages]
+    )
+    cache_params["model"] = model_name
+    cache_key = None
+    if completion_cache.cacheable(cache_params):
+        cache_key = completion_cache.make_key(cache_params)
+        cached: dict | None = await completion_cache.get(cache_key)
+        if cached is not None:
+            message = cached["choices"][0]["message"]
+            response_str = message.get("content") or ""
+            usage = cached.get("usage")
+            if usage:
+                usage = CompletionUsage.model_validate(usage)
+                input_tokens = usage.prompt_tokens
+                output_tokens = usage.completion_tokens
+            else:
+                input_tokens = count_input_tokens()
+                output_tokens = get_tokenizer(model_name).count(response_str)
+            await reserve_new_conversation()
+            await save_conversation(
+                user_id,
+                model_id,
+                messages,
+                ChatMessage(
+                    role="assistant",
+                    content=response_str,
+                    references=message.get("references") or [],
+                ),
+                input_tokens,
+                output_tokens,
+                conversation_id,
+                turn_start=len(messages) - 1,
+                append=window is not None,
+                model_name=model_name,
+            )
+            headers = {**quota.headers, **conversation_headers, "X-Cache": "HIT"}
+            if request.stream:
+                await db.close()
+                return StreamingResponse(replay_stream(cached), headers=headers)
+            if fast_response:
+                return TrustedJSONResponse(cached, headers=headers)
+            return JSONResponse(cached, headers=headers)
+        response.headers["X-Cache"] = "MISS"
+
+    # 等待上游和流式响应期间不占用请求的数据库连接, 对话由后台任务使用独立的会话保存
+    await db.close()
+
+    # 限制每个用户同时进行的流式响应数
+    stream_slot = await acquire_stream_slot(str(user_id)) if request.stream else None
+
+    async def release_stream_slot():
+        # 可能在多处调用, 只释放一次
+        nonlocal stream_slot
+        if stream_slot:
+            slot, stream_slot = stream_slot, None
+            await rate_limiter.release_stream(str(user_id), slot)
+
+    async def request_upstream():
+        # 只在发送给上游时转换为 dict
+        upstream_messages = [message.to_dict() for message in messages]
+        if window is not None:
+            upstream_messages = window.messages + upstream_messages
+        return await client.chat.completions.create(
+            messages=upstream_messages,
             model="internlm/internlm2_5-7b-chat",
             max_tokens=request.max_tokens,
             n=request.n,  # 为每条输入消息生成多少个结果，默认为 1
             presence_penalty=0.0,  # 存在惩罚，介于-2.0到2.0之间的数字。正值会根据新生成的词汇是否出现在文本中来进行惩罚，增加模型讨论新话题的可能性
             frequency_penalty=0.0,  # 频率惩罚，介于-2.0到2.0之间的数字。正值会根据新生成的词汇在文本中现有的频率来进行惩罚，减少模型一字不差重复同样话语的可能性
             stream=request.stream,  # 是否流式响应
+            # 流式响应的最后一个 chunk 中返回 usage
+            stream_options={"include_usage": True} if request.stream else None,
             temperature=request.temperature,
             top_p=request.top_p,
         )
+
+    # 优先级由服务端按用户决定, 客户端不能把自己的请求放到更高的优先级
+    priority = dispatcher.priority_for(user.username, request.priority)
+
+    async def create_completion():
+        # 由调度器按优先级和用户轮流发送
+        return await dispatcher.submit(user_id, request_upstream, priority)
+
+    try:
+        if singleflight.enabled:
+            # 同时到达的相同请求只请求一次上游, 流式响应分发给所有订阅者
+            flight_key = completion_cache.make_key(
+                {**cache_params, "stream": request.stream}
+            )
+            if request.stream:
+                chat_completion = await singleflight.stream(
+                    flight_key, create_completion
+                )
+            else:
+                chat_completion = await singleflight.do(
+                    flight_key, create_completion
+                )
+        else:
+            chat_completion = await create_completion()
     except openai.APIError as e:
-        print(f"OpenAI API返回错误: {e}")
+        logger.debug("OpenAI API返回错误: %s", e)
+        await release_stream_slot()
         raise HTTPException(status_code=e.code, detail="OpenAI API error")
     except Exception as e:
-        print(f"发生其他错误: {e}")
+        logger.debug("发生其他错误: %s", e)
+        await release_stream_slot()
         raise HTTPException(status_code=500, detail="Internal server error")
+    except BaseException:
+        # 在调度器或 singleflight 中等待时请求被取消 (CancelledError)
+        await release_stream_slot()
+        raise
     else:
+        # 上游已经开始响应, 再创建新的对话
+        try:
+            await reserve_new_conversation()
+        except BaseException:
+            await release_stream_slot()
+            if request.stream:
+                await chat_completion.close()
+            raise
+
         # 流式响应
         if request.stream:
 
             async def generate():
-                full_response = []
-                references = []
-                for chunk in chat_completion:
-                    chunk_message = chunk.choices[0].delta
-
-                    if chunk_message.references:
-                        references.extend(chunk_message.references)
-
-                    response_str = chunk_message.content
-                    if response_str:
-                        full_response.append(response_str)
-
-                    yield f"data: {chunk.model_dump_json()}\n\n"
-
-                # 保存完整的对话到数据库
-                full_response = "".join(full_response)
-                messages_to_save: list[dict[str, str | list]] = messages + [
-                    {
-                        "role": "assistant",
-                        "content": full_response,
-                        "references": references,
-                    }
-                ]
-                input_tokens = sum(len(message["content"]) for message in messages)
-                output_tokens = len(full_response)
-                save_conversation(
-                    user,
-                    model,
-                    messages_to_save,
-                    input_tokens,
-                    output_tokens,
-                    request.conversation_id,
-                )
-
-                yield "data: [DONE]\n\n"
-
-            return StreamingResponse(generate())
+                try:
+                    full_response = []
+                    references = []
+                    # 增量计算输出的 token 数, 上游返回 usage 时以 usage 为准
+                    counter = StreamTokenCounter(model_name)
+                    usage = None
+                    last_chunk = None
+                    finish_reason = None
+                    # 异步转发上游的 chunk, 客户端断开时会取消上游请求
+                    relay = StreamRelay(raw_request, chat_completion)
+                    async for chunk in relay:
+                        last_chunk = chunk
+                        if chunk.usage:
+                            usage = chunk.usage
+                        # include_usage 时最后一个 chunk 的 choices 为空
+                        if not chunk.choices:
+                            yield f"data: {chunk.model_dump_json()}\n\n"
+                            continue
+                        chunk_message = chunk.choices[0].delta
+                        if chunk.choices[0].finish_reason:
+                            finish_reason = chunk.choices[0].finish_reason
+
+                        # references 是上游的扩展字段, 没有返回时不存在该属性
+                        chunk_references = getattr(chunk_message, "references", None)
+                        if chunk_references:
+                            references.extend(chunk_references)
+
+                        response_str = chunk_message.content
+                        if response_str:
+                            full_response.append(response_str)
+                            counter.feed(response_str)
+
+                        yield f"data: {chunk.model_dump_json()}\n\n"
+
+                    # 客户端已断开, 不保存不完整的对话, 已经生成的 token 仍然计入限额
+                    if relay.disconnected:
+                        await rate_limiter.charge(
+                            str(user_id),
+                            count_input_tokens()
+                            + counter.total(),
+                        )
+                        return
+
+                    # 保存完整的对话到数据库
+                    full_response = "".join(full_response)
+                    reply = ChatMessage(
+                        role="assistant", content=full_response, references=references
+                    )
+                    if usage:
+                        input_tokens = usage.prompt_tokens
+                        output_tokens = usage.completion_tokens
+                    else:
+                        input_tokens = count_input_tokens()
+                        output_tokens = counter.total()
+                    await save_conversation(
+                        user_id,
+                        model_id,
+                        messages,
+                        reply,
+                        input_tokens,
+                        output_tokens,
+                        conversation_id,
+                        turn_start=len(messages) - 1,
+                        append=window is not None,
+                        model_name=model_name,
+                    )
+                    # 按实际用量扣除 token 限额
+                    await rate_limiter.charge(
+                        str(user_id), input_tokens + output_tokens
+                    )
+
+                    # 只缓存单个 choice 的完整流式响应
+                    if cache_key and request.n == 1 and last_chunk is not None:
+                        await completion_cache.set(
+                            cache_key,
+                            completion_from_stream(
+                                last_chunk.model_dump(),
+                                [full_response],
+                                references,
+                                finish_reason,
+                                usage.model_dump() if usage else None,
+                            ),
+                        )
+
+                    yield "data: [DONE]\n\n"
+                finally:
+                    # 释放流式响应名额
+                    await release_stream_slot()
+
+            headers = {**quota.headers, **conversation_headers}
+            if cache_key:
+                headers["X-Cache"] = "MISS"
+            # 按 chatbot.stream.coalesce 的配置合并多个 chunk 后写入
+            # generate 没有开始迭代时 finally 不会执行, 响应结束后再释放一次
+            return StreamingResponse(
+                coalesce_events(generate()),
+                headers=headers,
+                background=BackgroundTask(release_stream_slot),
+            )
 
         # 非流式响应
         choice = chat_completion.choices[0]
         response_str: str = choice.message.content
         references = []
-        if choice.message.references:
-            references.extend(choice.message.references)
+        message_references = getattr(choice.message, "references", None)
+        if message_references:
+            references.extend(message_references)
 
         # 保存到数据库
-        messages_to_save: list[dict[str, str | list]] = messages + [
-            {"role": "assistant", "content": response_str, "references": references}
-        ]
-        input_tokens = sum(len(message["content"]) for message in messages)
-        output_tokens = len(response_str)
-        save_conversation(
-            user,
-            model,
-            messages_to_save,
+        reply = ChatMessage(
+            role="assistant", content=response_str, references=references
+        )
+        usage = chat_completion.usage
+        if usage:
+            input_tokens = usage.prompt_tokens
+            output_tokens = usage.completion_tokens
+        else:
+            input_tokens = count_input_tokens()
+            output_tokens = get_tokenizer(model_name).count(response_str or "")
+        await save_conversation(
+            user_id,
+            model_id,
+            messages,
+            reply,
             input_tokens,
             output_tokens,
-            request.conversation_id,
+            conversation_id,
+            turn_start=len(messages) - 1,
+            append=window is not None,
+            model_name=model_name,
         )
+        await rate_limiter.charge(str(user_id), input_tokens + output_tokens)
 
+        if cache_key:
+            await completion_cache.set(cache_key, chat_completion.model_dump())
+
+        # 上游客户端已经校验过返回值, 跳过 response_model 的再次校验
+        # 直接返回 Response 时不会合并依赖中设置的响应头, 需要手动传入
+        if fast_response:
+            return TrustedJSONResponse(chat_completion, headers=dict(response.headers))
         return chat_completion
 
 
@@ -277,7 +562,7 @@ class Messages(BaseModel):
         None,
         description="The title of the conversation",
     )
-    messages: list[dict[str, str]] | None = Field(
+    messages: list[dict[str, str | list]] | None = Field(
         None,
         description="List of dictionaries containing the input text and the corresponding user id",
         examples=[[{"role": "user", "content": "你是谁?"}]],
@@ -286,34 +571,99 @@ class Messages(BaseModel):
         None,
         description="The description of the conversation",
     )
+    message_count: int | None = Field(
+        None,
+        description="The number of messages in the conversation",
+    )
+    updated_at: datetime.datetime | None = Field(
+        None,
+        description="The last time the conversation was updated",
+    )
 
 
+def encode_cursor(updated_at: datetime.datetime, conversation_id: int) -> str:
+    raw = f"{updated_at.isoformat()}|{conversation_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        updated_at, conversation_id = raw.rsplit("|", 1)
+        return datetime.datetime.fromisoformat(updated_at), int(conversation_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# 按最近更新时间倒序返回历史对话
+# - skip/limit: 偏移分页, 越往后越慢
+# - cursor: keyset 分页, 使用上一页响应头 X-Next-Cursor 中的值, 每一页的代价相同
+# - summary: 只返回对话的摘要信息, 不返回消息内容
 @router.get("/history", response_model=list[Messages])
 async def history(
     token: Annotated[str, Depends(oauth2_scheme)],
+    response: Response,
+    db: DBSession,
     skip: int = Query(default=0, ge=0),
     limit: int = Query(default=10, ge=1, le=100),
+    cursor: str | None = Query(default=None),
+    summary: bool = Query(default=False),
 ):
     user_id = int(verify_access_token(token))
-    print(user_id)
 
-    # 验证用户和模型
-    user: UserDB = session.query(UserDB).get(user_id)
-    if not user:
+    # 验证用户
+    user: CachedUser | None = await get_cached_user(db, user_id)
+    if not user or user.deleted_at is not None:
         raise HTTPException(status_code=401, detail="Invalid user")
 
-    # conversations: list[ConversationDB] = user.conversations
-    conversations: list[ConversationDB] = (
-        session.query(ConversationDB)
-        .filter(ConversationDB.user_id == user_id)
-        .offset(skip)
+    # 只查询需要的列, 模型名称在同一个查询中通过 join 取出
+    statement = (
+        select(
+            ConversationDB.id,
+            ConversationDB.title,
+            ConversationDB.desc,
+            ConversationDB.message_count,
+            ConversationDB.updated_at,
+            ModelDB.model_name,
+        )
+        .outerjoin(ModelDB, ConversationDB.model_id == ModelDB.id)
+        .where(ConversationDB.user_id == user_id)
+        .order_by(ConversationDB.updated_at.desc(), ConversationDB.id.desc())
         .limit(limit)
-        .all()
     )
+    if cursor:
+        # 使用 (user_id, updated_at, id) 索引直接定位到上一页的末尾
+        updated_at, conversation_id = decode_cursor(cursor)
+        statement = statement.where(
+            tuple_(ConversationDB.updated_at, ConversationDB.id)
+            < tuple_(
+                # 使用列的类型绑定参数, 与列中保存的格式一致
+                literal(updated_at, ConversationDB.updated_at.type),
+                literal(conversation_id, ConversationDB.id.type),
+            )
+        )
+    else:
+        statement = statement.offset(skip)
+    conversations = (await db.execute(statement)).all()
 
     if not conversations:
         return []
 
+    if len(conversations) == limit:
+        last = conversations[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.updated_at, last.id)
+
+    # 一次查询取出本页所有对话的消息
+    messages: dict[int, list[dict]] = {}
+    if not summary:
+        result = await db.scalars(
+            select(MessageDB)
+            .where(MessageDB.conversation_id.in_([c.id for c in conversations]))
+            .order_by(MessageDB.conversation_id, MessageDB.seq)
+        )
+        for message in result:
+            messages.setdefault(message.conversation_id, []).append(message.to_dict())
+
     responses = []
     for conversation in conversations:
         responses.append(
@@ -321,10 +671,71 @@ async def history(
                 id=conversation.id,
                 user_id=user_id,
                 title=conversation.title,
-                messages=conversation.messages,
+                messages=None if summary else messages.get(conversation.id, []),
                 desc=conversation.desc,
-                model=conversation.model.model_name,
+                model=conversation.model_name,
+                message_count=conversation.message_count,
+                updated_at=conversation.updated_at,
             )
         )
 
     return responses
+
+
+class MessageSchema(BaseModel):
+    seq: int = Field(
+        ...,
+        description="The position of the message in the conversation",
+    )
+    role: str = Field(
+        ...,
+        description="The role of the user or assistant",
+        examples=["user", "assistant"],
+    )
+    content: str | list | None = Field(
+        None,
+        description="The content of the message",
+        examples=["你是谁?"],
+    )
+    references: list | None = Field(
+        None,
+        description="The references used for generating the response",
+    )
+
+
+# 按序号分页读取对话中的消息, 不需要加载整个对话
+# 从最新的消息开始, 下一页使用本页第一条消息的 seq 作为 before
+@router.get(
+    "/history/{conversation_id}/messages", response_model=list[MessageSchema]
+)
+async def history_messages(
+    conversation_id: int,
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: DBSession,
+    before: int | None = Query(default=None, ge=0),
+    limit: int = Query(default=20, ge=1, le=100),
+):
+    user_id = int(verify_access_token(token))
+
+    owner_id = await db.scalar(
+        select(ConversationDB.user_id).where(ConversationDB.id == conversation_id)
+    )
+    if owner_id != user_id:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    statement = select(MessageDB).where(MessageDB.conversation_id == conversation_id)
+    if before is not None:
+        statement = statement.where(MessageDB.seq < before)
+    result = await db.scalars(statement.order_by(MessageDB.seq.desc()).limit(limit))
+    messages: list[MessageDB] = result.all()
+
+    # 按时间顺序返回
+    return [
+        MessageSchema(
+            seq=message.seq,
+            role=message.role,
+            content=message.content,
+            references=message.references,
+        )
+        for message in reversed(messages)
+    ]
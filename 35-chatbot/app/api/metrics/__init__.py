@@ -0,0 +1,3 @@
+from .routers import router as metrics_router
+
+__all__ = ["metrics_router"]
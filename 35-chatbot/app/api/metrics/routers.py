@@ -0,0 +1,34 @@
+from fastapi import APIRouter
+
+from ...core import (
+    pool_metrics,
+    conversation_writer,
+    completion_cache,
+    singleflight,
+    dispatcher,
+    rate_limiter,
+)
+from ...models import user_cache, model_cache
+from ...dependencies import token_cache, password_hasher
+
+
+router = APIRouter()
+
+
+# 运行时指标
+@router.get("/metrics")
+async def metrics() -> dict:
+    return {
+        "database": pool_metrics.snapshot(),
+        "persistence": conversation_writer.snapshot(),
+        "password": password_hasher.snapshot(),
+        "singleflight": singleflight.snapshot(),
+        "dispatcher": dispatcher.snapshot(),
+        "ratelimit": rate_limiter.snapshot(),
+        "cache": {
+            "users": user_cache.snapshot(),
+            "models": model_cache.snapshot(),
+            "tokens": token_cache.snapshot(),
+            "completions": completion_cache.snapshot(),
+        },
+    }
@@ -4,15 +4,17 @@ from typing import Annotated
 from pydantic import BaseModel, Field, EmailStr
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from ...core import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ...models import UserDB
 
 from ...dependencies import (
     create_access_token,
     verify_access_token,
-    get_password_hash,
-    verify_password,
+    aget_password_hash,
+    averify_password,
     oauth2_scheme,
+    DBSession,
 )
 
 
@@ -24,10 +26,6 @@ router = APIRouter()
 # 所有相同的 parameters、responses、dependencies、tags 等等。
 
 
-# 创建数据库会话
-session = Session()
-
-
 # 定义令牌端点响应的 Pydantic 模型。
 class Token(BaseModel):
     access_token: str
@@ -57,12 +55,12 @@ class UserInDBSchema(UserSchema):
 
 
 # 从数据库中获取用户。
-def get_user(email: str) -> UserInDBSchema | None:
-    user = session.query(UserDB).filter(UserDB.email == email).first()
+async def get_user(db: AsyncSession, email: str) -> UserInDBSchema | None:
+    user = await db.scalar(select(UserDB).where(UserDB.email == email))
     if user:
         # 更新登录时间
         user.last_login_at = datetime.datetime.now()
-        session.commit()
+        await db.commit()
         # return UserInDBSchema.from_orm(user)
         return UserInDBSchema(
             id=user.id,
@@ -77,8 +75,8 @@ def get_user(email: str) -> UserInDBSchema | None:
         )
 
 
-def get_activate_user(email: str) -> UserInDBSchema | None:
-    user = get_user(email)
+async def get_activate_user(db: AsyncSession, email: str) -> UserInDBSchema | None:
+    user = await get_user(db, email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -94,14 +92,15 @@ def get_activate_user(email: str) -> UserInDBSchema | None:
 
 
 # 验证用户名和密码，并返回用户。
-def authenticate_user(
+async def authenticate_user(
+    db: AsyncSession,
     username: str,
     password: str,
 ) -> UserInDBSchema | None:
-    user = get_activate_user(username)
+    user = await get_activate_user(db, username)
 
-    # 密码是否正确
-    if verify_password(password, user.hashed_password):
+    # 密码是否正确, 在线程池中计算 bcrypt
+    if await averify_password(password, user.hashed_password):
         return user
     else:
         raise HTTPException(
@@ -114,16 +113,17 @@ def authenticate_user(
 @router.post("/register", response_model=UserSchema)
 async def register(
     new_user: UserOutSchema,
+    db: DBSession,
 ) -> UserSchema:
     print(f"{new_user = }")
-    existing_user = get_user(new_user.email)
+    existing_user = await get_user(db, new_user.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered",
         )
     # 加密密码
-    hashed_password = get_password_hash(new_user.password)
+    hashed_password = await aget_password_hash(new_user.password)
     # 创建新用户
     user = UserDB(
         username=new_user.username,
@@ -131,20 +131,21 @@ async def register(
         email=new_user.email,
         phone=new_user.phone,
     )
-    session.add(user)
-    session.commit()
+    db.add(user)
+    await db.commit()
     return new_user
 
 
 @router.post("/login")
 async def login(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    db: DBSession,
 ) -> Token:
     # 验证用户名和密码
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
 
     # 创建生成新的 JWT 访问令牌
-    access_token = create_access_token(data={"sub": user.id})
+    access_token = create_access_token(data={"sub": str(user.id)})
     # 返回 JWT 访问令牌的 Pydantic 模型
     return Token(access_token=access_token, token_type="bearer")
 
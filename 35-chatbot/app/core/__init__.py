@@ -1,8 +1,18 @@
 from .database import (
     database_type,
+    async_mode,
+    make_url,
     engine,
+    async_engine,
     Session,
     Base,
+    new_session,
+    session_scope,
+    get_db,
+    create_all,
+    dispose_engine,
+    pool_metrics,
+    ThreadPoolSession,
     int_pk,
     uuid_type,
     string,
@@ -11,17 +21,64 @@ from .database import (
     required_unique_string,
     default_zero_int,
     json_type,
+    json_value,
     timestamp,
     timestamp_default_now,
     timestamp_update_now,
 )
+from .llm import (
+    create_llm_client,
+    init_llm_client,
+    close_llm_client,
+    get_llm_client,
+    StreamRelay,
+    coalesce_events,
+    SingleFlight,
+    singleflight,
+    BatchDispatcher,
+    dispatcher,
+    TrustedJSONResponse,
+    fast_response,
+)
+from .cache import (
+    TTLCache,
+    CompletionCache,
+    completion_cache,
+    completion_from_stream,
+    replay_stream,
+)
+from .tokenizer import (
+    get_tokenizer,
+    content_text,
+    count_message_tokens,
+    StreamTokenCounter,
+)
+from .context import (
+    context_budget,
+    ContextPlan,
+    plan_context,
+    summary_message,
+    ContextWindow,
+)
+from .ratelimit import RateLimitDecision, RateLimiter, rate_limiter
+from .persistence import ConversationRecord, ConversationWriter, conversation_writer
 
 __all__ = [
     # database
     "database_type",
+    "async_mode",
+    "make_url",
     "engine",
+    "async_engine",
     "Session",
     "Base",
+    "new_session",
+    "session_scope",
+    "get_db",
+    "create_all",
+    "dispose_engine",
+    "pool_metrics",
+    "ThreadPoolSession",
     "int_pk",
     "uuid_type",
     "string",
@@ -30,7 +87,46 @@ __all__ = [
     "required_unique_string",
     "default_zero_int",
     "json_type",
+    "json_value",
     "timestamp",
     "timestamp_default_now",
     "timestamp_update_now",
+    # llm
+    "create_llm_client",
+    "init_llm_client",
+    "close_llm_client",
+    "get_llm_client",
+    "StreamRelay",
+    "coalesce_events",
+    "SingleFlight",
+    "singleflight",
+    "BatchDispatcher",
+    "dispatcher",
+    "TrustedJSONResponse",
+    "fast_response",
+    # cache
+    "TTLCache",
+    "CompletionCache",
+    "completion_cache",
+    "completion_from_stream",
+    "replay_stream",
+    # tokenizer
+    "get_tokenizer",
+    "content_text",
+    "count_message_tokens",
+    "StreamTokenCounter",
+    # context
+    "context_budget",
+    "ContextPlan",
+    "plan_context",
+    "summary_message",
+    "ContextWindow",
+    # ratelimit
+    "RateLimitDecision",
+    "RateLimiter",
+    "rate_limiter",
+    # persistence
+    "ConversationRecord",
+    "ConversationWriter",
+    "conversation_writer",
 ]
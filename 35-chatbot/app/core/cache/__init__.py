@@ -0,0 +1,21 @@
+from .ttl import TTLCache
+from .completion import (
+    CompletionCacheBackend,
+    MemoryBackend,
+    RedisBackend,
+    CompletionCache,
+    completion_cache,
+    completion_from_stream,
+    replay_stream,
+)
+
+__all__ = [
+    "TTLCache",
+    "CompletionCacheBackend",
+    "MemoryBackend",
+    "RedisBackend",
+    "CompletionCache",
+    "completion_cache",
+    "completion_from_stream",
+    "replay_stream",
+]
@@ -0,0 +1,258 @@
+import dataclasses
+import hashlib
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Iterator
+from ...envs import ENVS
+from .ttl import TTLCache
+
+
+completion_config: dict = ENVS.get("cache", {}).get("completions", {})
+# 默认关闭, 只有相同的请求应当得到相同结果时才适合缓存
+enabled: bool = completion_config.get("enabled", False)
+# memory: 进程内缓存, redis: 多个进程共享
+backend_type: str = completion_config.get("backend", "memory")
+maxsize: int = completion_config.get("maxsize", 1000)
+ttl: float = completion_config.get("ttl", 600)
+# 温度高于该值的请求结果随机性大, 不缓存
+max_temperature: float = completion_config.get("max_temperature", 0.3)
+redis_url: str = completion_config.get("redis_url", "redis://localhost:6379/0")
+redis_prefix: str = completion_config.get("redis_prefix", "chatbot:completion:")
+
+logger = logging.getLogger(__name__)
+
+
+def dataclass_json(value) -> dict:
+    """json.dumps 的 default, 省略为 None 的字段, 与客户端发送的 dict 得到相同的 key"""
+    if dataclasses.is_dataclass(value):
+        # slots dataclass 的 __slots__ 就是字段名, 比 dataclasses.fields 快
+        names = getattr(type(value), "__slots__", None) or [
+            field.name for field in dataclasses.fields(value)
+        ]
+        return {
+            name: field_value
+            for name in names
+            if (field_value := getattr(value, name)) is not None
+        }
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+key_encoder = json.JSONEncoder(
+    sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=dataclass_json
+)
+
+
+class CompletionCacheBackend(ABC):
+    """缓存后端接口, 保存 ChatCompletion 的 dict"""
+
+    name: str = "base"
+
+    @abstractmethod
+    async def get(self, key: str) -> dict | None: ...
+
+    @abstractmethod
+    async def set(self, key: str, completion: dict) -> None: ...
+
+    @abstractmethod
+    async def clear(self) -> None: ...
+
+    def snapshot(self) -> dict:
+        return {}
+
+
+class MemoryBackend(CompletionCacheBackend):
+    name = "memory"
+
+    def __init__(self, maxsize: int = maxsize, ttl: float = ttl):
+        self.cache: TTLCache[str, dict] = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> dict | None:
+        return self.cache.get(key)
+
+    async def set(self, key: str, completion: dict) -> None:
+        self.cache.set(key, completion)
+
+    async def clear(self) -> None:
+        self.cache.clear()
+
+    def snapshot(self) -> dict:
+        return self.cache.snapshot()
+
+
+class RedisBackend(CompletionCacheBackend):
+    """多个进程共享的缓存, 过期使用 redis 的 ttl, 容量上限使用 maxmemory-policy allkeys-lru"""
+
+    name = "redis"
+
+    def __init__(
+        self, url: str = redis_url, ttl: float = ttl, prefix: str = redis_prefix
+    ):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> dict | None:
+        value = await self.client.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    async def set(self, key: str, completion: dict) -> None:
+        await self.client.set(
+            self.prefix + key,
+            json.dumps(completion, ensure_ascii=False),
+            ex=self.ttl,
+        )
+
+    async def clear(self) -> None:
+        async for key in self.client.scan_iter(match=self.prefix + "*"):
+            await self.client.delete(key)
+
+
+backend_types: dict[str, type[CompletionCacheBackend]] = {
+    MemoryBackend.name: MemoryBackend,
+    RedisBackend.name: RedisBackend,
+}
+
+
+def load_backend(name: str) -> CompletionCacheBackend:
+    try:
+        return backend_types[name]()
+    except (ImportError, KeyError) as e:
+        # 没有安装 redis 时退回到进程内缓存
+        logger.warning(
+            "load completion cache backend %s failed, use memory: %s", name, e
+        )
+        return MemoryBackend()
+
+
+class CompletionCache:
+    """缓存确定性请求的完整结果, 命中时不再请求上游"""
+
+    def __init__(
+        self,
+        backend: CompletionCacheBackend,
+        enabled: bool = enabled,
+        max_temperature: float = max_temperature,
+    ):
+        self.backend = backend
+        self.enabled = enabled
+        self.max_temperature = max_temperature
+        self.hits = 0
+        self.misses = 0
+
+    def cacheable(self, params: dict) -> bool:
+        return self.enabled and params.get("temperature", 1.0) <= self.max_temperature
+
+    @staticmethod
+    def make_key(params: dict) -> str:
+        """模型, 消息和采样参数的规范化哈希, 字典的键排序后序列化
+
+        消息逐条序列化后更新哈希, 不生成整个对话的 JSON 字符串;
+        消息可以是 dict 或者 ChatMessage 等 dataclass, 相同内容得到相同的 key
+        """
+        params = dict(params)
+        messages = params.pop("messages", None) or []
+        digest = hashlib.sha256(key_encoder.encode(params).encode("utf8"))
+        for message in messages:
+            # JSON 中的换行都会被转义, 用换行分隔不会产生歧义
+            digest.update(b"\n")
+            digest.update(key_encoder.encode(message).encode("utf8"))
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> dict | None:
+        completion = await self.backend.get(key)
+        if completion is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return completion
+
+    async def set(self, key: str, completion: dict) -> None:
+        await self.backend.set(key, completion)
+
+    def snapshot(self) -> dict:
+        total = self.hits + self.misses
+        snapshot = {
+            "enabled": self.enabled,
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+        store = self.backend.snapshot()
+        if store:
+            snapshot["store"] = store
+        return snapshot
+
+
+def completion_from_stream(
+    chunk: dict,
+    contents: list[str],
+    references: list,
+    finish_reason: str | None,
+    usage: dict | None,
+) -> dict:
+    """把流式响应拼接成 ChatCompletion 的 dict, chunk 为任意一个 chunk, 用来取 id 等字段"""
+    return {
+        "id": chunk.get("id"),
+        "object": "chat.completion",
+        "created": chunk.get("created") or int(time.time()),
+        "model": chunk.get("model"),
+        "system_fingerprint": chunk.get("system_fingerprint"),
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": finish_reason or "stop",
+                "logprobs": None,
+                "message": {
+                    "role": "assistant",
+                    "content": "".join(contents),
+                    "references": references,
+                },
+            }
+        ],
+        "usage": usage,
+    }
+
+
+def replay_stream(completion: dict) -> Iterator[str]:
+    """把缓存的 ChatCompletion 转换为 SSE, 每个 choice 一个内容 chunk, 最后是 usage chunk"""
+
+    def event(choices: list, usage: dict | None = None) -> str:
+        chunk = {
+            "id": completion.get("id"),
+            "object": "chat.completion.chunk",
+            "created": completion.get("created"),
+            "model": completion.get("model"),
+            "system_fingerprint": completion.get("system_fingerprint"),
+            "choices": choices,
+            "usage": usage,
+        }
+        data = json.dumps(chunk, ensure_ascii=False, separators=(",", ":"))
+        return f"data: {data}\n\n"
+
+    for choice in completion.get("choices", []):
+        message = choice.get("message") or {}
+        yield event(
+            [
+                {
+                    "index": choice.get("index", 0),
+                    "finish_reason": choice.get("finish_reason") or "stop",
+                    "logprobs": None,
+                    "delta": {
+                        "role": "assistant",
+                        "content": message.get("content"),
+                        "references": message.get("references"),
+                    },
+                }
+            ]
+        )
+    if completion.get("usage"):
+        yield event([], completion["usage"])
+    yield "data: [DONE]\n\n"
+
+
+completion_cache = CompletionCache(load_backend(backend_type))
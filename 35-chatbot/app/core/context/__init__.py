@@ -0,0 +1,15 @@
+from .window import (
+    context_budget,
+    ContextPlan,
+    plan_context,
+    summary_message,
+    ContextWindow,
+)
+
+__all__ = [
+    "context_budget",
+    "ContextPlan",
+    "plan_context",
+    "summary_message",
+    "ContextWindow",
+]
@@ -0,0 +1,133 @@
+from dataclasses import dataclass
+from ...envs import ENVS
+from ..tokenizer import Tokenizer, content_text
+from ..tokenizer.tokenizer import tokens_per_message
+
+
+context_config: dict = ENVS.get("context", {})
+# 模型的上下文长度 (token 数), 未配置的模型使用 default_context_tokens
+model_context_tokens: dict = context_config.get("models", {})
+default_context_tokens: int = context_config.get("default_context_tokens", 8192)
+# 超出上下文长度时的处理: drop_oldest | summarize
+policy: str = context_config.get("policy", "drop_oldest")
+# 每次最多读取的历史消息数 (不包括 system 消息)
+max_history: int = context_config.get("max_history", 200)
+# summarize: 被丢弃的消息压缩成一条 system 消息, 不额外请求上游
+# 摘要的 token 上限, 最多包含的消息数, 每条消息保留的字符数
+summary_tokens: int = context_config.get("summary_tokens", 512)
+summary_messages: int = context_config.get("summary_messages", 20)
+summary_chars: int = context_config.get("summary_chars", 200)
+
+policies = ("drop_oldest", "summarize")
+if policy not in policies:
+    print(f"unknown context policy {policy}, use drop_oldest")
+    policy = "drop_oldest"
+
+
+def context_budget(model_name: str, max_tokens: int) -> int:
+    """留给输入消息的 token 数, 为回复预留 max_tokens"""
+    return model_context_tokens.get(model_name, default_context_tokens) - max_tokens
+
+
+@dataclass(slots=True)
+class ContextPlan:
+    """按缓存的 token 数裁剪历史消息的结果, 只包含序号, 还没有读取消息内容"""
+
+    # 始终保留的 system 消息
+    pinned: list[int]
+    # 保留的历史消息
+    kept: list[int]
+    # 被裁剪的历史消息, 按时间顺序
+    dropped: list[int]
+    # 保留的消息 (包括摘要的预留) 的 token 数
+    tokens: int
+
+
+def plan_context(
+    history: list[tuple[int, str, int]],
+    budget: int,
+    policy: str = policy,
+    summary_tokens: int = summary_tokens,
+) -> ContextPlan:
+    """history 为按时间顺序排列的 (seq, role, token_count), budget 为历史消息可以使用的 token 数
+
+    只使用缓存的每条消息的 token 数, 不读取内容, 复杂度 O(消息数):
+    - system 消息始终保留
+    - 从最新的消息向前保留, 直到超出预算
+    - 保留部分从 user 消息开始, 不保留缺少问题的回复
+    - summarize 时为摘要预留 summary_tokens
+    """
+    pinned = [seq for seq, role, _ in history if role == "system"]
+    turns = [(seq, role, count) for seq, role, count in history if role != "system"]
+    pinned_tokens = sum(
+        count + tokens_per_message for _, role, count in history if role == "system"
+    )
+
+    def fit(budget: int) -> tuple[int, int]:
+        used = 0
+        start = len(turns)
+        while start > 0:
+            cost = turns[start - 1][2] + tokens_per_message
+            if used + cost > budget:
+                break
+            used += cost
+            start -= 1
+        # 跳过开头的回复和工具消息
+        while start < len(turns) and turns[start][1] != "user":
+            used -= turns[start][2] + tokens_per_message
+            start += 1
+        return start, used
+
+    start, used = fit(budget - pinned_tokens)
+    reserved = 0
+    if start > 0 and policy == "summarize":
+        reserved = summary_tokens
+        start, used = fit(budget - pinned_tokens - reserved)
+    return ContextPlan(
+        pinned=pinned,
+        kept=[seq for seq, _, _ in turns[start:]],
+        dropped=[seq for seq, _, _ in turns[:start]],
+        tokens=pinned_tokens + used + (reserved if start > 0 else 0),
+    )
+
+
+def summary_message(
+    messages: list[tuple[str, str | list | None]],
+    tokenizer: Tokenizer,
+    max_tokens: int = summary_tokens,
+    max_chars: int = summary_chars,
+) -> dict | None:
+    """把被丢弃的 (role, content) 压缩成一条 system 消息
+
+    每条消息只保留开头的 max_chars 个字符, 从最新的消息向前添加, 直到超出 max_tokens
+    """
+    lines = []
+    used = 0
+    for role, content in reversed(messages):
+        text = content_text(content).strip().replace("\n", " ")
+        if not text:
+            continue
+        if len(text) > max_chars:
+            text = text[:max_chars] + "..."
+        line = f"{role}: {text}"
+        tokens = tokenizer.count(line)
+        if used + tokens > max_tokens:
+            break
+        lines.append(line)
+        used += tokens
+    if not lines:
+        return None
+    lines.append("以下是之前对话的摘要, 省略了部分内容:")
+    return {"role": "system", "content": "\n".join(reversed(lines))}
+
+
+@dataclass(slots=True)
+class ContextWindow:
+    """服务端拼接的上下文"""
+
+    # 发送给上游的历史消息 (包括摘要), 之后是请求中新的消息
+    messages: list[dict]
+    # 被裁剪的历史消息数, 在响应头 X-Context-Dropped 中返回
+    dropped: int
+    # 预估的输入 token 数, 包括新的消息
+    tokens: int
@@ -1,4 +1,19 @@
-from .database import database_type, engine, Session, Base
+from .database import (
+    database_type,
+    async_mode,
+    make_url,
+    engine,
+    async_engine,
+    Session,
+    Base,
+    new_session,
+    session_scope,
+    get_db,
+    create_all,
+    dispose_engine,
+    pool_metrics,
+)
+from .session import ThreadPoolSession
 from .types import (
     int_pk,
     uuid_type,
@@ -8,6 +23,7 @@ from .types import (
     required_unique_string,
     default_zero_int,
     json_type,
+    json_value,
     timestamp,
     timestamp_default_now,
     timestamp_update_now,
@@ -15,9 +31,19 @@ from .types import (
 
 __all__ = [
     "database_type",
+    "async_mode",
+    "make_url",
     "engine",
+    "async_engine",
     "Session",
     "Base",
+    "new_session",
+    "session_scope",
+    "get_db",
+    "create_all",
+    "dispose_engine",
+    "pool_metrics",
+    "ThreadPoolSession",
     "int_pk",
     "uuid_type",
     "string",
@@ -26,6 +52,7 @@ __all__ = [
     "required_unique_string",
     "default_zero_int",
     "json_type",
+    "json_value",
     "timestamp",
     "timestamp_default_now",
     "timestamp_update_now",
@@ -1,7 +1,13 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import declarative_base
 from ...envs import ENVS
+from .metrics import PoolMetrics
+from .session import ThreadPoolSession
 
 database_env: dict = ENVS.get("database", {})
 
@@ -11,9 +17,100 @@ password = database_env.get("password", "root")
 host = database_env.get("host", "localhost")
 port = database_env.get("port", "3306")
 database = database_env.get("database", "chatbot")
+echo: bool = database_env.get("echo", False)
+# 是否使用异步引擎
+# postgresql 使用 asyncpg, sqlite 使用 aiosqlite, mysql 使用 aiomysql
+async_mode: bool = database_env.get("async", False)
 
-url = f"{database_type}://{user}:{password}@{host}:{port}/{database}"
+# 同步和异步模式下各数据库默认的驱动
+sync_drivers = {"postgresql": None, "mysql": None, "sqlite": None}
+async_drivers = {"postgresql": "asyncpg", "mysql": "aiomysql", "sqlite": "aiosqlite"}
 
-engine = create_engine(url, echo=True)
-Session = sessionmaker(bind=engine)
+
+def make_url(async_mode: bool = async_mode) -> str:
+    driver = database_env.get(
+        "driver",
+        (async_drivers if async_mode else sync_drivers).get(database_type),
+    )
+    scheme = f"{database_type}+{driver}" if driver else database_type
+    # sqlite 的 database 是文件路径
+    if database_type == "sqlite":
+        return f"{scheme}:///{database}"
+    return f"{scheme}://{user}:{password}@{host}:{port}/{database}"
+
+
+url = make_url()
+
+# 连接池配置
+pool_env: dict = database_env.get("pool", {})
+pool_size: int = pool_env.get("pool_size", 10)
+max_overflow: int = pool_env.get("max_overflow", 20)
+pool_timeout: float = pool_env.get("pool_timeout", 30)
+pool_recycle: int = pool_env.get("pool_recycle", 1800)
+pool_pre_ping: bool = pool_env.get("pool_pre_ping", True)
+
+engine_kwargs = dict(
+    echo=echo,
+    pool_size=pool_size,  # 连接池中保持的连接数
+    max_overflow=max_overflow,  # 连接池满后最多额外创建的连接数
+    pool_timeout=pool_timeout,  # 等待空闲连接的超时时间
+    pool_recycle=pool_recycle,  # 连接的最长使用时间, 超时后重新连接
+    pool_pre_ping=pool_pre_ping,  # 取出连接前先检查连接是否可用
+)
+
+if async_mode:
+    async_engine = create_async_engine(url, **engine_kwargs)
+    # 异步引擎内部的同步引擎, 用于监听连接池事件, 不能直接用来执行查询
+    engine = async_engine.sync_engine
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+else:
+    async_engine = None
+    engine = create_engine(url, **engine_kwargs)
+    AsyncSessionLocal = None
+pool_metrics = PoolMetrics(engine)
+
+# commit 后不过期对象, 避免在请求结束后访问属性时再次查询数据库
+# 只能在同步模式下直接使用
+Session = sessionmaker(bind=engine, expire_on_commit=False)
 Base = declarative_base()
+
+
+def new_session() -> AsyncSession | ThreadPoolSession:
+    """创建会话, 两种模式下都使用 await 接口"""
+    if async_mode:
+        return AsyncSessionLocal()
+    return ThreadPoolSession(Session())
+
+
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[AsyncSession | ThreadPoolSession]:
+    """在请求之外使用的会话, 例如流式响应结束后保存对话"""
+    db = new_session()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+# 依赖项: 每个请求使用独立的数据库会话, 请求结束后关闭会话并归还连接
+# 第一次查询时才从连接池取出连接, 用户和模型的缓存命中时不占用连接
+async def get_db():
+    async with session_scope() as db:
+        yield db
+
+
+# 创建所有表, 在应用启动时调用
+async def create_all() -> None:
+    if async_mode:
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    else:
+        await run_in_threadpool(Base.metadata.create_all, engine)
+
+
+# 关闭引擎, 释放连接池中的所有连接
+async def dispose_engine() -> None:
+    if async_mode:
+        await async_engine.dispose()
+    else:
+        await run_in_threadpool(engine.dispose)
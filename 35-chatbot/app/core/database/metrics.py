@@ -0,0 +1,81 @@
+import threading
+import time
+from sqlalchemy import Engine, event
+from sqlalchemy.orm import Session
+
+
+class PoolMetrics:
+    """连接池指标: 取出/归还次数, 等待连接的时间, 以及连接池当前状态"""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidated = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+        event.listen(engine, "connect", self.on_connect)
+        event.listen(engine, "checkout", self.on_checkout)
+        event.listen(engine, "checkin", self.on_checkin)
+        event.listen(engine, "invalidate", self.on_invalidate)
+        # checkout 事件在取出连接之后才触发, 会话开始事务时记录开始时间,
+        # 事务取得连接后 (after_begin) 计算等待连接池的时间, 只统计真正使用数据库的会话
+        event.listen(Session, "after_transaction_create", self.on_transaction_create)
+        event.listen(Session, "after_begin", self.on_begin)
+
+    def on_connect(self, dbapi_connection, connection_record) -> None:
+        with self.lock:
+            self.connects += 1
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        with self.lock:
+            self.checkouts += 1
+
+    def on_checkin(self, dbapi_connection, connection_record) -> None:
+        with self.lock:
+            self.checkins += 1
+
+    def on_invalidate(self, dbapi_connection, connection_record, exception) -> None:
+        with self.lock:
+            self.invalidated += 1
+
+    def on_transaction_create(self, session, transaction) -> None:
+        if transaction.parent is None:
+            session.info["checkout_start"] = time.perf_counter()
+
+    def on_begin(self, session, transaction, connection) -> None:
+        if connection.engine is not self.engine:
+            return
+        start = session.info.pop("checkout_start", None)
+        if start is not None:
+            self.observe_wait(time.perf_counter() - start)
+
+    def observe_wait(self, seconds: float) -> None:
+        """记录一次从连接池取出连接的等待时间"""
+        with self.lock:
+            self.wait_count += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self) -> dict:
+        pool = self.engine.pool
+        with self.lock:
+            return {
+                "pool_size": getattr(pool, "size", lambda: None)(),
+                "checked_out": getattr(pool, "checkedout", lambda: None)(),
+                "checked_in": getattr(pool, "checkedin", lambda: None)(),
+                "overflow": getattr(pool, "overflow", lambda: None)(),
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidated": self.invalidated,
+                "wait_count": self.wait_count,
+                "wait_avg_ms": self.wait_total / self.wait_count * 1000
+                if self.wait_count
+                else 0.0,
+                "wait_max_ms": self.wait_max * 1000,
+            }
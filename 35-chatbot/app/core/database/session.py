@@ -0,0 +1,70 @@
+from typing import Any, Callable, TypeVar
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+
+T = TypeVar("T")
+
+# 与 AsyncSession 一致, 在 execute 时一次性取出所有行, 之后读取结果不再访问数据库
+_EXECUTE_OPTIONS = {"prebuffer_rows": True}
+
+
+class ThreadPoolSession:
+    """同步模式下的会话包装, 提供与 AsyncSession 相同的 await 接口
+
+    所有访问数据库的操作都在线程池中执行, 不会阻塞事件循环,
+    路由中的代码可以同时兼容同步和异步两种模式。
+    """
+
+    def __init__(self, sync_session: Session):
+        self.sync_session = sync_session
+
+    async def run_sync(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def execute(self, statement, params=None, **kwargs):
+        kwargs["execution_options"] = {
+            **kwargs.get("execution_options", {}),
+            **_EXECUTE_OPTIONS,
+        }
+        return await run_in_threadpool(
+            self.sync_session.execute, statement, params, **kwargs
+        )
+
+    async def scalar(self, statement, params=None, **kwargs):
+        result = await self.execute(statement, params, **kwargs)
+        return result.scalar()
+
+    async def scalars(self, statement, params=None, **kwargs):
+        result = await self.execute(statement, params, **kwargs)
+        return result.scalars()
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    async def delete(self, instance) -> None:
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self, objects=None) -> None:
+        await run_in_threadpool(self.sync_session.flush, objects)
+
+    async def refresh(self, instance, attribute_names=None) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def connection(self, **kwargs):
+        return await run_in_threadpool(self.sync_session.connection, **kwargs)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
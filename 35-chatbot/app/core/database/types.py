@@ -1,13 +1,25 @@
 import datetime
-from uuid import UUID as _UUID
-from sqlalchemy import Integer, String, Text, JSON, UUID, func
+from uuid import UUID as _UUID, uuid4
+from sqlalchemy import DateTime, Integer, String, Text, JSON, UUID, func
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.sqlite import DATETIME as SQLITE_DATETIME
 from sqlalchemy.orm import mapped_column
-from typing import Annotated
+from typing import Annotated, Any
 
 from .database import database_type
 
 
+# sqlite 的 CURRENT_TIMESTAMP 精确到秒, Python 写入的时间也使用相同的格式,
+# 否则两种格式的字符串不能正确比较大小 (例如按 updated_at 分页)
+datetime_type = (
+    SQLITE_DATETIME(
+        storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+    )
+    if database_type == "sqlite"
+    else DateTime
+)
+
+
 int_pk = Annotated[int, mapped_column(primary_key=True, comment="主键")]
 uuid_type = Annotated[
     _UUID,
@@ -15,7 +27,9 @@ uuid_type = Annotated[
         UUID,
         unique=True,
         nullable=False,
-        server_default=func.gen_random_uuid(),
+        # 只有 postgresql 支持 gen_random_uuid(), 其它数据库在 Python 端生成
+        default=None if database_type == "postgresql" else uuid4,
+        server_default=func.gen_random_uuid() if database_type == "postgresql" else None,
         comment="UUID主键",
     ),
 ]
@@ -36,20 +50,33 @@ json_type = Annotated[
         comment="JSON格式",
     ),
 ]
+# 任意 JSON 值, 例如字符串或多模态的列表
+json_value = Annotated[
+    Any,
+    mapped_column(
+        JSONB if database_type == "postgresql" else JSON,
+        nullable=True,
+        comment="JSON格式",
+    ),
+]
 timestamp = Annotated[
     datetime.datetime,
     mapped_column(
+        datetime_type,
         nullable=True,
         comment="时间戳",
     ),
 ]
 timestamp_default_now = Annotated[
     datetime.datetime,
-    mapped_column(nullable=False, server_default=func.now(), comment="创建时间"),
+    mapped_column(
+        datetime_type, nullable=False, server_default=func.now(), comment="创建时间"
+    ),
 ]
 timestamp_update_now = Annotated[
     datetime.datetime,
     mapped_column(
+        datetime_type,
         nullable=False,
         server_default=func.now(),
         onupdate=func.now(),
@@ -0,0 +1,26 @@
+from .client import (
+    create_llm_client,
+    init_llm_client,
+    close_llm_client,
+    get_llm_client,
+)
+from .stream import StreamRelay
+from .coalesce import coalesce_events
+from .singleflight import SingleFlight, singleflight
+from .dispatcher import BatchDispatcher, dispatcher
+from .response import TrustedJSONResponse, fast_response
+
+__all__ = [
+    "create_llm_client",
+    "init_llm_client",
+    "close_llm_client",
+    "get_llm_client",
+    "StreamRelay",
+    "coalesce_events",
+    "SingleFlight",
+    "singleflight",
+    "BatchDispatcher",
+    "dispatcher",
+    "TrustedJSONResponse",
+    "fast_response",
+]
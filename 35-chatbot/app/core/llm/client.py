@@ -0,0 +1,71 @@
+import httpx
+from openai import AsyncOpenAI
+from ...envs import ENVS
+
+
+chatbot_config: dict = ENVS.get("chatbot", {})
+api_key: str = chatbot_config.get("api_key", "I AM AN API_KEY")
+base_url: str = chatbot_config.get("base_url", "http://localhost:8000/v1/")
+max_retries: int = chatbot_config.get("max_retries", 2)
+
+# 上游 HTTP 连接池配置
+# 上游只有一个 host, 所以 max_connections 同时也是单个 host 的连接上限
+pool_config: dict = chatbot_config.get("pool", {})
+max_connections: int = pool_config.get("max_connections", 100)
+max_keepalive_connections: int = pool_config.get("max_keepalive_connections", 20)
+keepalive_expiry: float = pool_config.get("keepalive_expiry", 5.0)
+
+# 超时配置, 单位秒
+timeout_config: dict = chatbot_config.get("timeout", {})
+connect_timeout: float = timeout_config.get("connect", 5.0)
+read_timeout: float = timeout_config.get("read", 60.0)
+write_timeout: float = timeout_config.get("write", 10.0)
+pool_timeout: float = timeout_config.get("pool", 10.0)
+
+
+# 整个进程共享一个客户端, 在 lifespan 中创建和关闭
+_client: AsyncOpenAI | None = None
+
+
+def create_llm_client() -> AsyncOpenAI:
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(
+            connect=connect_timeout,
+            read=read_timeout,
+            write=write_timeout,
+            pool=pool_timeout,
+        ),
+    )
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        max_retries=max_retries,
+        http_client=http_client,
+    )
+
+
+async def init_llm_client() -> AsyncOpenAI:
+    global _client
+    if _client is None:
+        _client = create_llm_client()
+    return _client
+
+
+async def close_llm_client() -> None:
+    global _client
+    if _client is not None:
+        # 同时关闭底层的 httpx 连接池
+        await _client.close()
+        _client = None
+
+
+def get_llm_client() -> AsyncOpenAI:
+    """依赖项: 获取共享的上游客户端"""
+    if _client is None:
+        raise RuntimeError("LLM client is not initialized, check the app lifespan")
+    return _client
@@ -0,0 +1,94 @@
+# 合并流式响应的 SSE 事件, 算法与 34-stream/sse.py 的 coalesce_events 相同
+# 每个项目独立运行, 不互相导入, 修改其中一个时同步修改另一个
+import asyncio
+from typing import AsyncIterable, AsyncIterator, Callable
+from ...envs import ENVS
+
+
+stream_config: dict = ENVS.get("chatbot", {}).get("stream", {})
+coalesce_config: dict = stream_config.get("coalesce", {})
+# 缓冲区达到多少字节时写入
+max_bytes: int = coalesce_config.get("max_bytes", 4096)
+# 第一个事件最多等待多少秒后写入, 0 表示不合并, 每个 chunk 写入一次
+max_delay: float = coalesce_config.get("max_delay", 0)
+# 最后一个事件 (finish_reason 或 [DONE]) 到达时立即写入
+flush_on_finish: bool = coalesce_config.get("flush_on_finish", True)
+
+
+def is_final_event(event: str) -> bool:
+    """[DONE] 或者带有 finish_reason 的 chunk, 之后不会再有内容, 不需要等待 max_delay"""
+    return event.startswith("data: [DONE]") or '"finish_reason":"' in event
+
+
+async def coalesce_events(
+    events: AsyncIterable[str],
+    max_bytes: int = max_bytes,
+    max_delay: float = max_delay,
+    flush_on_finish: bool = flush_on_finish,
+    is_final: Callable[[str], bool] = is_final_event,
+) -> AsyncIterator[str]:
+    """把转发给客户端的多个 SSE 事件合并成一次写入, 达到 max_bytes, 等待超过 max_delay,
+    收到结束事件或者 generate 结束时写入; 缓冲区满时暂停读取上游 (背压)
+    """
+    if max_delay <= 0:
+        # 不合并, 每个事件写入一次
+        async for event in events:
+            yield event
+        return
+
+    loop = asyncio.get_running_loop()
+    buffer: list[str] = []
+    size = 0
+    finished = False
+    timer: asyncio.TimerHandle | None = None
+    # 可以写入时设置
+    ready = asyncio.Event()
+    # 缓冲区被取走后设置
+    drained = asyncio.Event()
+
+    async def produce() -> None:
+        nonlocal size, finished, timer
+        try:
+            async for event in events:
+                buffer.append(event)
+                size += len(event)
+                if size >= max_bytes or (flush_on_finish and is_final(event)):
+                    ready.set()
+                    if size >= max_bytes:
+                        drained.clear()
+                        await drained.wait()
+                elif timer is None:
+                    timer = loop.call_at(loop.time() + max_delay, ready.set)
+        finally:
+            finished = True
+            ready.set()
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            await ready.wait()
+            ready.clear()
+            if timer is not None:
+                timer.cancel()
+                timer = None
+            if buffer:
+                data = "".join(buffer)
+                buffer.clear()
+                size = 0
+                drained.set()
+                yield data
+            if finished and not buffer:
+                break
+        # 上游出错时把异常抛给调用方
+        error = producer.exception()
+        if error is not None:
+            raise error
+    finally:
+        if timer is not None:
+            timer.cancel()
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except BaseException:
+                pass
@@ -0,0 +1,212 @@
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable
+from ...envs import ENVS
+
+
+dispatcher_config: dict = ENVS.get("chatbot", {}).get("dispatcher", {})
+# 默认关闭, 请求直接发送给上游
+enabled: bool = dispatcher_config.get("enabled", False)
+# 每批最多发送的请求数
+max_batch_size: int = dispatcher_config.get("max_batch_size", 8)
+# 收集一批的最长等待时间, 单位秒
+max_wait: float = dispatcher_config.get("max_wait", 0.01)
+# 同时进行的上游请求数上限
+max_concurrency: int = dispatcher_config.get("max_concurrency", 32)
+# 优先级数量, 0 为最高优先级
+lanes: int = dispatcher_config.get("lanes", 3)
+# 优先级由服务端决定, 请求中的 priority 只能降低, 不能高于用户允许的优先级
+# 没有单独配置的用户允许的最高优先级
+default_priority: int = dispatcher_config.get("default_priority", 1)
+# 用户名 -> 允许的最高优先级, 例如内部服务的账号
+user_priorities: dict[str, int] = dispatcher_config.get("user_priorities", {})
+
+
+@dataclass(slots=True)
+class Job:
+    user_id: Hashable
+    fn: Callable[[], Awaitable[Any]]
+    future: asyncio.Future = field(repr=False)
+
+
+class Lane:
+    """一个优先级的队列, 每个用户一个子队列, 按用户轮流取出, 避免一个用户占满一批"""
+
+    def __init__(self):
+        # user_id -> 该用户排队的请求, 按轮到的顺序排列
+        self.users: OrderedDict[Hashable, deque[Job]] = OrderedDict()
+
+    def push(self, job: Job) -> None:
+        queue = self.users.get(job.user_id)
+        if queue is None:
+            queue = self.users[job.user_id] = deque()
+        queue.append(job)
+
+    def pop(self) -> Job | None:
+        if not self.users:
+            return None
+        user_id, queue = self.users.popitem(last=False)
+        job = queue.popleft()
+        # 还有请求的用户排到最后
+        if queue:
+            self.users[user_id] = queue
+        return job
+
+
+class BatchDispatcher:
+    """在上游前面收集请求, 按批发送
+
+    - 第一个请求到达后最多等待 max_wait 秒, 或者攒够 max_batch_size 个请求
+    - 同时进行的上游请求不超过 max_concurrency, 超过时在队列中等待
+    - 先取高优先级的请求, 同一优先级内按用户轮流取
+    上游没有批量接口, 一批中的请求并发发送。流式请求在上游返回响应头后就释放并发槽。
+    """
+
+    def __init__(
+        self,
+        enabled: bool = enabled,
+        max_batch_size: int = max_batch_size,
+        max_wait: float = max_wait,
+        max_concurrency: int = max_concurrency,
+        lanes: int = lanes,
+        default_priority: int = default_priority,
+        user_priorities: dict[str, int] = user_priorities,
+    ):
+        self.enabled = enabled
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+        self.lanes = [Lane() for _ in range(lanes)]
+        self.default_priority = default_priority
+        self.user_priorities = user_priorities
+        self.pending = 0
+        self.active = 0
+        self.arrived = asyncio.Event()
+        self.slot_freed = asyncio.Event()
+        self.tasks: set[asyncio.Task] = set()
+        self.task: asyncio.Task | None = None
+        # 指标
+        self.dispatched = 0
+        self.batches = 0
+        self.cancelled = 0
+
+    async def start(self) -> None:
+        if self.enabled and self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台任务, 立即发送队列中剩余的请求并等待完成"""
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        self._dispatch(self._take(self.pending))
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def priority_for(self, username: str, requested: int | None = None) -> int:
+        """用户的请求使用的优先级, 客户端只能选择不高于允许级别的优先级"""
+        allowed = self.user_priorities.get(username, self.default_priority)
+        if requested is None:
+            return allowed
+        return max(requested, allowed)
+
+    async def submit(
+        self, user_id: Hashable, fn: Callable[[], Awaitable[Any]], priority: int = 1
+    ) -> Any:
+        if self.task is None:
+            return await fn()
+        future = asyncio.get_running_loop().create_future()
+        priority = min(max(priority, 0), len(self.lanes) - 1)
+        self.lanes[priority].push(Job(user_id, fn, future))
+        self.pending += 1
+        self.arrived.set()
+        return await future
+
+    def _take(self, size: int) -> list[Job]:
+        batch = []
+        for lane in self.lanes:
+            while len(batch) < size:
+                job = lane.pop()
+                if job is None:
+                    break
+                self.pending -= 1
+                # 等待期间客户端已经断开
+                if job.future.cancelled():
+                    self.cancelled += 1
+                    continue
+                batch.append(job)
+        return batch
+
+    def _dispatch(self, batch: list[Job]) -> None:
+        if not batch:
+            return
+        self.batches += 1
+        self.dispatched += len(batch)
+        for job in batch:
+            self.active += 1
+            task = asyncio.create_task(self._execute(job))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _execute(self, job: Job) -> None:
+        try:
+            result = await job.fn()
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+            elif hasattr(result, "close"):
+                # 调用方已经离开, 关闭流式响应
+                await result.close()
+        finally:
+            self.active -= 1
+            self.slot_freed.set()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            while self.pending == 0:
+                self.arrived.clear()
+                await self.arrived.wait()
+
+            # 攒批: 等到请求数达到 max_batch_size 或者超时
+            deadline = loop.time() + self.max_wait
+            while self.pending < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                self.arrived.clear()
+                try:
+                    await asyncio.wait_for(self.arrived.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            # 等待空闲的并发槽
+            while self.active >= self.max_concurrency:
+                self.slot_freed.clear()
+                await self.slot_freed.wait()
+
+            size = min(self.max_batch_size, self.max_concurrency - self.active)
+            self._dispatch(self._take(size))
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pending": self.pending,
+            "active": self.active,
+            "dispatched": self.dispatched,
+            "batches": self.batches,
+            "avg_batch_size": self.dispatched / self.batches if self.batches else 0.0,
+            "cancelled": self.cancelled,
+        }
+
+
+dispatcher = BatchDispatcher()
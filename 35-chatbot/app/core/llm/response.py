@@ -0,0 +1,38 @@
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from ...envs import ENVS
+
+# 可选依赖, 没有安装时使用 json.dumps
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 非流式响应跳过 response_model 的再次校验, 直接序列化
+fast_response: bool = ENVS.get("chatbot", {}).get("fast_response", False)
+
+
+class TrustedJSONResponse(JSONResponse):
+    """直接序列化 openai 客户端返回的 ChatCompletion 或者缓存中的响应
+
+    路由函数返回 Response 时 FastAPI 不会再按 response_model 校验和转换返回值,
+    response_model 仍然用于生成文档。
+    - 模型由 pydantic-core 直接输出 JSON bytes, 不经过 dict 和 str
+    - 缓存中的 dict 安装了 orjson 时使用 orjson, 否则使用 json.dumps
+    """
+
+    def render(self, content) -> bytes:
+        if isinstance(content, BaseModel):
+            # 与 FastAPI 默认的 by_alias=True 相同
+            # openai 客户端解析上游响应时不校验, 字段类型可能与声明不同, 不输出序列化警告
+            return content.__pydantic_serializer__.to_json(
+                content, by_alias=True, warnings=False
+            )
+        if orjson is not None:
+            try:
+                return orjson.dumps(content)
+            except TypeError:
+                # 超过 64 位的整数等 orjson 不支持的值
+                pass
+        return super().render(content)
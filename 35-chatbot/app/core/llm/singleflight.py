@@ -0,0 +1,155 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable
+from openai import AsyncStream
+from ...envs import ENVS
+
+
+singleflight_config: dict = ENVS.get("chatbot", {}).get("singleflight", {})
+# 相同的请求会得到同一份结果, 默认关闭
+enabled: bool = singleflight_config.get("enabled", False)
+
+
+class StreamFlight:
+    """一次上游流式请求, 所有订阅者共享收到的 chunk
+
+    chunk 保存在列表中, 后加入的订阅者从第一个 chunk 开始读取。
+    """
+
+    def __init__(self):
+        self.chunks: list = []
+        self.done = False
+        self.error: BaseException | None = None
+        # 每收到一个 chunk 替换一次, 唤醒所有等待的订阅者
+        self.changed = asyncio.Event()
+        # 上游请求建立后完成, 建立失败时保存异常
+        self.ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+
+    def notify(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class Subscription:
+    """订阅者读取共享的流, 接口与 AsyncStream 相同, 可以交给 StreamRelay 转发"""
+
+    def __init__(self, flight: StreamFlight):
+        self.flight = flight
+        self.closed = False
+        flight.subscribers += 1
+
+    async def __aiter__(self) -> AsyncIterator:
+        flight = self.flight
+        index = 0
+        try:
+            while True:
+                if index < len(flight.chunks):
+                    yield flight.chunks[index]
+                    index += 1
+                    continue
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.changed.wait()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        flight = self.flight
+        flight.subscribers -= 1
+        # 所有订阅者都离开后取消上游请求
+        if flight.subscribers == 0 and not flight.done and flight.task is not None:
+            flight.task.cancel()
+
+
+class SingleFlight:
+    """合并同时到达的相同请求, 只请求一次上游
+
+    - do: 非流式请求, 所有调用方等待同一个结果
+    - stream: 流式请求, 上游的 chunk 分发给所有订阅者
+    """
+
+    def __init__(self, enabled: bool = enabled):
+        self.enabled = enabled
+        self.calls: dict[str, asyncio.Task] = {}
+        self.streams: dict[str, StreamFlight] = {}
+        self.leaders = 0
+        # 节省的上游请求数
+        self.saved = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.calls.get(key)
+        if task is None:
+            self.leaders += 1
+            # 在独立的任务中请求上游, 发起请求的客户端断开不影响其他调用方
+            task = asyncio.ensure_future(fn())
+            self.calls[key] = task
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+        else:
+            self.saved += 1
+        return await asyncio.shield(task)
+
+    async def stream(
+        self, key: str, create: Callable[[], Awaitable[AsyncStream]]
+    ) -> Subscription:
+        flight = self.streams.get(key)
+        if flight is None:
+            self.leaders += 1
+            flight = StreamFlight()
+            self.streams[key] = flight
+            flight.task = asyncio.create_task(self._pump(key, flight, create))
+        else:
+            self.saved += 1
+        # 先订阅, 避免等待上游建立期间被当作没有订阅者
+        subscription = Subscription(flight)
+        try:
+            await asyncio.shield(flight.ready)
+        except BaseException:
+            await subscription.close()
+            raise
+        return subscription
+
+    async def _pump(
+        self,
+        key: str,
+        flight: StreamFlight,
+        create: Callable[[], Awaitable[AsyncStream]],
+    ) -> None:
+        upstream = None
+        try:
+            upstream = await create()
+            flight.ready.set_result(None)
+            async for chunk in upstream:
+                flight.chunks.append(chunk)
+                flight.notify()
+        except asyncio.CancelledError:
+            if not flight.ready.done():
+                flight.ready.cancel()
+            flight.error = asyncio.CancelledError()
+        except Exception as e:
+            if not flight.ready.done():
+                flight.ready.set_exception(e)
+            flight.error = e
+        finally:
+            flight.done = True
+            flight.notify()
+            if self.streams.get(key) is flight:
+                del self.streams[key]
+            if upstream is not None:
+                await upstream.close()
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self.calls) + len(self.streams),
+            "upstream_calls": self.leaders,
+            "saved": self.saved,
+        }
+
+
+singleflight = SingleFlight()
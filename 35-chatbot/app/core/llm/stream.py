@@ -0,0 +1,100 @@
+import asyncio
+from typing import AsyncIterator
+from fastapi import Request
+from openai import AsyncStream
+from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
+from ...envs import ENVS
+
+
+stream_config: dict = ENVS.get("chatbot", {}).get("stream", {})
+# 上游读取和客户端发送之间最多缓存多少个 chunk
+max_buffer: int = stream_config.get("max_buffer", 16)
+# 检查客户端是否断开的间隔, 单位秒
+disconnect_poll_interval: float = stream_config.get("disconnect_poll_interval", 0.5)
+
+
+# 上游结束的标记
+_END = object()
+
+
+class StreamRelay:
+    """把上游的流式响应异步地转发给客户端
+
+    - 上游 chunk 到达后立即放入有界队列, 客户端读得慢时队列写满, 读取上游也随之暂停 (背压)
+    - 客户端断开后立即关闭上游连接, 上游会随之中止生成
+    """
+
+    def __init__(
+        self,
+        raw_request: Request,
+        stream: AsyncStream[ChatCompletionChunk],
+        max_buffer: int = max_buffer,
+        poll_interval: float = disconnect_poll_interval,
+    ):
+        self.raw_request = raw_request
+        self.stream = stream
+        self.poll_interval = poll_interval
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffer)
+        # 客户端是否在上游结束前断开
+        self.disconnected = False
+
+    async def _produce(self) -> None:
+        try:
+            async for chunk in self.stream:
+                # 队列已满时在这里等待
+                await self.queue.put(chunk)
+        except asyncio.CancelledError:
+            # 客户端断开, 关闭上游连接后尽量唤醒正在等待的消费者
+            # 队列满说明消费者没有在等待
+            await self.stream.close()
+            try:
+                self.queue.put_nowait(_END)
+            except asyncio.QueueFull:
+                pass
+            raise
+        except BaseException:
+            # 上游出错, 异常由消费者在取到结束标记后从任务中取出
+            await self.stream.close()
+            await self.queue.put(_END)
+            raise
+        # 先关闭上游连接, 再放入结束标记, 队列满时等待消费者取出, 不会丢失
+        await self.stream.close()
+        await self.queue.put(_END)
+
+    async def _watch(self, producer: asyncio.Task) -> None:
+        while not producer.done():
+            if await self.raw_request.is_disconnected():
+                self.disconnected = True
+                producer.cancel()
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    async def __aiter__(self) -> AsyncIterator[ChatCompletionChunk]:
+        producer = asyncio.create_task(self._produce())
+        watcher = asyncio.create_task(self._watch(producer))
+        try:
+            while True:
+                chunk = await self.queue.get()
+                if chunk is _END:
+                    break
+                yield chunk
+
+            # 结束标记之后 producer 很快结束, 不会在这里长时间等待
+            await asyncio.wait([producer])
+            # 被 watcher 取消时 disconnected 已经设置, 上游出错时把异常抛给调用方
+            if not producer.cancelled():
+                error = producer.exception()
+                if error is not None:
+                    raise error
+        except GeneratorExit:
+            # 生成器被提前关闭 (客户端断开或发送失败)
+            self.disconnected = True
+            raise
+        finally:
+            watcher.cancel()
+            if not producer.done():
+                producer.cancel()
+                try:
+                    await producer
+                except BaseException:
+                    pass
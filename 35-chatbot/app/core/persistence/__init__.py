@@ -0,0 +1,3 @@
+from .writer import ConversationRecord, ConversationWriter, conversation_writer
+
+__all__ = ["ConversationRecord", "ConversationWriter", "conversation_writer"]
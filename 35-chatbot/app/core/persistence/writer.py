@@ -0,0 +1,382 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from itertools import chain, islice
+from typing import TYPE_CHECKING
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+from ...envs import ENVS
+from ..database import session_scope
+from ..tokenizer import get_tokenizer
+
+if TYPE_CHECKING:
+    from ...schemas import ChatMessage
+
+
+persistence_config: dict = ENVS.get("persistence", {})
+# 每批最多写入的对话数
+batch_size: int = persistence_config.get("batch_size", 100)
+# 收集一批的最长等待时间, 单位秒
+flush_interval: float = persistence_config.get("flush_interval", 0.5)
+# 队列长度上限, 数据库写入跟不上时 enqueue 会等待
+max_queue: int = persistence_config.get("max_queue", 10000)
+# 写入失败后的重试次数
+max_retries: int = persistence_config.get("max_retries", 3)
+# 读取历史消息前等待上一轮写入的最长时间, 单位秒, 超时后读取已经写入的消息
+wait_timeout: float = persistence_config.get("wait_timeout", 5)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class ConversationRecord:
+    """一次对话完成后需要保存的内容
+
+    messages 是请求中的消息列表, reply 是本轮的回复, 保存时依次写入, 不需要拼接成新的列表;
+    turn_start 是本轮新消息的起始位置。
+    数据库中已经保存的消息不会重复写入, 只追加 turn_start 之后的消息;
+    如果客户端修改或重新生成了之前的消息 (turn_start 小于已保存的数量), 从 turn_start 开始覆盖。
+    append 为 True 时 messages 只包含本轮新的消息 (历史消息由服务端读取), 追加到已保存的消息之后。
+    model_name 用来计算每条消息的 token 数, 与消息一起保存。
+    """
+
+    user_id: int
+    model_id: int
+    messages: list["ChatMessage"]
+    reply: "ChatMessage | None"
+    input_tokens: int
+    output_tokens: int
+    conversation_id: int | None = None
+    turn_start: int = 0
+    append: bool = False
+    model_name: str | None = None
+
+    @property
+    def message_count(self) -> int:
+        return len(self.messages) + (self.reply is not None)
+
+    def iter_messages(self, start: int = 0):
+        """从 start 开始的消息, 包括回复"""
+        messages = islice(self.messages, start, None)
+        if self.reply is None:
+            return messages
+        return chain(messages, [self.reply] if start <= len(self.messages) else [])
+
+
+# 停止信号
+_STOP = object()
+# 立即写入正在收集的一批
+_FLUSH = object()
+
+
+class ConversationWriter:
+    """后台批量写入对话 (write-behind)
+
+    对话完成后只放入队列, 由后台任务按 batch_size / flush_interval 收集成一批,
+    一次事务中批量插入和更新, 不占用请求的时间。
+    """
+
+    def __init__(
+        self,
+        batch_size: int = batch_size,
+        flush_interval: float = flush_interval,
+        max_queue: int = max_queue,
+        max_retries: int = max_retries,
+        wait_timeout: float = wait_timeout,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.wait_timeout = wait_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.task: asyncio.Task | None = None
+        self.stopping = False
+        # conversation_id -> 队列中和正在写入的记录数, 用于读取历史消息前等待写入完成
+        self.pending: dict[int, int] = {}
+        self.written_condition = asyncio.Condition()
+        # 指标
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    async def start(self) -> None:
+        if self.task is None:
+            self.stopping = False
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台任务, 停止前写入队列中剩余的所有对话"""
+        if self.task is None:
+            return
+        self.stopping = True
+        await self.queue.put(_STOP)
+        await self.task
+        self.task = None
+
+    async def enqueue(self, record: ConversationRecord) -> None:
+        if self.stopping or self.task is None:
+            # 没有后台任务时直接写入
+            await self._flush([record])
+            return
+        if record.conversation_id:
+            self.pending[record.conversation_id] = (
+                self.pending.get(record.conversation_id, 0) + 1
+            )
+        try:
+            await self.queue.put(record)
+        except BaseException:
+            # 队列已满时请求被取消, 记录没有放入队列, 回滚计数并唤醒等待的请求
+            await self._written([record])
+            raise
+
+    async def wait_written(self, conversation_id: int) -> None:
+        """等待该对话在队列中的记录写入数据库 (read-your-writes)
+
+        服务端读取历史消息前调用, 否则可能读不到上一轮还在队列中的回复。
+        只能感知当前进程的队列。数据库不可用时最多等待 wait_timeout 秒, 之后读取已经写入的消息。
+        """
+        if not self.pending.get(conversation_id):
+            return
+        # 不等到 flush_interval, 让后台任务立即写入
+        try:
+            self.queue.put_nowait(_FLUSH)
+        except asyncio.QueueFull:
+            # 队列已满时一批很快就会收集完
+            pass
+        try:
+            async with self.written_condition:
+                await asyncio.wait_for(
+                    self.written_condition.wait_for(
+                        lambda: not self.pending.get(conversation_id)
+                    ),
+                    self.wait_timeout,
+                )
+        except asyncio.TimeoutError:
+            logger.warning(
+                "等待对话 %s 写入超时 (%ss), 读取已经写入的消息",
+                conversation_id,
+                self.wait_timeout,
+            )
+
+    async def _written(self, batch: list[ConversationRecord]) -> None:
+        """一批写入完成 (包括失败), 唤醒等待的请求"""
+        for record in batch:
+            if record.conversation_id in self.pending:
+                self.pending[record.conversation_id] -= 1
+                if not self.pending[record.conversation_id]:
+                    del self.pending[record.conversation_id]
+        async with self.written_condition:
+            self.written_condition.notify_all()
+
+    async def _collect(self) -> tuple[list[ConversationRecord], bool]:
+        """收集一批对话, 返回 (batch, 是否收到停止信号)"""
+        record = await self.queue.get()
+        if record is _STOP:
+            return [], True
+        if record is _FLUSH:
+            return [], False
+        batch = [record]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            # 队列中已有的直接取出, 不用等待
+            if not self.queue.empty():
+                record = self.queue.get_nowait()
+            else:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if record is _STOP:
+                return batch, True
+            if record is _FLUSH:
+                break
+            batch.append(record)
+        return batch, False
+
+    async def _run(self) -> None:
+        while True:
+            batch, stop = await self._collect()
+            if batch:
+                await self._flush(batch)
+                await self._written(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: list[ConversationRecord]) -> None:
+        if await self._write(batch, self.max_retries):
+            return
+        if len(batch) == 1:
+            self.failed += 1
+            return
+        # 整批在一个事务中写入, 重试后仍然失败时逐条写入, 一条错误的记录不会丢失整批对话
+        # 每条只尝试一次, 数据库不可用时不会按批大小成倍地重试
+        for record in batch:
+            if not await self._write([record], 0):
+                self.failed += 1
+
+    async def _write(self, batch: list[ConversationRecord], retries: int) -> bool:
+        """在一个事务中写入 batch, 失败后最多重试 retries 次, 返回是否写入成功"""
+        for attempt in range(retries + 1):
+            try:
+                async with session_scope() as db:
+                    await db.run_sync(write_conversations, batch)
+            except Exception as e:
+                if attempt < retries:
+                    logger.warning("保存对话失败 (第 %d 次): %s", attempt + 1, e)
+                    await asyncio.sleep(0.1 * 2**attempt)
+                elif len(batch) > 1:
+                    logger.warning("保存 %d 条对话失败, 逐条写入: %s", len(batch), e)
+                else:
+                    logger.exception(
+                        "保存对话失败, 用户 %s, 对话 %s",
+                        batch[0].user_id,
+                        batch[0].conversation_id,
+                    )
+            else:
+                self.written += len(batch)
+                self.batches += 1
+                return True
+        return False
+
+    def snapshot(self) -> dict:
+        return {
+            "queue_depth": self.depth,
+            "written": self.written,
+            "batches": self.batches,
+            "failed": self.failed,
+        }
+
+
+def message_rows(
+    conversation_id: int,
+    record: ConversationRecord,
+    start: int,
+    first_seq: int | None = None,
+) -> list[dict]:
+    """record 中从 start 开始的消息, 序号从 first_seq 开始, 默认与 start 相同"""
+    tokenizer = get_tokenizer(record.model_name or "")
+    return [
+        {
+            "conversation_id": conversation_id,
+            "seq": seq,
+            "role": message.role,
+            "content": message.content_json(),
+            "references": message.references or None,
+            "token_count": tokenizer.count(message.text),
+        }
+        for seq, message in enumerate(
+            record.iter_messages(start), start if first_seq is None else first_seq
+        )
+    ]
+
+
+def write_conversations(session: Session, batch: list[ConversationRecord]) -> None:
+    """在一个事务中批量写入一批对话, 消息只追加新增的部分"""
+    # 避免循环导入
+    from ...models import ConversationDB, MessageDB
+
+    # 同一个对话在一批中只保留最后一次, 追加的记录按顺序全部写入
+    updates: dict[int, ConversationRecord] = {}
+    appends: dict[int, list[ConversationRecord]] = {}
+    inserts: list[ConversationRecord] = []
+    for record in batch:
+        if not record.conversation_id:
+            inserts.append(record)
+        elif record.append:
+            appends.setdefault(record.conversation_id, []).append(record)
+        else:
+            updates[record.conversation_id] = record
+
+    # conversation_id -> 按主键更新的列
+    update_rows: dict[int, dict] = {}
+    new_messages = []
+    # (conversation_id, 从哪个序号开始覆盖)
+    rewrites: list[tuple[int, int]] = []
+    if updates or appends:
+        existing = {
+            conversation_id: (user_id, message_count)
+            for conversation_id, user_id, message_count in session.execute(
+                select(
+                    ConversationDB.id,
+                    ConversationDB.user_id,
+                    ConversationDB.message_count,
+                ).where(ConversationDB.id.in_(updates.keys() | appends.keys()))
+            )
+        }
+        for conversation_id, record in updates.items():
+            user_id, message_count = existing.get(conversation_id, (None, 0))
+            # 对话不存在或不属于该用户时创建新的对话
+            if user_id != record.user_id:
+                inserts.append(record)
+                continue
+            start = min(message_count, record.turn_start)
+            if start < message_count:
+                rewrites.append((conversation_id, start))
+            new_messages.extend(message_rows(conversation_id, record, start))
+            update_rows[conversation_id] = {
+                "id": conversation_id,
+                "model_id": record.model_id,
+                "message_count": record.message_count,
+                "input_tokens": record.input_tokens,
+                "output_tokens": record.output_tokens,
+            }
+            # 同一批中之后追加的消息接在覆盖后的消息之后
+            existing[conversation_id] = (user_id, record.message_count)
+        for conversation_id, records in appends.items():
+            user_id, message_count = existing.get(conversation_id, (None, 0))
+            for record in records:
+                if user_id != record.user_id:
+                    inserts.append(record)
+                    continue
+                # 序号接在数据库中已经保存的消息之后
+                new_messages.extend(
+                    message_rows(conversation_id, record, 0, message_count)
+                )
+                message_count += record.message_count
+                update_rows[conversation_id] = {
+                    "id": conversation_id,
+                    "model_id": record.model_id,
+                    "message_count": message_count,
+                    "input_tokens": record.input_tokens,
+                    "output_tokens": record.output_tokens,
+                }
+
+    for conversation_id, start in rewrites:
+        session.execute(
+            delete(MessageDB).where(
+                MessageDB.conversation_id == conversation_id, MessageDB.seq >= start
+            )
+        )
+    if update_rows:
+        # 按主键批量更新
+        session.execute(update(ConversationDB), list(update_rows.values()))
+    if inserts:
+        conversations = [
+            ConversationDB(
+                user_id=record.user_id,
+                model_id=record.model_id,
+                message_count=record.message_count,
+                input_tokens=record.input_tokens,
+                output_tokens=record.output_tokens,
+            )
+            for record in inserts
+        ]
+        session.add_all(conversations)
+        # 获取新对话的 id
+        session.flush()
+        for conversation, record in zip(conversations, inserts):
+            new_messages.extend(message_rows(conversation.id, record, 0))
+    if new_messages:
+        session.execute(insert(MessageDB), new_messages)
+    session.commit()
+
+
+conversation_writer = ConversationWriter()
@@ -0,0 +1,19 @@
+from .limiter import (
+    BucketResult,
+    RateLimitBackend,
+    MemoryBackend,
+    RedisBackend,
+    RateLimitDecision,
+    RateLimiter,
+    rate_limiter,
+)
+
+__all__ = [
+    "BucketResult",
+    "RateLimitBackend",
+    "MemoryBackend",
+    "RedisBackend",
+    "RateLimitDecision",
+    "RateLimiter",
+    "rate_limiter",
+]
@@ -0,0 +1,294 @@
+import logging
+import math
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from ...envs import ENVS
+
+
+ratelimit_config: dict = ENVS.get("ratelimit", {})
+# 默认关闭
+enabled: bool = ratelimit_config.get("enabled", False)
+# memory: 单个进程内限流, redis: 多个 uvicorn worker 共享限额
+backend_type: str = ratelimit_config.get("backend", "memory")
+# 每个用户每秒的请求数和允许的突发请求数
+requests_per_second: float = ratelimit_config.get("requests_per_second", 2)
+request_burst: int = ratelimit_config.get("request_burst", 10)
+# 每个用户每分钟的 token 数, 请求结束后按实际使用量扣除
+tokens_per_minute: int = ratelimit_config.get("tokens_per_minute", 100000)
+# 每个用户同时进行的流式响应数
+max_concurrent_streams: int = ratelimit_config.get("max_concurrent_streams", 4)
+# 流式响应占用的名额最长保留时间, 单位秒, 防止异常退出时名额不被释放
+stream_ttl: float = ratelimit_config.get("stream_ttl", 600)
+redis_url: str = ratelimit_config.get("redis_url", "redis://localhost:6379/0")
+redis_prefix: str = ratelimit_config.get("redis_prefix", "chatbot:ratelimit:")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class BucketResult:
+    allowed: bool
+    remaining: float
+    # 不允许时需要等待的秒数
+    retry_after: float = 0.0
+
+
+class RateLimitBackend(ABC):
+    """限流后端接口, 每个操作都是 O(1) 的"""
+
+    name: str = "base"
+
+    @abstractmethod
+    async def take(
+        self, key: str, rate: float, capacity: float, cost: float, force: bool = False
+    ) -> BucketResult:
+        """令牌桶: 以 rate 个/秒补充, 最多 capacity 个
+
+        桶中至少有 cost 个并且大于 0 时扣除 cost 个; force 时总是扣除, 可以扣成负数,
+        用于请求结束后按实际用量扣除。
+        """
+
+    @abstractmethod
+    async def acquire(self, key: str, slot: str, limit: int, ttl: float) -> bool:
+        """占用一个名额, 超过 ttl 秒的名额视为已释放"""
+
+    @abstractmethod
+    async def release(self, key: str, slot: str) -> None: ...
+
+
+def refill_and_take(
+    tokens: float, elapsed: float, rate: float, capacity: float, cost: float, force: bool
+) -> tuple[float, BucketResult]:
+    tokens = min(capacity, tokens + elapsed * rate)
+    if force or (tokens >= cost and tokens > 0):
+        tokens -= cost
+        return tokens, BucketResult(True, tokens)
+    retry_after = (max(cost, 1) - tokens) / rate
+    return tokens, BucketResult(False, tokens, retry_after)
+
+
+class MemoryBackend(RateLimitBackend):
+    name = "memory"
+
+    def __init__(self):
+        # key -> [剩余令牌数, 上次更新时间]
+        self.buckets: dict[str, list[float]] = {}
+        # key -> {slot: 过期时间}
+        self.slots: dict[str, dict[str, float]] = {}
+
+    async def take(
+        self, key: str, rate: float, capacity: float, cost: float, force: bool = False
+    ) -> BucketResult:
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [capacity, now]
+        bucket[0], result = refill_and_take(
+            bucket[0], now - bucket[1], rate, capacity, cost, force
+        )
+        bucket[1] = now
+        return result
+
+    async def acquire(self, key: str, slot: str, limit: int, ttl: float) -> bool:
+        now = time.monotonic()
+        slots = self.slots.setdefault(key, {})
+        # 最多 limit 个名额, 清理过期名额的代价有上限
+        for expired in [s for s, expires in slots.items() if expires <= now]:
+            del slots[expired]
+        if len(slots) >= limit:
+            return False
+        slots[slot] = now + ttl
+        return True
+
+    async def release(self, key: str, slot: str) -> None:
+        slots = self.slots.get(key)
+        if slots is not None:
+            slots.pop(slot, None)
+            if not slots:
+                del self.slots[key]
+
+
+# 在 redis 中原子地执行令牌桶, 使用 redis 的时间, 多个 worker 之间不需要同步时钟
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local force = ARGV[4] == '1'
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local allowed = force or (tokens >= cost and tokens > 0)
+local retry_after = 0
+if allowed then
+    tokens = tokens - cost
+else
+    retry_after = (math.max(cost, 1) - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed and 1 or 0, tostring(tokens), tostring(retry_after)}
+"""
+
+# 名额保存在有序集合中, score 为过期时间
+ACQUIRE_SCRIPT = """
+local limit = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + ttl, ARGV[1])
+redis.call('EXPIRE', KEYS[1], math.ceil(ttl))
+return 1
+"""
+
+
+class RedisBackend(RateLimitBackend):
+    """多个进程共享的限流, 每个操作是一次 Lua 脚本调用"""
+
+    name = "redis"
+
+    def __init__(self, url: str = redis_url, prefix: str = redis_prefix):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self.take_script = self.client.register_script(TAKE_SCRIPT)
+        self.acquire_script = self.client.register_script(ACQUIRE_SCRIPT)
+
+    async def take(
+        self, key: str, rate: float, capacity: float, cost: float, force: bool = False
+    ) -> BucketResult:
+        allowed, tokens, retry_after = await self.take_script(
+            keys=[self.prefix + key],
+            args=[rate, capacity, cost, "1" if force else "0"],
+        )
+        return BucketResult(bool(allowed), float(tokens), float(retry_after))
+
+    async def acquire(self, key: str, slot: str, limit: int, ttl: float) -> bool:
+        allowed = await self.acquire_script(
+            keys=[self.prefix + key], args=[slot, limit, ttl]
+        )
+        return bool(allowed)
+
+    async def release(self, key: str, slot: str) -> None:
+        await self.client.zrem(self.prefix + key, slot)
+
+
+backend_types: dict[str, type[RateLimitBackend]] = {
+    MemoryBackend.name: MemoryBackend,
+    RedisBackend.name: RedisBackend,
+}
+
+
+def load_backend(name: str) -> RateLimitBackend:
+    try:
+        return backend_types[name]()
+    except (ImportError, KeyError) as e:
+        # 没有安装 redis 时退回到进程内限流, 此时每个 worker 单独计数
+        logger.warning(
+            "load rate limit backend %s failed, use memory, "
+            "each worker counts its own limits: %s",
+            name,
+            e,
+        )
+        return MemoryBackend()
+
+
+@dataclass(slots=True)
+class RateLimitDecision:
+    allowed: bool
+    retry_after: float = 0.0
+    # 剩余限额, 放在响应头中返回
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+class RateLimiter:
+    """按用户限流: 请求数令牌桶, 每分钟 token 数令牌桶, 同时进行的流式响应数"""
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        enabled: bool = enabled,
+        requests_per_second: float = requests_per_second,
+        request_burst: int = request_burst,
+        tokens_per_minute: int = tokens_per_minute,
+        max_concurrent_streams: int = max_concurrent_streams,
+        stream_ttl: float = stream_ttl,
+    ):
+        self.backend = backend
+        self.enabled = enabled
+        self.requests_per_second = requests_per_second
+        self.request_burst = request_burst
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrent_streams = max_concurrent_streams
+        self.stream_ttl = stream_ttl
+        self.rejected = 0
+
+    async def admit(self, user_id: str) -> RateLimitDecision:
+        """请求开始时检查: 扣除一个请求, token 桶只检查没有透支"""
+        if not self.enabled:
+            return RateLimitDecision(True)
+        requests = await self.backend.take(
+            f"req:{user_id}", self.requests_per_second, self.request_burst, 1
+        )
+        tokens = await self.backend.take(
+            f"tok:{user_id}", self.tokens_per_minute / 60, self.tokens_per_minute, 0
+        )
+        headers = {
+            "X-RateLimit-Limit-Requests": str(self.request_burst),
+            "X-RateLimit-Remaining-Requests": str(max(0, int(requests.remaining))),
+            "X-RateLimit-Limit-Tokens": str(self.tokens_per_minute),
+            "X-RateLimit-Remaining-Tokens": str(max(0, int(tokens.remaining))),
+        }
+        retry_after = max(requests.retry_after, tokens.retry_after)
+        if retry_after > 0:
+            self.rejected += 1
+            # 请求桶已经扣除的请求不退回, 连续的超限请求同样计数
+            headers["Retry-After"] = str(math.ceil(retry_after))
+            return RateLimitDecision(False, retry_after, headers)
+        return RateLimitDecision(True, 0.0, headers)
+
+    async def charge(self, user_id: str, tokens: int) -> None:
+        """请求结束后按实际的 token 用量扣除"""
+        if self.enabled and tokens > 0:
+            await self.backend.take(
+                f"tok:{user_id}",
+                self.tokens_per_minute / 60,
+                self.tokens_per_minute,
+                tokens,
+                force=True,
+            )
+
+    async def acquire_stream(self, user_id: str) -> str | None:
+        """占用一个流式响应名额, 返回名额 id, 名额已满时返回 None"""
+        if not self.enabled:
+            return ""
+        slot = uuid.uuid4().hex
+        if await self.backend.acquire(
+            f"stream:{user_id}", slot, self.max_concurrent_streams, self.stream_ttl
+        ):
+            return slot
+        self.rejected += 1
+        return None
+
+    async def release_stream(self, user_id: str, slot: str) -> None:
+        if self.enabled and slot:
+            await self.backend.release(f"stream:{user_id}", slot)
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "backend": self.backend.name,
+            "rejected": self.rejected,
+        }
+
+
+rate_limiter = RateLimiter(load_backend(backend_type))
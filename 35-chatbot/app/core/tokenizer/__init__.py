@@ -0,0 +1,23 @@
+from .tokenizer import (
+    Tokenizer,
+    HeuristicTokenizer,
+    TiktokenTokenizer,
+    HuggingFaceTokenizer,
+    load_tokenizer,
+    get_tokenizer,
+    content_text,
+    count_message_tokens,
+    StreamTokenCounter,
+)
+
+__all__ = [
+    "Tokenizer",
+    "HeuristicTokenizer",
+    "TiktokenTokenizer",
+    "HuggingFaceTokenizer",
+    "load_tokenizer",
+    "get_tokenizer",
+    "content_text",
+    "count_message_tokens",
+    "StreamTokenCounter",
+]
@@ -0,0 +1,170 @@
+import functools
+from typing import TYPE_CHECKING
+from ...envs import ENVS
+
+if TYPE_CHECKING:
+    from ...schemas import ChatMessage
+
+
+tokenizer_config: dict = ENVS.get("tokenizer", {})
+# 每个模型使用的分词器, 未配置的模型使用 default
+# type: heuristic | tiktoken | huggingface
+#   tiktoken: encoding 为编码名称, 例如 o200k_base
+#   huggingface: path 为本地 tokenizer.json 的路径
+model_configs: dict = tokenizer_config.get("models", {})
+default_config: dict = tokenizer_config.get("default", {"type": "heuristic"})
+# 对话格式中每条消息额外的 token 数
+tokens_per_message: int = tokenizer_config.get("tokens_per_message", 3)
+# 流式计数时累积多少字符后计数一次
+stream_flush_chars: int = tokenizer_config.get("stream_flush_chars", 256)
+
+
+class Tokenizer:
+    """分词器接口, 只需要计算 token 数量"""
+
+    name: str = "base"
+
+    def count(self, text: str) -> int:
+        raise NotImplementedError
+
+
+class HeuristicTokenizer(Tokenizer):
+    """没有本地分词器时的估算: ASCII 约 4 个字符一个 token, 其他字符 (中文等) 一个字符一个 token
+
+    只使用 str/bytes 的内置方法, 不逐个字符遍历
+    """
+
+    name = "heuristic"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        ascii_chars = len(text.encode("ascii", "ignore"))
+        other_chars = len(text) - ascii_chars
+        return (ascii_chars + 3) // 4 + other_chars
+
+
+class TiktokenTokenizer(Tokenizer):
+    name = "tiktoken"
+
+    def __init__(self, encoding: str = "o200k_base"):
+        import tiktoken
+
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        # 用户输入中可能包含特殊 token 的文本, 按普通文本计数
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+class HuggingFaceTokenizer(Tokenizer):
+    name = "huggingface"
+
+    def __init__(self, path: str):
+        from tokenizers import Tokenizer as HFTokenizer
+
+        self.tokenizer = HFTokenizer.from_file(path)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+tokenizer_types: dict[str, type[Tokenizer]] = {
+    HeuristicTokenizer.name: HeuristicTokenizer,
+    TiktokenTokenizer.name: TiktokenTokenizer,
+    HuggingFaceTokenizer.name: HuggingFaceTokenizer,
+}
+
+
+def load_tokenizer(config: dict) -> Tokenizer:
+    config = dict(config)
+    tokenizer_type = config.pop("type", "heuristic")
+    try:
+        return tokenizer_types[tokenizer_type](**config)
+    except (ImportError, OSError, ValueError, KeyError) as e:
+        # 没有安装依赖或者找不到本地文件时退回到估算
+        print(f"load tokenizer {tokenizer_type} failed, use heuristic: {e}")
+        return HeuristicTokenizer()
+
+
+# 每个配置只加载一次分词器, 缓存的 key 只有配置中的模型名和 None (default)
+@functools.lru_cache(maxsize=None)
+def _cached_tokenizer(config_name: str | None) -> Tokenizer:
+    if config_name is None:
+        return load_tokenizer(default_config)
+    return load_tokenizer(model_configs[config_name])
+
+
+def get_tokenizer(model_name: str) -> Tokenizer:
+    # 模型名来自客户端, 未配置的模型先映射到 default, 不能用任意的名字增加缓存
+    return _cached_tokenizer(model_name if model_name in model_configs else None)
+
+
+def content_text(content: str | list | None) -> str:
+    """取出消息中的文本, 多模态消息只计算 text 部分, 内容可以是 dict 或者 TextPart"""
+    if not content:
+        return ""
+    if isinstance(content, str):
+        return content
+    texts = []
+    for part in content:
+        if isinstance(part, dict):
+            if part.get("type") == "text":
+                texts.append(part.get("text", ""))
+        elif getattr(part, "type", None) == "text":
+            texts.append(part.text)
+    return "".join(texts)
+
+
+def count_message_tokens(model_name: str, messages: list["ChatMessage"]) -> int:
+    tokenizer = get_tokenizer(model_name)
+    return sum(
+        tokens_per_message + tokenizer.count(message.text) for message in messages
+    )
+
+
+class StreamTokenCounter:
+    """流式响应的增量计数
+
+    每个 chunk 只追加到缓冲区, 累积到 flush_chars 后在最后一个空白处切分并计数,
+    避免把一个词拆到两次计数中, 每个 chunk 的开销是常数。
+    """
+
+    def __init__(self, model_name: str, flush_chars: int = stream_flush_chars):
+        self.tokenizer = get_tokenizer(model_name)
+        self.flush_chars = flush_chars
+        self.pending: list[str] = []
+        self.pending_chars = 0
+        self.tokens = 0
+
+    def feed(self, text: str | None) -> None:
+        if not text:
+            return
+        self.pending.append(text)
+        self.pending_chars += len(text)
+        if self.pending_chars >= self.flush_chars:
+            self._flush(final=False)
+
+    def _flush(self, final: bool) -> None:
+        text = "".join(self.pending)
+        if not final:
+            # 在最后一个空白处切分, 剩余部分留到下次计数
+            cut = max(text.rfind(" "), text.rfind("\n")) + 1
+            if cut <= 0:
+                cut = len(text)
+            text, rest = text[:cut], text[cut:]
+            self.pending = [rest] if rest else []
+            self.pending_chars = len(rest)
+        else:
+            self.pending = []
+            self.pending_chars = 0
+        self.tokens += self.tokenizer.count(text)
+
+    def total(self) -> int:
+        if self.pending:
+            self._flush(final=True)
+        return self.tokens
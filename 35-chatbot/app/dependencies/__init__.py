@@ -1,13 +1,38 @@
-from .jwt import create_access_token, verify_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
-from .password import get_password_hash, verify_password
+from .jwt import (
+    create_access_token,
+    decode_access_token,
+    verify_access_token,
+    TokenClaims,
+    token_cache,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+)
+from .password import (
+    get_password_hash,
+    verify_password,
+    aget_password_hash,
+    averify_password,
+    password_hasher,
+)
 from .oauth2 import oauth2_scheme
+from .database import DBSession
+from .ratelimit import rate_limit, RateLimit, acquire_stream_slot
 
 
 __all__ = [
     "create_access_token",
+    "decode_access_token",
     "verify_access_token",
+    "TokenClaims",
+    "token_cache",
     "ACCESS_TOKEN_EXPIRE_MINUTES",
     "get_password_hash",
     "verify_password",
+    "aget_password_hash",
+    "averify_password",
+    "password_hasher",
     "oauth2_scheme",
+    "DBSession",
+    "rate_limit",
+    "RateLimit",
+    "acquire_stream_slot",
 ]
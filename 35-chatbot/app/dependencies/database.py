@@ -0,0 +1,10 @@
+from typing import Annotated
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core import get_db
+
+
+# 在路径操作函数中声明数据库会话参数:
+# async def read_items(db: DBSession): ...
+# 同步模式下得到的是 ThreadPoolSession, 接口与 AsyncSession 相同
+DBSession = Annotated[AsyncSession, Depends(get_db)]
@@ -1,8 +1,12 @@
+import hashlib
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel
 from fastapi import HTTPException, status
 import jwt
 from jwt.exceptions import InvalidTokenError, ExpiredSignatureError
+from ..core import TTLCache
 
 
 # 处理 JWT 令牌
@@ -15,6 +19,10 @@ SECRET_KEY = "1adfd4ad5236f9c900216606775b5668f3265c08ce35c8c31c2dd8c4ddffbc91"
 ALGORITHM = "HS256"
 # 创建设置令牌过期时间的变量。
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
+# 已验证令牌的缓存, 同一个令牌在有效期内只需要验证一次签名
+TOKEN_CACHE_MAXSIZE = 10000
+# 缓存时间, 单位秒, 不会超过令牌的过期时间
+TOKEN_CACHE_TTL = 300
 
 
 # 定义令牌端点响应的 Pydantic 模型。
@@ -23,6 +31,28 @@ class Token(BaseModel):
     token_type: str
 
 
+# 解码后的令牌内容
+@dataclass(frozen=True, slots=True)
+class TokenClaims:
+    sub: str
+    exp: float
+    created_at: float | None = None
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "TokenClaims | None":
+        sub = payload.get("sub", None)
+        exp = payload.get("exp", None)
+        if sub is None or exp is None:
+            return None
+        return cls(sub=str(sub), exp=float(exp), created_at=payload.get("created_at"))
+
+
+# 令牌的 sha256 摘要 -> TokenClaims, 不保存令牌本身
+token_cache: TTLCache[bytes, TokenClaims] = TTLCache(
+    maxsize=TOKEN_CACHE_MAXSIZE, ttl=TOKEN_CACHE_TTL
+)
+
+
 # JWT 验证异常
 credentials_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -42,6 +72,9 @@ expired_exception = HTTPException(
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     # 防止修改原数据
     to_encode = data.copy()
+    # PyJWT 要求 sub 是字符串
+    if "sub" in to_encode:
+        to_encode["sub"] = str(to_encode["sub"])
     now = datetime.now()
     # 添加过期时间
     if expires_delta:
@@ -54,16 +87,27 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     return encoded_jwt
 
 
-def verify_access_token(token: str) -> str:
+def decode_access_token(token: str) -> TokenClaims:
+    key = hashlib.sha256(token.encode()).digest()
+    now = time.time()
+
+    claims = token_cache.get(key)
+    if claims is not None:
+        # 缓存时间不超过过期时间, 这里再检查一次
+        if claims.exp <= now:
+            token_cache.invalidate(key)
+            raise expired_exception
+        return claims
+
     try:
         # 传入的 token 是 JWT 令牌，需要解码
         # 过期后会抛出 jwt.exceptions.ExpiredSignatureError 异常
         payload: dict = jwt.decode(token, SECRET_KEY, [ALGORITHM])
-        print(f"payload: {payload}")
-        sub: str = payload.get("sub", None)
-        if sub is None:
+        claims = TokenClaims.from_payload(payload)
+        if claims is None:
             raise credentials_exception
-        return sub
+        token_cache.set(key, claims, ttl=min(TOKEN_CACHE_TTL, claims.exp - now))
+        return claims
 
     # JWT 令牌过期后会抛出 jwt.exceptions.ExpiredSignatureError 异常
     except ExpiredSignatureError:
@@ -74,3 +118,7 @@ def verify_access_token(token: str) -> str:
     except InvalidTokenError:
         print("invalid token")
         raise credentials_exception
+
+
+def verify_access_token(token: str) -> str:
+    return decode_access_token(token).sub
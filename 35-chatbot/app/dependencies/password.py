@@ -1,4 +1,20 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, TypeVar
 import bcrypt
+from fastapi import HTTPException, status
+from ..envs import ENVS
+
+
+T = TypeVar("T")
+
+password_config: dict = ENVS.get("password", {})
+# bcrypt 每次计算约 250ms, 在线程池中执行, bcrypt 计算时会释放 GIL
+workers: int = password_config.get("workers", 4)
+# 正在执行和排队的任务数上限, 超过后直接返回 429
+max_pending: int = password_config.get("max_pending", 32)
+# 429 响应中的 Retry-After, 单位秒
+retry_after: int = password_config.get("retry_after", 1)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -8,3 +24,83 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     # return pwd_context.hash(password)
     return bcrypt.hashpw(password.encode("utf8"), bcrypt.gensalt()).decode("utf8")
+
+
+class PasswordHasher:
+    """在专用的线程池中计算 bcrypt, 不阻塞事件循环
+
+    排队的任务数有上限, 登录请求过多时快速返回 429, 而不是让所有请求一起变慢。
+    """
+
+    def __init__(
+        self,
+        workers: int = workers,
+        max_pending: int = max_pending,
+        retry_after: int = retry_after,
+    ):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        # 只在事件循环线程中修改, 不需要加锁
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many password operations, please retry later",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self.pending += 1
+        loop = asyncio.get_running_loop()
+        job = self.executor.submit(fn, *args)
+
+        # 请求被取消后线程中的计算仍在继续, 在任务真正结束 (或排队时被取消) 后才减少 pending
+        # 回调在工作线程中执行, 回到事件循环线程中修改计数
+        def on_done(job: Future) -> None:
+            try:
+                loop.call_soon_threadsafe(self._done, job)
+            except RuntimeError:
+                # 事件循环已经关闭
+                pass
+
+        job.add_done_callback(on_done)
+        return await asyncio.wrap_future(job)
+
+    def _done(self, job: Future) -> None:
+        self.pending -= 1
+        if not job.cancelled():
+            self.completed += 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self.run(get_password_hash, password)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
+
+    def snapshot(self) -> dict:
+        return {
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher()
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
+
+
+async def aget_password_hash(password: str) -> str:
+    return await password_hasher.hash(password)
@@ -0,0 +1,37 @@
+from typing import Annotated
+from fastapi import Depends, HTTPException, Response, status
+from ..core import RateLimitDecision, rate_limiter
+from .jwt import verify_access_token
+from .oauth2 import oauth2_scheme
+
+
+# 依赖项: 按令牌中的 sub 限流, 超过限额时返回 429
+# 剩余限额写入响应头, 流式响应需要把 decision.headers 传给 StreamingResponse
+async def rate_limit(
+    token: Annotated[str, Depends(oauth2_scheme)], response: Response
+) -> RateLimitDecision:
+    user_id = verify_access_token(token)
+    decision = await rate_limiter.admit(user_id)
+    if not decision.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded, please retry later",
+            headers=decision.headers,
+        )
+    response.headers.update(decision.headers)
+    return decision
+
+
+RateLimit = Annotated[RateLimitDecision, Depends(rate_limit)]
+
+
+async def acquire_stream_slot(user_id: str) -> str:
+    """占用一个流式响应名额, 结束后调用 rate_limiter.release_stream 释放"""
+    slot = await rate_limiter.acquire_stream(user_id)
+    if slot is None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many concurrent streams",
+            headers={"Retry-After": "1"},
+        )
+    return slot
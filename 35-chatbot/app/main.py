@@ -1,13 +1,46 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from .api import users_router, chat_router
+from .api import users_router, chat_router, metrics_router
+from .dependencies import password_hasher
+from .core import (
+    init_llm_client,
+    close_llm_client,
+    create_all,
+    dispose_engine,
+    conversation_writer,
+    dispatcher,
+)
+
+
+# 使用 lifespan 管理共享资源的生命周期
+# yield 之前的代码在应用启动时执行, 之后的代码在应用关闭时执行
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 创建所有表
+    await create_all()
+    # 创建共享的上游客户端和连接池
+    await init_llm_client()
+    # 启动后台批量保存对话的任务
+    await conversation_writer.start()
+    # 启动上游请求的批量调度
+    await dispatcher.start()
+    yield
+    # 发送完排队的请求后关闭连接池
+    await dispatcher.stop()
+    await close_llm_client()
+    # 写入队列中剩余的对话后再关闭数据库
+    await conversation_writer.stop()
+    await dispose_engine()
+    password_hasher.shutdown()
 
 
 # 可以声明全局依赖项，它会和每个 APIRouter 的依赖项组合在一起：
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 app.include_router(users_router)
 app.include_router(chat_router)
+app.include_router(metrics_router)
 
 
 # http://127.0.0.1:8000/docs
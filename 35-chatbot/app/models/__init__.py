@@ -1,6 +1,27 @@
 from .conversations import ConversationDB
+from .messages import MessageDB
 from .models import ModelDB
 from .users import UserDB
+from .cache import (
+    CachedUser,
+    user_cache,
+    model_cache,
+    get_cached_user,
+    get_or_create_model_id,
+)
+from .history import reserve_conversation, load_context
 
 
-__all__ = ["ConversationDB", "ModelDB", "UserDB"]
+__all__ = [
+    "ConversationDB",
+    "MessageDB",
+    "ModelDB",
+    "UserDB",
+    "CachedUser",
+    "user_cache",
+    "model_cache",
+    "get_cached_user",
+    "get_or_create_model_id",
+    "reserve_conversation",
+    "load_context",
+]
@@ -0,0 +1,87 @@
+import datetime
+from dataclasses import dataclass
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core import TTLCache
+from ..envs import ENVS
+from .models import ModelDB
+from .users import UserDB
+
+
+# 聊天接口每次请求都要查询用户和模型, 这两张表很少变化, 缓存查询结果
+# 只缓存不可变的简单数据, 不缓存 ORM 对象 (ORM 对象属于某个会话)
+cache_config: dict = ENVS.get("cache", {})
+user_cache_config: dict = cache_config.get("users", {})
+model_cache_config: dict = cache_config.get("models", {})
+
+
+@dataclass(frozen=True, slots=True)
+class CachedUser:
+    id: int
+    username: str
+    deleted_at: datetime.datetime | None
+
+
+# user_id -> CachedUser
+user_cache: TTLCache[int, CachedUser] = TTLCache(
+    maxsize=user_cache_config.get("maxsize", 10000),
+    ttl=user_cache_config.get("ttl", 60),
+)
+# model_name -> model_id
+model_cache: TTLCache[str, int] = TTLCache(
+    maxsize=model_cache_config.get("maxsize", 1000),
+    ttl=model_cache_config.get("ttl", 300),
+)
+
+
+async def get_cached_user(db: AsyncSession, user_id: int) -> CachedUser | None:
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    row = await db.get(UserDB, user_id)
+    if row is None:
+        # 不缓存不存在的用户
+        return None
+    user = CachedUser(id=row.id, username=row.username, deleted_at=row.deleted_at)
+    user_cache.set(user_id, user)
+    return user
+
+
+async def get_or_create_model_id(db: AsyncSession, model_name: str) -> int:
+    model_id = model_cache.get(model_name)
+    if model_id is not None:
+        return model_id
+    model_id = await db.scalar(
+        select(ModelDB.id).where(ModelDB.model_name == model_name)
+    )
+    if model_id is None:
+        model = ModelDB(model_name=model_name)
+        db.add(model)
+        try:
+            await db.commit()
+            model_id = model.id
+        except IntegrityError:
+            # 其它请求同时创建了同名的模型
+            await db.rollback()
+            model_id = await db.scalar(
+                select(ModelDB.id).where(ModelDB.model_name == model_name)
+            )
+    model_cache.set(model_name, model_id)
+    return model_id
+
+
+# 用户或模型被修改/删除时让缓存失效
+# 只能感知当前进程中通过 ORM 做的修改, 其它进程的修改在 ttl 后生效
+@event.listens_for(UserDB, "after_update")
+@event.listens_for(UserDB, "after_delete")
+def invalidate_user(mapper, connection, target: UserDB) -> None:
+    user_cache.invalidate(target.id)
+
+
+@event.listens_for(ModelDB, "after_update")
+@event.listens_for(ModelDB, "after_delete")
+def invalidate_model(mapper, connection, target: ModelDB) -> None:
+    # model_name 本身也可能被修改, 直接清空 (模型数量很少)
+    model_cache.clear()
@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from ..core.database import (
     Base,
@@ -16,16 +16,27 @@ from typing import TYPE_CHECKING  # for type hinting, 可以解决循环导入
 if TYPE_CHECKING:
     from .users import UserDB
     from .models import ModelDB
+    from .messages import MessageDB
 
 
 class ConversationDB(Base):
     __tablename__ = "chatbot_conversations"
+    # 按用户分页查询历史对话 (keyset 分页) 使用的联合索引
+    __table_args__ = (
+        Index("ix_chatbot_conversations_user_updated", "user_id", "updated_at", "id"),
+    )
+    # 插入和更新后立即取回服务端生成的默认值 (created_at, updated_at 等)
+    # 异步模式下不能在访问属性时再懒加载
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[int_pk]
     user_id: Mapped[int] = mapped_column(ForeignKey("chatbot_users.id"))
     model_id: Mapped[int] = mapped_column(ForeignKey("chatbot_models.id"))
     title: Mapped[string]
+    # 旧版本把所有消息保存在这一列, 新的消息保存在 chatbot_messages 表中
+    # 运行 migrate.py 把旧数据迁移到新表
     messages: Mapped[json_type]
+    message_count: Mapped[default_zero_int]
     desc: Mapped[text]
     input_tokens: Mapped[default_zero_int]
     output_tokens: Mapped[default_zero_int]
@@ -37,6 +48,9 @@ class ConversationDB(Base):
     # 关联字段
     user: Mapped["UserDB"] = relationship("UserDB", back_populates="conversations")
     model: Mapped["ModelDB"] = relationship("ModelDB", back_populates="conversations")
+    message_rows: Mapped[list["MessageDB"]] = relationship(
+        "MessageDB", back_populates="conversation", order_by="MessageDB.seq"
+    )
 
     def __repr__(self):
-        return f"<Conversation(id={self.id}, user_id={self.user_id}, model_id={self.model_id}, title='{self.title}', messages={self.messages}, desc='{self.desc}', input_tokens={self.input_tokens}, output_tokens={self.output_tokens}, status='{self.status}')>"
+        return f"<Conversation(id={self.id}, user_id={self.user_id}, model_id={self.model_id}, title='{self.title}', message_count={self.message_count}, desc='{self.desc}', input_tokens={self.input_tokens}, output_tokens={self.output_tokens}, status='{self.status}')>"
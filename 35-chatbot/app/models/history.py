@@ -0,0 +1,103 @@
+from typing import TYPE_CHECKING
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core import (
+    ContextWindow,
+    context_budget,
+    plan_context,
+    summary_message,
+    get_tokenizer,
+    content_text,
+    count_message_tokens,
+)
+from ..core.context.window import max_history, policy, summary_messages
+from .conversations import ConversationDB
+from .messages import MessageDB
+
+if TYPE_CHECKING:
+    from ..schemas import ChatMessage
+
+
+async def reserve_conversation(db: AsyncSession, user_id: int, model_id: int) -> int:
+    """服务端保存上下文时先创建空的对话, 返回的 id 用于之后的请求, 消息由后台任务追加"""
+    conversation = ConversationDB(user_id=user_id, model_id=model_id, message_count=0)
+    db.add(conversation)
+    await db.commit()
+    return conversation.id
+
+
+async def load_context(
+    db: AsyncSession,
+    conversation_id: int,
+    message_count: int,
+    model_name: str,
+    messages: list["ChatMessage"],
+    max_tokens: int,
+) -> ContextWindow:
+    """读取对话的历史消息, 按上下文长度裁剪后放在请求中新的消息之前
+
+    先只读取每条消息的角色和保存的 token 数, 决定保留哪些消息, 再读取保留部分的内容,
+    被裁剪的消息只有 summarize 时才读取最近的 summary_messages 条。
+    """
+    tokenizer = get_tokenizer(model_name)
+    new_tokens = count_message_tokens(model_name, messages)
+
+    rows = (
+        await db.execute(
+            select(MessageDB.seq, MessageDB.role, MessageDB.token_count)
+            .where(
+                MessageDB.conversation_id == conversation_id,
+                or_(
+                    MessageDB.seq >= message_count - max_history,
+                    MessageDB.role == "system",
+                ),
+            )
+            .order_by(MessageDB.seq)
+        )
+    ).all()
+    counts = {seq: token_count for seq, _, token_count in rows}
+    missing = [seq for seq, token_count in counts.items() if token_count is None]
+    if missing:
+        # 旧数据没有 token 数, 读取内容后计算
+        for seq, content in await db.execute(
+            select(MessageDB.seq, MessageDB.content).where(
+                MessageDB.conversation_id == conversation_id,
+                MessageDB.seq.in_(missing),
+            )
+        ):
+            counts[seq] = tokenizer.count(content_text(content))
+
+    plan = plan_context(
+        [(seq, role, counts[seq]) for seq, role, _ in rows],
+        context_budget(model_name, max_tokens) - new_tokens,
+        policy,
+    )
+    summarized = plan.dropped[-summary_messages:] if policy == "summarize" else []
+    needed = plan.pinned + summarized + plan.kept
+    contents: dict[int, tuple[str, str | list | None]] = {}
+    if needed:
+        for seq, role, content in await db.execute(
+            select(MessageDB.seq, MessageDB.role, MessageDB.content).where(
+                MessageDB.conversation_id == conversation_id,
+                MessageDB.seq.in_(needed),
+            )
+        ):
+            contents[seq] = (role, content)
+
+    # system 消息, 摘要, 保留的历史消息
+    history = [
+        {"role": contents[seq][0], "content": contents[seq][1]} for seq in plan.pinned
+    ]
+    if summarized:
+        summary = summary_message([contents[seq] for seq in summarized], tokenizer)
+        if summary is not None:
+            history.append(summary)
+    history.extend(
+        {"role": contents[seq][0], "content": contents[seq][1]} for seq in plan.kept
+    )
+    return ContextWindow(
+        messages=history,
+        dropped=len(plan.dropped),
+        tokens=plan.tokens + new_tokens,
+    )
@@ -0,0 +1,47 @@
+from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from ..core.database import (
+    Base,
+    int_pk,
+    required_string,
+    json_type,
+    json_value,
+    timestamp_default_now,
+)
+from typing import TYPE_CHECKING  # for type hinting, 可以解决循环导入问题
+
+if TYPE_CHECKING:
+    from .conversations import ConversationDB
+
+
+class MessageDB(Base):
+    __tablename__ = "chatbot_messages"
+    # 同一个对话中消息的序号唯一, 同时作为按序号分页的索引
+    __table_args__ = (UniqueConstraint("conversation_id", "seq"),)
+    __mapper_args__ = {"eager_defaults": True}
+
+    id: Mapped[int_pk]
+    conversation_id: Mapped[int] = mapped_column(
+        ForeignKey("chatbot_conversations.id"), comment="所属对话"
+    )
+    seq: Mapped[int] = mapped_column(comment="消息在对话中的序号, 从0开始")
+    role: Mapped[required_string]
+    content: Mapped[json_value]
+    references: Mapped[json_type]
+    # 裁剪上下文时直接使用, 不需要重新分词; 旧数据为空, 运行 migrate.py 补齐
+    token_count: Mapped[int | None] = mapped_column(comment="内容的 token 数")
+    created_at: Mapped[timestamp_default_now]
+
+    # 关联字段
+    conversation: Mapped["ConversationDB"] = relationship(
+        "ConversationDB", back_populates="message_rows"
+    )
+
+    def to_dict(self) -> dict:
+        message = {"role": self.role, "content": self.content}
+        if self.references:
+            message["references"] = self.references
+        return message
+
+    def __repr__(self):
+        return f"<Message(id={self.id}, conversation_id={self.conversation_id}, seq={self.seq}, role='{self.role}', content={self.content!r})>"
@@ -16,6 +16,9 @@ from .conversations import ConversationDB
 class UserDB(Base):
     # 表名
     __tablename__ = "chatbot_users"
+    # 插入和更新后立即取回服务端生成的默认值 (created_at, updated_at 等)
+    # 异步模式下不能在访问属性时再懒加载
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[int_pk]
     username: Mapped[required_string]
@@ -1 +1,20 @@
 # Pydantic schemas
+from .messages import (
+    ImageURL,
+    InputAudio,
+    TextPart,
+    ImagePart,
+    AudioPart,
+    ContentPart,
+    ChatMessage,
+)
+
+__all__ = [
+    "ImageURL",
+    "InputAudio",
+    "TextPart",
+    "ImagePart",
+    "AudioPart",
+    "ContentPart",
+    "ChatMessage",
+]
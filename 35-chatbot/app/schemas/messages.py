@@ -0,0 +1,95 @@
+from dataclasses import dataclass
+from typing import Annotated, Literal, Union
+from pydantic import Field
+
+
+# 对话消息使用 slots dataclass 而不是 dict:
+# 请求体由 pydantic 校验一次后得到这些对象, 之后在计数, 缓存和保存时直接读取属性, 不再复制
+@dataclass(slots=True)
+class ImageURL:
+    url: str
+    detail: Literal["auto", "low", "high"] | None = None
+
+
+@dataclass(slots=True)
+class InputAudio:
+    data: str
+    format: Literal["wav", "mp3"]
+
+
+@dataclass(slots=True)
+class TextPart:
+    type: Literal["text"]
+    text: str
+
+
+@dataclass(slots=True)
+class ImagePart:
+    type: Literal["image_url"]
+    image_url: ImageURL
+
+
+@dataclass(slots=True)
+class AudioPart:
+    type: Literal["input_audio"]
+    input_audio: InputAudio
+
+
+# 多模态消息的内容, 按 type 字段区分
+ContentPart = Annotated[
+    Union[TextPart, ImagePart, AudioPart], Field(discriminator="type")
+]
+
+
+def part_to_dict(part: TextPart | ImagePart | AudioPart) -> dict:
+    if isinstance(part, TextPart):
+        return {"type": "text", "text": part.text}
+    if isinstance(part, ImagePart):
+        image_url = {"url": part.image_url.url}
+        if part.image_url.detail is not None:
+            image_url["detail"] = part.image_url.detail
+        return {"type": "image_url", "image_url": image_url}
+    return {
+        "type": "input_audio",
+        "input_audio": {
+            "data": part.input_audio.data,
+            "format": part.input_audio.format,
+        },
+    }
+
+
+@dataclass(slots=True)
+class ChatMessage:
+    # 与之前的 dict 消息相同, 不限制 role 和 references 的内容, 最后一条消息的 role 由路由检查
+    role: str
+    content: str | list[ContentPart] | None = None
+    references: list | None = None
+    name: str | None = None
+    tool_call_id: str | None = None
+
+    @property
+    def text(self) -> str:
+        """消息中的文本, 多模态消息只取 text 部分"""
+        content = self.content
+        if not content:
+            return ""
+        if isinstance(content, str):
+            return content
+        return "".join(part.text for part in content if isinstance(part, TextPart))
+
+    def content_json(self) -> str | list[dict] | None:
+        """保存到数据库的 content, 文本消息直接使用原字符串"""
+        if self.content is None or isinstance(self.content, str):
+            return self.content
+        return [part_to_dict(part) for part in self.content]
+
+    def to_dict(self) -> dict:
+        """发送给上游的消息, 省略为 None 的字段"""
+        message = {"role": self.role, "content": self.content_json()}
+        if self.references:
+            message["references"] = self.references
+        if self.name is not None:
+            message["name"] = self.name
+        if self.tool_call_id is not None:
+            message["tool_call_id"] = self.tool_call_id
+        return message
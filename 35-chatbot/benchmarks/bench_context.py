@@ -0,0 +1,76 @@
+# 对比裁剪上下文时重新分词和使用保存的每条消息的 token 数, 以及客户端发送完整历史和只发送新消息的请求体大小
+# 在 35-chatbot 目录下运行:
+#   python -m benchmarks.bench_context --turns 100 500 2000 --chars 500
+import argparse
+import json
+import time
+
+from app.core import context_budget, get_tokenizer, plan_context
+from app.core.tokenizer.tokenizer import tokens_per_message
+
+
+MODEL = "gpt4o"
+
+
+def recount_plan(history: list[tuple[int, str, str]], budget: int) -> int:
+    """没有保存 token 数时, 每次请求都要对所有历史消息重新分词"""
+    tokenizer = get_tokenizer(MODEL)
+    used = 0
+    start = len(history)
+    while start > 0:
+        cost = tokenizer.count(history[start - 1][2]) + tokens_per_message
+        if used + cost > budget:
+            break
+        used += cost
+        start -= 1
+    return start
+
+
+def timeit(fn, number: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - start) / number
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--chars", type=int, default=500)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    tokenizer = get_tokenizer(MODEL)
+    text = "猫和老鼠是一部美国动画片, " * (args.chars // 14)
+    # 预算足够大, 两种方式都要遍历所有消息
+    budget = 10**9
+    print(f"{tokenizer.name} tokenizer, {args.chars} chars per message")
+    print(f"{'messages':>8} {'recount':>12} {'cached':>12} {'full body':>12} {'new turn':>10}")
+    for turns in args.turns:
+        history = [
+            (seq, "user" if seq % 2 == 0 else "assistant", text) for seq in range(turns)
+        ]
+        cached = [(seq, role, tokenizer.count(content)) for seq, role, content in history]
+        recount = timeit(lambda: recount_plan(history, budget), args.number)
+        plan = timeit(lambda: plan_context(cached, budget), args.number)
+
+        full_body = json.dumps(
+            {"messages": [{"role": role, "content": content} for _, role, content in history]},
+            ensure_ascii=False,
+        ).encode()
+        new_body = json.dumps(
+            {"messages": [{"role": "user", "content": text}], "use_history": True},
+            ensure_ascii=False,
+        ).encode()
+        print(
+            f"{turns:>8} {recount * 1e3:10.3f}ms {plan * 1e3:10.3f}ms"
+            f" {len(full_body) / 1024:10.1f}KB {len(new_body) / 1024:8.1f}KB"
+        )
+
+    budget = context_budget(MODEL, 1024)
+    plan = plan_context(cached, budget)
+    print(
+        f"\n{MODEL} budget {budget} tokens: keep {len(plan.kept)} of {len(cached)} messages,"
+        f" {plan.tokens} tokens"
+    )
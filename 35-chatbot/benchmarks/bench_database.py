@@ -0,0 +1,84 @@
+# 对比同步 (线程池) 和异步两种数据库模式的吞吐量
+# 在 35-chatbot 目录下运行:
+#   python -m benchmarks.bench_database --requests 2000 --concurrency 50
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core import Base, ThreadPoolSession, make_url
+from app.core.database.database import engine_kwargs
+from app.models import UserDB
+
+
+def make_sessions(async_mode: bool):
+    url = make_url(async_mode)
+    if async_mode:
+        engine = create_async_engine(url, **engine_kwargs)
+        maker = async_sessionmaker(engine, expire_on_commit=False)
+        return engine, maker
+    engine = create_engine(url, **engine_kwargs)
+    maker = sessionmaker(bind=engine, expire_on_commit=False)
+    return engine, lambda: ThreadPoolSession(maker())
+
+
+async def workload(new_session, email: str) -> None:
+    # 与登录时的 get_user 相同: 按 email 查询用户并更新登录时间
+    db = new_session()
+    try:
+        user = await db.scalar(select(UserDB).where(UserDB.email == email))
+        user.status = "active"
+        await db.commit()
+    finally:
+        await db.close()
+
+
+async def run(async_mode: bool, requests: int, concurrency: int) -> dict:
+    engine, new_session = make_sessions(async_mode)
+    if async_mode:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    else:
+        Base.metadata.create_all(engine)
+
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    db = new_session()
+    db.add(UserDB(username="bench", password="bench", email=email))
+    await db.commit()
+    await db.close()
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await workload(new_session, email)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    if async_mode:
+        await engine.dispose()
+    else:
+        engine.dispose()
+    return {
+        "mode": "async" if async_mode else "sync",
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    for async_mode in (False, True):
+        print(asyncio.run(run(async_mode, args.requests, args.concurrency)))
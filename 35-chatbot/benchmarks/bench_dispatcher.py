@@ -0,0 +1,88 @@
+# 测试批量调度的等待时间和批大小对吞吐量和延迟的影响
+# 先在 34-stream 目录下启动模拟的上游:
+#   uvicorn openai_server:app --port 8000
+# 然后在 35-chatbot 目录下运行:
+#   python -m benchmarks.bench_dispatcher --base-url http://localhost:8000/v1/ --requests 200 --users 10
+import argparse
+import asyncio
+import statistics
+import time
+
+from openai import AsyncOpenAI
+
+from app.core.llm import BatchDispatcher
+
+
+async def run(
+    name: str,
+    client: AsyncOpenAI,
+    dispatcher: BatchDispatcher | None,
+    requests: int,
+    users: int,
+) -> None:
+    latencies = []
+
+    async def one(i: int) -> None:
+        async def call():
+            return await client.chat.completions.create(
+                messages=[{"role": "user", "content": f"hello {i}"}],
+                model="mock",
+                max_tokens=16,
+            )
+
+        start = time.perf_counter()
+        if dispatcher is None:
+            await call()
+        else:
+            # 每 10 个请求有一个高优先级请求
+            await dispatcher.submit(i % users, call, 0 if i % 10 == 0 else 1)
+        latencies.append(time.perf_counter() - start)
+
+    if dispatcher is not None:
+        await dispatcher.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    if dispatcher is not None:
+        await dispatcher.stop()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    batches = ""
+    if dispatcher is not None:
+        batches = f"  avg batch {dispatcher.snapshot()['avg_batch_size']:.1f}"
+    print(
+        f"{name:<28} {requests / elapsed:8.1f} req/s"
+        f"  p50 {statistics.median(latencies) * 1000:7.1f}ms"
+        f"  p95 {p95 * 1000:7.1f}ms{batches}"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    client = AsyncOpenAI(api_key="I AM AN API_KEY", base_url=args.base_url)
+    await run("direct", client, None, args.requests, args.users)
+    for max_batch_size, max_wait in [(8, 0.0), (8, 0.005), (16, 0.01), (32, 0.05)]:
+        dispatcher = BatchDispatcher(
+            enabled=True,
+            max_batch_size=max_batch_size,
+            max_wait=max_wait,
+            max_concurrency=args.concurrency,
+        )
+        await run(
+            f"batch={max_batch_size} wait={max_wait * 1000:.0f}ms",
+            client,
+            dispatcher,
+            args.requests,
+            args.users,
+        )
+    await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", type=str, default="http://localhost:8000/v1/")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,37 @@
+# 对比每次完整解码 JWT 和使用已验证令牌缓存的耗时
+# 在 35-chatbot 目录下运行:
+#   python -m benchmarks.bench_jwt --number 100000
+import argparse
+import timeit
+
+import jwt
+
+from app.dependencies.jwt import (
+    ALGORITHM,
+    SECRET_KEY,
+    create_access_token,
+    decode_access_token,
+    token_cache,
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    token = create_access_token(data={"sub": "1"})
+
+    # 完整解码: base64 + json + HMAC 验证签名
+    decode = timeit.timeit(
+        lambda: jwt.decode(token, SECRET_KEY, [ALGORITHM]), number=args.number
+    )
+
+    token_cache.clear()
+    decode_access_token(token)
+    # 缓存命中: sha256 摘要 + 字典查找
+    cached = timeit.timeit(lambda: decode_access_token(token), number=args.number)
+
+    print(f"jwt.decode:          {decode / args.number * 1e6:.2f} us/op")
+    print(f"decode_access_token: {cached / args.number * 1e6:.2f} us/op (cached)")
+    print(f"speedup:             {decode / cached:.1f}x")
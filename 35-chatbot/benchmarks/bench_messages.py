@@ -0,0 +1,132 @@
+# 对比 dict 消息和 ChatMessage 在一次请求中的内存占用和耗时
+# 包括: 校验请求体, 计算缓存 key, 统计 token, 转换为上游请求, 拼接回复和生成数据库行
+# 在 35-chatbot 目录下运行:
+#   python -m benchmarks.bench_messages --messages 200 --chars 2000
+import argparse
+import json
+import time
+import tracemalloc
+
+from pydantic import BaseModel, Field
+
+from app.api.chat.routers import ChatRequest
+from app.core import CompletionCache, content_text, count_message_tokens, get_tokenizer
+from app.core.persistence.writer import ConversationRecord, message_rows
+from app.core.tokenizer.tokenizer import tokens_per_message
+from app.schemas import ChatMessage
+
+
+MODEL = "gpt4o"
+
+
+class DictChatRequest(BaseModel):
+    """改动之前的请求体, 消息是 dict"""
+
+    messages: list[dict[str, str | list]] = Field(None)
+    max_tokens: int = 1024
+    n: int = 1
+    temperature: float = 0.8
+    top_p: float = 0.8
+    top_k: int = 50
+
+
+def dict_pipeline(body: bytes) -> tuple:
+    request = DictChatRequest.model_validate_json(body)
+    messages = request.messages
+    cache_params = request.model_dump(
+        include={"messages", "max_tokens", "n", "temperature", "top_p", "top_k"}
+    )
+    cache_params["model"] = MODEL
+    key = CompletionCache.make_key(cache_params)
+    tokenizer = get_tokenizer(MODEL)
+    tokens = sum(
+        tokens_per_message + tokenizer.count(content_text(message.get("content")))
+        for message in messages
+    )
+    upstream = messages
+    messages_to_save = messages + [
+        {"role": "assistant", "content": "回复", "references": ["book1"]}
+    ]
+    rows = [
+        {
+            "conversation_id": 1,
+            "seq": seq,
+            "role": message.get("role", ""),
+            "content": message.get("content"),
+            "references": message.get("references") or None,
+        }
+        for seq, message in enumerate(messages_to_save[len(messages) - 1 :], len(messages) - 1)
+    ]
+    return request, cache_params, key, tokens, upstream, messages_to_save, rows
+
+
+def message_pipeline(body: bytes) -> tuple:
+    request = ChatRequest.model_validate_json(body)
+    messages = request.messages
+    cache_params = request.model_dump(
+        include={"max_tokens", "n", "temperature", "top_p", "top_k"}
+    )
+    cache_params["messages"] = messages
+    cache_params["model"] = MODEL
+    key = CompletionCache.make_key(cache_params)
+    tokens = count_message_tokens(MODEL, messages)
+    upstream = [message.to_dict() for message in messages]
+    record = ConversationRecord(
+        user_id=1,
+        model_id=1,
+        messages=messages,
+        reply=ChatMessage(role="assistant", content="回复", references=["book1"]),
+        input_tokens=tokens,
+        output_tokens=1,
+        turn_start=len(messages) - 1,
+    )
+    rows = message_rows(1, record, len(messages) - 1)
+    return request, cache_params, key, tokens, upstream, record, rows
+
+
+def bench(name: str, pipeline, body: bytes, number: int) -> str:
+    result = pipeline(body)
+    start = time.perf_counter()
+    for _ in range(number):
+        pipeline(body)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    # 请求进行中保持的对象
+    result = pipeline(body)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:<14} {elapsed / number * 1e3:8.2f} ms/request"
+        f"  in flight {(current - base) / 1024:9.1f}KB  peak {(peak - base) / 1024:9.1f}KB"
+    )
+    return result[2]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--chars", type=int, default=2000)
+    parser.add_argument("--number", type=int, default=50)
+    args = parser.parse_args()
+
+    text = "猫和老鼠是一部美国动画片, " * (args.chars // 14)
+    messages = []
+    for i in range(args.messages):
+        if i % 10 == 9:
+            # 多模态消息
+            content = [
+                {"type": "text", "text": text},
+                {"type": "image_url", "image_url": {"url": f"https://example.com/{i}.jpg"}},
+            ]
+        else:
+            content = text
+        messages.append({"role": "user" if i % 2 == 0 else "assistant", "content": content})
+    body = json.dumps({"messages": messages}, ensure_ascii=False).encode()
+    print(f"{args.messages} messages, {len(body) / 1024:.1f}KB request body")
+
+    dict_key = bench("dict", dict_pipeline, body, args.number)
+    message_key = bench("ChatMessage", message_pipeline, body, args.number)
+    # 两种消息得到相同的缓存 key
+    assert dict_key == message_key
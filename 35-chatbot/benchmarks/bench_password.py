@@ -0,0 +1,64 @@
+# 对比在事件循环中直接计算 bcrypt 和在线程池中计算的吞吐量与事件循环延迟
+# 在 35-chatbot 目录下运行:
+#   python -m benchmarks.bench_password --requests 32 --workers 4
+import argparse
+import asyncio
+import time
+
+from app.dependencies.password import (
+    PasswordHasher,
+    get_password_hash,
+    verify_password,
+)
+
+
+async def measure_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """每隔 interval 秒唤醒一次, 返回最大的唤醒延迟"""
+    max_lag = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, time.perf_counter() - start - interval)
+    return max_lag
+
+
+async def run(name: str, login, requests: int) -> None:
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop))
+    await asyncio.sleep(0.05)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    max_lag = await lag_task
+    assert all(results)
+    print(
+        f"{name:<10} {requests / elapsed:8.1f} logins/s"
+        f"  total {elapsed:.2f}s  max loop lag {max_lag * 1000:.0f}ms"
+    )
+
+
+async def main(requests: int, workers: int) -> None:
+    hashed = get_password_hash("password")
+    hasher = PasswordHasher(workers=workers, max_pending=requests)
+
+    async def blocking_login():
+        # 旧的实现: 在事件循环中直接计算
+        return verify_password("password", hashed)
+
+    async def pooled_login():
+        return await hasher.verify("password", hashed)
+
+    await run("blocking", blocking_login, requests)
+    await run("pooled", pooled_login, requests)
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.workers))
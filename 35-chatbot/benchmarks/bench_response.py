@@ -0,0 +1,114 @@
+# 对比非流式响应的序列化: FastAPI 按 response_model 校验后序列化, 和 TrustedJSONResponse 直接序列化
+# 在 35-chatbot 目录下运行:
+#   python -m benchmarks.bench_response --number 5000 --sizes 1024 65536
+import argparse
+import asyncio
+import inspect
+import json
+import time
+import tracemalloc
+
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from openai.types.chat.chat_completion import ChatCompletion
+
+from app.core import TrustedJSONResponse
+from app.core.llm.response import orjson
+
+
+def make_completion(content_size: int) -> ChatCompletion:
+    """与上游客户端返回的 ChatCompletion 相同, 带有 references 扩展字段"""
+    return ChatCompletion.model_validate(
+        {
+            "id": "chatcmpl-123",
+            "object": "chat.completion",
+            "created": 1700000000,
+            "model": "internlm2_5-7b-chat",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {
+                        "role": "assistant",
+                        "content": "猫和老鼠" * (content_size // 12),
+                        "references": [f"book{i}" for i in range(10)],
+                    },
+                }
+            ],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 100, "total_tokens": 110},
+        }
+    )
+
+
+async def measure(name: str, fn, number: int) -> bytes:
+    response = await fn()
+    start = time.perf_counter()
+    for _ in range(number):
+        await fn()
+    elapsed = time.perf_counter() - start
+
+    # 一次序列化过程中的内存峰值
+    tracemalloc.start()
+    await fn()
+    tracemalloc.reset_peak()
+    current, _ = tracemalloc.get_traced_memory()
+    await fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:<32} {elapsed / number * 1e6:8.1f} us/op  {number / elapsed:9.0f} op/s"
+        f"  peak {(peak - current) / 1024:8.1f}KB"
+    )
+    return response.body
+
+
+async def main(args: argparse.Namespace) -> None:
+    print(f"orjson: {'installed' if orjson else 'not installed'}")
+    field = create_model_field("Response_chat", ChatCompletion, mode="serialization")
+    # 新版本 FastAPI 在没有指定 response_class 时由 pydantic-core 直接输出 JSON
+    has_dump_json = "dump_json" in inspect.signature(serialize_response).parameters
+
+    for size in args.sizes:
+        completion = make_completion(size)
+        cached = completion.model_dump()
+        print(f"\n{size // 1024}KB content")
+
+        async def legacy():
+            # 校验 -> dict -> json.dumps, 旧版本 FastAPI 或者指定了 response_class 时的路径
+            content = await serialize_response(field=field, response_content=completion)
+            return JSONResponse(content)
+
+        async def dump_json():
+            # 校验 -> pydantic-core 输出 JSON
+            content = await serialize_response(
+                field=field, response_content=completion, dump_json=True
+            )
+            return Response(content, media_type="application/json")
+
+        async def trusted():
+            return TrustedJSONResponse(completion)
+
+        async def cached_default():
+            return JSONResponse(cached)
+
+        async def cached_trusted():
+            return TrustedJSONResponse(cached)
+
+        bodies = [await measure("response_model (legacy)", legacy, args.number)]
+        if has_dump_json:
+            bodies.append(await measure("response_model (dump_json)", dump_json, args.number))
+        bodies.append(await measure("TrustedJSONResponse(model)", trusted, args.number))
+        bodies.append(await measure("JSONResponse(dict)", cached_default, args.number))
+        bodies.append(await measure("TrustedJSONResponse(dict)", cached_trusted, args.number))
+
+        # 所有路径输出的 JSON 内容相同
+        assert all(json.loads(body) == json.loads(bodies[0]) for body in bodies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=5000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 65536])
+    args = parser.parse_args()
+    asyncio.run(main(args))
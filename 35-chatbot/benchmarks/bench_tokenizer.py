@@ -0,0 +1,35 @@
+# 流式响应中每个 chunk 增量计数的开销
+# 在 35-chatbot 目录下运行:
+#   python -m benchmarks.bench_tokenizer --chunks 100000 --model gpt4o
+import argparse
+import time
+
+from app.core.tokenizer import StreamTokenCounter, get_tokenizer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--model", type=str, default="gpt4o")
+    args = parser.parse_args()
+
+    # 模拟上游每个 chunk 一个 token
+    pieces = ["你好", ", ", "this", " is", " a", " stream", "ing", " test", "。\n"]
+    chunks = [pieces[i % len(pieces)] for i in range(args.chunks)]
+
+    tokenizer = get_tokenizer(args.model)
+    print(f"tokenizer: {type(tokenizer).__name__}")
+
+    start = time.perf_counter()
+    counter = StreamTokenCounter(args.model)
+    for chunk in chunks:
+        counter.feed(chunk)
+    tokens = counter.total()
+    incremental = time.perf_counter() - start
+
+    start = time.perf_counter()
+    full = tokenizer.count("".join(chunks))
+    once = time.perf_counter() - start
+
+    print(f"incremental: {tokens} tokens, {incremental / args.chunks * 1e6:.3f} us/chunk")
+    print(f"full text:   {full} tokens, {once * 1e3:.2f} ms total")
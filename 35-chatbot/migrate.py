@@ -0,0 +1,131 @@
+# 数据库迁移脚本, 每一步都可以重复执行
+# 在当前目录下运行:
+#   python migrate.py
+from sqlalchemy import (
+    Engine,
+    create_engine,
+    inspect,
+    insert,
+    null,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.orm import Session
+
+from app.core import Base, make_url, get_tokenizer, content_text
+from app.models import ConversationDB, MessageDB, ModelDB
+
+
+def add_column(engine: Engine, table: str, column: str, ddl: str) -> None:
+    """表中没有该列时添加, create_all 不会修改已经存在的表"""
+    columns = {c["name"] for c in inspect(engine).get_columns(table)}
+    if column in columns:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    print(f"added column {table}.{column}")
+
+
+def migrate_conversation_messages(engine: Engine, batch_size: int = 500) -> None:
+    """把 chatbot_conversations.messages 中的消息拆分到 chatbot_messages 表"""
+    migrated = 0
+    with Session(engine) as session:
+        while True:
+            conversations = session.execute(
+                select(
+                    ConversationDB.id,
+                    ConversationDB.messages,
+                    ConversationDB.updated_at,
+                )
+                .where(ConversationDB.messages.is_not(None))
+                .order_by(ConversationDB.id)
+                .limit(batch_size)
+            ).all()
+            if not conversations:
+                break
+
+            rows = []
+            counts = []
+            for conversation_id, messages, updated_at in conversations:
+                messages = messages or []
+                rows.extend(
+                    {
+                        "conversation_id": conversation_id,
+                        "seq": seq,
+                        "role": message.get("role", ""),
+                        "content": message.get("content"),
+                        "references": message.get("references") or None,
+                    }
+                    for seq, message in enumerate(messages)
+                )
+                # updated_at 有 onupdate, 需要写回原来的值, 否则历史对话的排序和分页游标都会改变
+                counts.append(
+                    {
+                        "id": conversation_id,
+                        "message_count": len(messages),
+                        "updated_at": updated_at,
+                    }
+                )
+            if rows:
+                session.execute(insert(MessageDB), rows)
+            session.execute(update(ConversationDB), counts)
+            # 迁移后把旧列设为 SQL NULL, 下次不会重复迁移
+            session.execute(
+                update(ConversationDB)
+                .where(ConversationDB.id.in_([c["id"] for c in counts]))
+                .values(messages=null(), updated_at=ConversationDB.updated_at)
+            )
+            session.commit()
+            migrated += len(conversations)
+    print(f"migrated messages of {migrated} conversations")
+
+
+def backfill_token_counts(engine: Engine, batch_size: int = 1000) -> None:
+    """计算旧消息的 token 数, 使用对话所属模型的分词器"""
+    filled = 0
+    with Session(engine) as session:
+        while True:
+            messages = session.execute(
+                select(MessageDB.id, MessageDB.content, ModelDB.model_name)
+                .outerjoin(ConversationDB, MessageDB.conversation_id == ConversationDB.id)
+                .outerjoin(ModelDB, ConversationDB.model_id == ModelDB.id)
+                .where(MessageDB.token_count.is_(None))
+                .order_by(MessageDB.id)
+                .limit(batch_size)
+            ).all()
+            if not messages:
+                break
+
+            session.execute(
+                update(MessageDB),
+                [
+                    {
+                        "id": message_id,
+                        "token_count": get_tokenizer(model_name or "").count(
+                            content_text(content)
+                        ),
+                    }
+                    for message_id, content, model_name in messages
+                ],
+            )
+            session.commit()
+            filled += len(messages)
+    print(f"filled token counts of {filled} messages")
+
+
+if __name__ == "__main__":
+    # 迁移使用同步引擎
+    engine = create_engine(make_url(async_mode=False))
+
+    # 创建新表
+    Base.metadata.create_all(engine)
+    add_column(
+        engine, "chatbot_conversations", "message_count", "INTEGER DEFAULT 0"
+    )
+    add_column(engine, "chatbot_messages", "token_count", "INTEGER")
+    migrate_conversation_messages(engine)
+    backfill_token_counts(engine)
+    # 历史对话 keyset 分页使用的联合索引
+    for index in ConversationDB.__table__.indexes:
+        index.create(engine, checkfirst=True)
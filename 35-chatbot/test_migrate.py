@@ -0,0 +1,95 @@
+# 迁移脚本的回归测试, 迁移后历史对话的 updated_at 不能改变
+# app 在导入时读取当前目录下的 app/envs.yaml, 所以在临时目录的子进程中使用 sqlite 运行
+# 运行:
+#   pytest test_migrate.py
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent
+
+SCRIPT = """
+import datetime
+import json
+from sqlalchemy import create_engine, insert, select
+from app.core import Base, make_url
+from app.models import ConversationDB, MessageDB
+from migrate import migrate_conversation_messages, backfill_token_counts
+
+engine = create_engine(make_url(async_mode=False))
+Base.metadata.create_all(engine)
+with engine.begin() as conn:
+    conn.execute(
+        insert(ConversationDB),
+        [
+            {
+                "user_id": 1,
+                "model_id": 1,
+                "messages": [
+                    {"role": "user", "content": "你好"},
+                    {"role": "assistant", "content": "你好, 有什么可以帮你?", "references": ["book1"]},
+                ],
+                "updated_at": datetime.datetime(2020, 1, 1, 8, 30),
+            },
+            {
+                "user_id": 1,
+                "model_id": 1,
+                "messages": [],
+                "updated_at": datetime.datetime(2021, 6, 1, 12, 0),
+            },
+        ],
+    )
+
+migrate_conversation_messages(engine)
+backfill_token_counts(engine)
+# 再次运行不会重复迁移
+migrate_conversation_messages(engine)
+
+with engine.connect() as conn:
+    conversations = conn.execute(
+        select(
+            ConversationDB.id,
+            ConversationDB.updated_at,
+            ConversationDB.message_count,
+            ConversationDB.messages.is_(None),
+        ).order_by(ConversationDB.id)
+    ).all()
+    messages = conn.execute(
+        select(MessageDB.conversation_id, MessageDB.seq, MessageDB.role, MessageDB.token_count)
+        .order_by(MessageDB.conversation_id, MessageDB.seq)
+    ).all()
+print("RESULT " + json.dumps({
+    "conversations": [[c[0], c[1].isoformat(), c[2], c[3]] for c in conversations],
+    "messages": [list(m) for m in messages],
+}))
+"""
+
+
+def test_migrate_keeps_updated_at(tmp_path: Path):
+    (tmp_path / "app").mkdir()
+    (tmp_path / "app" / "envs.yaml").write_text(
+        f'database:\n  type: "sqlite"\n  database: "{tmp_path / "chatbot.db"}"\n',
+        encoding="utf-8",
+    )
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    line = next(l for l in result.stdout.splitlines() if l.startswith("RESULT "))
+    data = json.loads(line[len("RESULT "):])
+
+    assert data["conversations"] == [
+        [1, "2020-01-01T08:30:00", 2, True],
+        [2, "2021-06-01T12:00:00", 0, True],
+    ]
+    assert [m[:3] for m in data["messages"]] == [[1, 0, "user"], [1, 1, "assistant"]]
+    assert all(m[3] is not None for m in data["messages"])